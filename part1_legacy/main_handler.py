@@ -39,13 +39,22 @@ def load_system_prompt(file_path):
 
 def csv_upload():
     with st.form("my-form", clear_on_submit=True):
-        file = st.file_uploader(label="Upload your CSV here😇", type="csv")
+        files = st.file_uploader(
+            label="Upload your CSV here😇", type="csv", accept_multiple_files=True
+        )
         submitted = st.form_submit_button("Upload CSV")
-        if submitted and file is not None:
-            if not file.name in st.session_state.uploaded_files:
-                assistant_api_file_id = (
-                    st.session_state.code_interpreter_client.upload_file(file.read())
+        if submitted and files:
+            new_files = [
+                file for file in files
+                if not file.name in st.session_state.uploaded_files
+            ]
+            # 여러 파일은 병렬로 업로드
+            assistant_api_file_ids = (
+                st.session_state.code_interpreter_client.upload_files(
+                    [file.read() for file in new_files]
                 )
+            )
+            for file, assistant_api_file_id in zip(new_files, assistant_api_file_ids):
                 st.session_state.custom_system_prompt += f"\n업로드한 파일명: {file.name} (Code Interpreter에서의 path: /mnt/data/{assistant_api_file_id})\n"
                 st.session_state.uploaded_files.append(file.name)
         else:
@@ -1,12 +1,83 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-import traceback
-from openai import OpenAI
+from openai import AssistantEventHandler, OpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+# 이 이벤트를 받으면 run이 끝난 것으로 판단
+RUN_TERMINAL_EVENTS = {
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+}
+
+
+class CodeInterpreterEventHandler(AssistantEventHandler):
+    """
+    runs.stream()의 이벤트를 받아 처리하는 handler
+
+    - code interpreter의 로그 delta를 도착하는 대로 on_event로 전달
+    - 메시지의 텍스트와 이미지/파일 ID를 이벤트 스트림에서 수집
+    - thread.run.completed 등 run 종료 이벤트를 받으면 바로 상태를 기록
+      (create_and_poll처럼 polling 간격만큼 기다리지 않음)
+    """
+
+    def __init__(self, on_event=None):
+        super().__init__()
+        self._emit = on_event or (lambda event: None)
+        self.text_content = ""
+        self.file_ids = []
+        self.run_status = None
+        self.last_error = None
+
+    def _add_file_id(self, file_id):
+        if file_id and file_id not in self.file_ids:
+            self.file_ids.append(file_id)
+
+    def on_event(self, event):
+        if event.event in RUN_TERMINAL_EVENTS:
+            self.run_status = event.data.status
+            self.last_error = getattr(event.data, "last_error", None)
+            self._emit({"type": "status", "status": self.run_status})
+
+    def on_tool_call_delta(self, delta, snapshot):
+        if delta.type != "code_interpreter" or delta.code_interpreter is None:
+            return
+        if delta.code_interpreter.input:
+            self._emit({"type": "code", "delta": delta.code_interpreter.input})
+        for output in delta.code_interpreter.outputs or []:
+            if output.type == "logs" and output.logs:
+                self._emit({"type": "logs", "text": output.logs})
+
+    def on_text_delta(self, delta, snapshot):
+        if delta.value:
+            self._emit({"type": "text", "delta": delta.value})
+
+    def on_image_file_done(self, image_file):
+        self._add_file_id(getattr(image_file, "file_id", None))
+
+    def on_message_done(self, message):
+        # 1) content blocks에서 text와 file_id 추출 (마지막 메시지의 텍스트를 사용)
+        for content in message.content:
+            if content.type == "text":
+                self.text_content = content.text.value
+                for annotation in content.text.annotations:
+                    file_path = getattr(annotation, "file_path", None)
+                    self._add_file_id(getattr(file_path, "file_id", None))
+            elif content.type == "image_file":
+                self._add_file_id(getattr(content.image_file, "file_id", None))
+
+        # 2) attachments에서도 file_id 추출 (annotation이 누락될 수 있으므로)
+        for attachment in getattr(message, "attachments", None) or []:
+            self._add_file_id(getattr(attachment, "file_id", None))
+
+
 class CodeInterpreterClient:
     """
     OpenAI의 Assistants API의 Code Interpreter Tool을 사용하여
@@ -19,6 +90,7 @@ class CodeInterpreterClient:
 
     주요 메서드：
     - upload_file(file_content): 파일을 업로드하여 Assistants API에 등록한다
+    - upload_files(file_contents): 여러 파일을 병렬로 업로드한다
     - run(prompt): Assistants API를 사용해 Python 코드를 실행하거나 파일 분석을 수행한다
 
     Example:
@@ -31,6 +103,9 @@ class CodeInterpreterClient:
 
     def __init__(self):
         self.file_ids = []
+        # 다음 메시지에 첨부할 file_id (run() 시 message attachments로 thread에 추가)
+        self._pending_file_ids = []
+        self._file_lock = threading.Lock()
         self.openai_client = OpenAI()
         self.assistant_id = self._create_assistant_agent()
         self.thread_id = self._create_thread()
@@ -65,23 +140,47 @@ class CodeInterpreterClient:
 
     def upload_file(self, file_content):
         """
-        Upload file to assistant agent
+        Upload file and attach it to the thread with the next message
         Args:
             file_content (_type_): open('file.csv', 'rb').read()
         """
         file = self.openai_client.files.create(file=file_content, purpose="assistants")
-        self.file_ids.append(file.id)
-        # Assistant에 새로운 파일을 추가하여 업데이트한다
-        self._add_file_to_assistant_agent()
+        # assistant 전체의 file_ids를 매번 갱신하는 대신, 다음 메시지의 attachments로 thread에 추가
+        # (업로드마다 O(1)이고 공유 assistant 객체를 변경하지 않음)
+        with self._file_lock:
+            self.file_ids.append(file.id)
+            self._pending_file_ids.append(file.id)
         return file.id
 
-    def _add_file_to_assistant_agent(self):
-        self.assistant = self.openai_client.beta.assistants.update(
-            assistant_id=self.assistant_id,
-            tool_resources={"code_interpreter": {"file_ids": self.file_ids}},
-        )
+    def upload_files(self, file_contents, max_workers=4):
+        """
+        여러 파일을 병렬로 업로드합니다.
+
+        Args:
+            file_contents (list): 파일 내용(bytes)의 리스트
+        Returns:
+            list: 업로드한 순서대로의 file_id 리스트
+        """
+        if not file_contents:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_contents))) as executor:
+            return list(executor.map(self.upload_file, file_contents))
 
-    def run(self, code, max_retries=2):
+    def _take_attachments(self):
+        """아직 thread에 첨부하지 않은 파일을 message attachments 형식으로 꺼냅니다."""
+        with self._file_lock:
+            file_ids, self._pending_file_ids = self._pending_file_ids, []
+        return [
+            {"file_id": file_id, "tools": [{"type": "code_interpreter"}]}
+            for file_id in file_ids
+        ]
+
+    def _restore_attachments(self, attachments):
+        """메시지 추가에 실패한 경우 첨부 대기 목록으로 되돌립니다."""
+        with self._file_lock:
+            self._pending_file_ids[:0] = [a["file_id"] for a in attachments]
+
+    def run(self, code, max_retries=2, on_event=None):
 
         prompt = f"""
         다음 코드를 실행하고 결과를 반환해 주세요.
@@ -95,68 +194,45 @@ class CodeInterpreterClient:
         """
 
         for attempt in range(max_retries + 1):
-            # add message to thread
-            self.openai_client.beta.threads.messages.create(
-                thread_id=self.thread_id, role="user", content=prompt
-            )
+            # add message to thread (새로 업로드한 파일은 이 메시지의 attachments로 첨부)
+            attachments = self._take_attachments()
+            try:
+                self.openai_client.beta.threads.messages.create(
+                    thread_id=self.thread_id, role="user", content=prompt,
+                    attachments=attachments,
+                )
+            except Exception:
+                self._restore_attachments(attachments)
+                raise
 
             # run assistant to get response
-            run = self.openai_client.beta.threads.runs.create_and_poll(
-                thread_id=self.thread_id,
-                assistant_id=self.assistant_id,
-                instructions=self.code_intepreter_instruction,
-            )
-            if run.status == "completed":
+            # (create_and_poll 대신 이벤트 스트림으로 실행하여 run 종료를 바로 감지)
+            handler = self._stream_run(on_event)
+            if handler.run_status == "completed":
                 break
-            elif run.status == "failed":
-                error_msg = getattr(run, 'last_error', None)
-                print(f"[Run Status] {run.status} (attempt {attempt + 1}/{max_retries + 1})")
+            elif handler.run_status == "failed":
+                error_msg = handler.last_error
+                print(f"[Run Status] {handler.run_status} (attempt {attempt + 1}/{max_retries + 1})")
                 print(f"[Run Error] {error_msg}")
                 if attempt < max_retries:
                     import time
                     print(f"  재시도 대기 중 (3초)...")
                     time.sleep(3)
-                    # 새 스레드로 재시도
+                    # 새 스레드로 재시도 (이전 thread에 첨부한 파일도 다시 첨부)
                     self.thread_id = self._create_thread()
+                    with self._file_lock:
+                        self._pending_file_ids = list(self.file_ids)
                     continue
                 else:
-                    raise ValueError(f"Run failed with status: {run.status}, error: {error_msg}")
+                    raise ValueError(f"Run failed with status: {handler.run_status}, error: {error_msg}")
             else:
-                error_msg = getattr(run, 'last_error', None)
-                raise ValueError(f"Run ended with unexpected status: {run.status}, error: {error_msg}")
+                error_msg = handler.last_error
+                raise ValueError(f"Run ended with unexpected status: {handler.run_status}, error: {error_msg}")
 
         # run.status == "completed" 인 경우에만 여기에 도달
-        message = self.openai_client.beta.threads.messages.list(
-            thread_id=self.thread_id, limit=1  # Get the last message
-        )
-        try:
-            msg = message.data[0]
-            file_ids = []
-            text_content = ""
-
-            # 1) content blocks에서 text와 file_id 추출
-            for content in msg.content:
-                if content.type == "text":
-                    text_content = content.text.value
-                    for annotation in content.text.annotations:
-                        file_path = getattr(annotation, "file_path", None)
-                        file_id = getattr(file_path, "file_id", None)
-                        if file_id:
-                            file_ids.append(file_id)
-                elif content.type == "image_file":
-                    image_file_id = getattr(content.image_file, "file_id", None)
-                    if image_file_id:
-                        file_ids.append(image_file_id)
-
-            # 2) attachments에서도 file_id 추출 (annotation이 누락될 수 있으므로)
-            if hasattr(msg, "attachments") and msg.attachments:
-                for attachment in msg.attachments:
-                    att_file_id = getattr(attachment, "file_id", None)
-                    if att_file_id and att_file_id not in file_ids:
-                        file_ids.append(att_file_id)
-        except:
-            print(traceback.format_exc())
-            return None, None
+        # 텍스트와 file_id는 이벤트 스트림에서 이미 수집됨 (messages.list 호출 불필요)
+        text_content = handler.text_content
+        file_ids = handler.file_ids
 
         file_names = []
         if file_ids:
@@ -167,6 +243,20 @@ class CodeInterpreterClient:
 
         return text_content, file_names
 
+    def _stream_run(self, on_event=None):
+        """
+        run을 스트리밍으로 실행하고, run이 끝나면 이벤트를 수집한 handler를 반환합니다.
+        """
+        handler = CodeInterpreterEventHandler(on_event)
+        with self.openai_client.beta.threads.runs.stream(
+            thread_id=self.thread_id,
+            assistant_id=self.assistant_id,
+            instructions=self.code_intepreter_instruction,
+            event_handler=handler,
+        ) as stream:
+            stream.until_done()
+        return handler
+
     def _download_file(self, file_id):
         data = self.openai_client.files.content(file_id)
         data_bytes = data.read()
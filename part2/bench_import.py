@@ -0,0 +1,84 @@
+"""
+앱의 cold-start import 비용 측정 스크립트
+
+`python -X importtime`으로 새 프로세스에서 모듈을 import하고,
+최상위 패키지별 누적(cumulative) import 시간을 집계합니다.
+provider SDK 등을 lazy import로 바꾼 효과를 확인할 때 사용합니다.
+
+사용법:
+    python bench_import.py                      # main.py의 import 비용
+    python bench_import.py main langchain_openai # 여러 모듈을 순서대로 import
+    python bench_import.py main --top 30
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+from collections import defaultdict
+
+# "import time:       123 |       4567 |   package.module" 형식
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def measure_imports(modules):
+    """
+    새 Python 프로세스에서 modules를 import하고 -X importtime 결과를 반환합니다.
+
+    Returns:
+        list[tuple]: (depth, module_name, self_us, cumulative_us)
+    """
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        raise SystemExit(f"import failed: {modules}")
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # 들여쓰기 2칸마다 중첩 깊이가 1 증가 (최상위는 공백 1칸)
+            depth = (len(indent) - 1) // 2
+            entries.append((depth, name, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def summarize(entries, baseline=()):
+    """
+    최상위 import(depth 0)의 누적 시간을 최상위 패키지 이름별로 합산합니다.
+    baseline에 있는 모듈(인터프리터 시작 시 import되는 site, encodings 등)은 제외합니다.
+    """
+    totals = defaultdict(int)
+    for depth, name, _, cumulative_us in entries:
+        if depth == 0 and name not in baseline:
+            totals[name.split(".")[0]] += cumulative_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost")
+    parser.add_argument("modules", nargs="*", default=["main"])
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = {name for _, name, _, _ in measure_imports([])}
+    summary = summarize(measure_imports(args.modules), baseline)
+    total_us = sum(us for _, us in summary)
+
+    print(f"import {', '.join(args.modules)}: total {total_us / 1000:,.1f} ms\n")
+    print(f"{'package':<40} {'cumulative (ms)':>16} {'share':>8}")
+    print("-" * 66)
+    for package, us in summary[: args.top]:
+        print(f"{package:<40} {us / 1000:>16,.1f} {us / total_us:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
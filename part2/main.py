@@ -1,18 +1,36 @@
+import os
 import re
+import time
+import hashlib
+import collections
 import streamlit as st
 from langsmith import uuid7
 
 from langchain.agents import create_agent
-from langgraph.checkpoint.memory import InMemorySaver
-
-# models
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # custom tools
-from src.code_interpreter import CodeInterpreterClient
-from tools.code_interpreter import code_interpreter_tool, set_code_interpreter_client
+from src.backend import create_code_interpreter_client
+from src.checkpointer import CheckpointStore
+from src.context_window import ContextWindowMiddleware
+from src.jobs import (
+    ACTIVE_STATES,
+    JobNotFoundError,
+    ThreadBusyError,
+    default_job_manager,
+    replay,
+)
+from src.model_router import ModelRouterMiddleware
+from src.tool_concurrency import DEFAULT_MAX_PARALLEL_TOOLS, ToolConcurrencyMiddleware
+from src.result_cache import default_cache
+from src.renditions import display_path
+from src.session_registry import SessionNotFoundError, default_registry
+from src.tool_results import ArtifactRef, turn_artifacts
+from src.tracing import TracingCallbackHandler, start_trace
+from tools.code_interpreter import (
+    code_interpreter_tool,
+    code_interpreter_batch_tool,
+    read_execution_log,
+)
 from tools.bigquery import BigQueryClient
 
 ###### dotenv을 사용하지 않는 경우 삭제해주세요 ######
@@ -29,6 +47,23 @@ except ImportError:
     )
 ################################################
 
+# 기본으로 표시할 최근 메시지 수 (이전 메시지는 "더 보기"로 이 수만큼씩 표시)
+HISTORY_PAGE_SIZE = 10
+
+WELCOME_MESSAGE = "안녕하세요! BigQuery 데이터 분석 에이전트입니다. 분석하고 싶은 내용을 입력해주세요 🤗"
+
+# 백그라운드 작업의 진행 상황을 다시 읽는 간격 (초)
+JOB_POLL_SECONDS = 1.0
+
+# 진행 중인 작업의 status에 표시하는 최근 진행 이벤트 수
+JOB_EVENT_TAIL = 200
+
+THREAD_BUSY_MESSAGE = "이 대화에서 이미 분석이 진행 중입니다. 끝난 뒤에 다시 입력해주세요."
+
+# step마다 모델을 고르는 모드와, 이 모드에서 사용하는 모델
+AUTO_MODEL = "Auto (cost/latency routing)"
+AUTO_ROUTES = {"fast": "Gemini 2.5 Flash", "strong": "GPT-5.2"}
+
 
 @st.cache_data  # 캐시를 사용하도록 변경
 def load_system_prompt(file_path):
@@ -42,51 +77,182 @@ def init_page():
     st.sidebar.title("Options")
 
     # 메시지 초기화 / python runtime 초기화
-    clear_button = st.sidebar.button("Clear Conversation", key="clear")
+    # (다른 탭을 포함해 이 대화의 턴이 실행 중인 동안에는 초기화하지 않음)
+    thread_id = st.session_state.get("thread_id") or st.query_params.get("thread")
+    busy = thread_id is not None and default_job_manager().is_busy(thread_id)
+    clear_button = (
+        st.sidebar.button("Clear Conversation", key="clear", disabled=busy) and not busy
+    )
     if clear_button or "messages" not in st.session_state:
-        welcome_message = "안녕하세요! BigQuery 데이터 분석 에이전트입니다. 분석하고 싶은 내용을 입력해주세요 🤗"
-        st.session_state.messages = [{"role": "assistant", "content": welcome_message}]
-        # 대화가 리셋될 때 Code Interpreter의 세션도 다시 생성
-        st.session_state.code_interpreter_client = CodeInterpreterClient()
-        set_code_interpreter_client(st.session_state.code_interpreter_client)
-        st.session_state["checkpointer"] = InMemorySaver()
-        st.session_state["thread_id"] = str(uuid7())
+        # 대화가 리셋될 때 이전 세션의 아티팩트를 정리하고 Code Interpreter의 세션도 다시 생성
+        if "code_interpreter_client" in st.session_state:
+            default_registry().unregister(st.session_state["thread_id"])
+            st.session_state.code_interpreter_client.close()
+            # checkpointer에서 이전 대화의 checkpoint도 삭제
+            get_checkpoint_store().delete_thread(st.session_state["thread_id"])
+        # 새로고침 등으로 세션이 새로 시작된 경우에는 URL의 대화 ID로 이전 대화에 다시 연결
+        thread_id = None if clear_button else st.query_params.get("thread")
+        st.session_state["thread_id"] = thread_id or str(uuid7())
+        st.session_state.messages = load_history(st.session_state["thread_id"])
+        st.session_state.code_interpreter_client = attach_code_interpreter_client(
+            st.session_state["thread_id"]
+        )
+        st.query_params["thread"] = st.session_state["thread_id"]
+        if clear_button:
+            st.query_params.pop("job", None)
         st.session_state.custom_system_prompt = load_system_prompt(
             "./prompt/system_prompt.txt"
         )
         st.session_state.uploaded_files = []
+        st.session_state.history_visible = HISTORY_PAGE_SIZE
+
+
+def attach_code_interpreter_client(thread_id):
+    """
+    대화(thread_id)의 Code Interpreter client를 반환합니다.
+    이 대화의 client가 아직 남아 있으면(새로고침 전의 세션, 끝난 백그라운드 작업 등) 그 client를,
+    없으면 새 client를 만들어 반환합니다.
+    """
+    try:
+        return default_registry().get(thread_id)
+    except SessionNotFoundError:
+        client = create_code_interpreter_client(session_id=thread_id)
+        # tool은 run config의 thread_id로 이 세션의 client를 찾음
+        # 브라우저를 닫아도 백그라운드 작업의 결과(container, 아티팩트)가 남도록 대화 단위로 유지
+        # ("Clear Conversation" 또는 일정 시간 사용되지 않으면 정리)
+        default_registry().register(thread_id, client, keep_alive=True)
+        return client
+
+
+def load_history(thread_id):
+    """
+    checkpointer에 저장된 대화를 화면 표시용 메시지 리스트로 변환합니다.
+    (새로고침 후 대화에 다시 연결하거나 백그라운드 작업이 끝났을 때 사용)
+    """
+    history = [{"role": "assistant", "content": WELCOME_MESSAGE}]
+    checkpoint = get_checkpointer().get_tuple({"configurable": {"thread_id": thread_id}})
+    if checkpoint is None:
+        return history
+    messages = checkpoint.checkpoint["channel_values"].get("messages", [])
+    # 사용자 메시지 단위(턴)로 나누어, 턴의 마지막 답변과 아티팩트를 표시
+    turns = []
+    for message in messages:
+        if message.type == "human":
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+    for turn in turns:
+        history.append({"role": "user", "content": message_text(turn[0])})
+        answers = [message for message in turn if message.type == "ai" and not message.tool_calls]
+        if answers:
+            history.append({
+                "role": "assistant",
+                "content": message_text(answers[-1]),
+                "artifacts": [artifact.model_dump() for artifact in turn_artifacts(turn)],
+            })
+    return history
 
 
 def select_model():
-    models = ("GPT-5.2", "Claude Sonnet 4.5", "Gemini 2.5 Flash")
+    models = ("GPT-5.2", "Claude Sonnet 4.5", "Gemini 2.5 Flash", AUTO_MODEL)
     model = st.sidebar.radio("Choose a model:", models)
+    if model == AUTO_MODEL:
+        st.sidebar.caption(
+            f"테이블 선택, SQL 작성은 {AUTO_ROUTES['fast']}, "
+            f"분석, 답변 작성, 오류 처리, 긴 대화는 {AUTO_ROUTES['strong']}"
+        )
+    return model
+
+
+def create_chat_model(model):
+    # 선택한 provider의 SDK만 import (세 SDK를 모두 import하면 시작이 느려짐)
     if model == "GPT-5.2":
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(temperature=0, model="gpt-5.2")
     elif model == "Claude Sonnet 4.5":
+        from langchain_anthropic import ChatAnthropic
+
         return ChatAnthropic(temperature=0, model="claude-sonnet-4-5-20250929")
     elif model == "Gemini 2.5 Flash":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         return ChatGoogleGenerativeAI(temperature=0, model="gemini-2.5-flash")
 
 
-def create_data_analysis_agent(bq_client):
-    tools = [
+@st.cache_resource(show_spinner=False)
+def get_checkpoint_store():
+    # 대화는 thread_id로 구분되므로 모든 세션이 하나의 checkpointer(SQLite)를 공유
+    store = CheckpointStore()
+    # 시작 시 이전 checkpoint와 보존 기간이 지난 대화를 정리
+    store.compact()
+    return store
+
+
+def get_checkpointer():
+    return get_checkpoint_store().saver
+
+
+@st.cache_resource(show_spinner="BigQuery 테이블 정보를 가져오는 중...")
+def get_tools():
+    """
+    모든 세션이 공유하는 tool 목록
+    (BigQuery tool과 Code Interpreter tool은 실행 중인 세션의 client를 SessionRegistry에서 찾음)
+    """
+    bq_client = BigQueryClient()
+    return [
         bq_client.get_table_info_tool(),
         bq_client.exec_query_tool(),
         code_interpreter_tool,
+        code_interpreter_batch_tool,
+        read_execution_log,
     ]
-    llm = select_model()
-
-    agent = create_agent(
-        model=llm,
-        tools=tools,
-        system_prompt=st.session_state.custom_system_prompt,
-        checkpointer=st.session_state["checkpointer"],
-        debug=True,
+
+
+@st.cache_resource(show_spinner=False)
+def build_agent(model, system_prompt_hash, tool_names, _system_prompt, _tools):
+    """
+    컴파일된 agent를 (모델, system prompt의 hash, tool 목록)별로 캐시하여
+    rerun과 세션 간에 재사용합니다. (_로 시작하는 인자는 캐시 key에 포함되지 않음)
+    """
+    if model == AUTO_MODEL:
+        routes = {tier: create_chat_model(name) for tier, name in AUTO_ROUTES.items()}
+        chat_model = routes["strong"]
+    else:
+        routes = None
+        chat_model = create_chat_model(model)
+    return create_agent(
+        model=chat_model,
+        tools=_tools,
+        system_prompt=_system_prompt,
+        checkpointer=get_checkpointer(),
+        middleware=[
+            # 오래된 tool 결과를 줄여 LLM 입력을 토큰 예산 안으로 유지
+            ContextWindowMiddleware(),
+            # step별 모델 선택 (Auto인 경우)과 LLM 호출별 지연/비용 기록
+            ModelRouterMiddleware(routes),
+            # 병렬 tool 호출의 세션별 동시 실행 수 제한과 Code Interpreter 실행 순서 보장
+            ToolConcurrencyMiddleware(),
+        ],
     )
 
+
+def create_data_analysis_agent():
+    started_at = time.perf_counter()
+    tools = get_tools()
+    system_prompt = st.session_state.custom_system_prompt
+    agent = build_agent(
+        select_model(),
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        tuple(tool.name for tool in tools),
+        system_prompt,
+        tools,
+    )
+    st.sidebar.caption(f"agent 준비: {(time.perf_counter() - started_at) * 1000:,.1f} ms")
     return agent
 
 
+@st.cache_data(max_entries=1000, show_spinner=False)
 def parse_response(response):
     """
     response에서 text와 image_paths를 가져옵니다
@@ -110,36 +276,434 @@ def parse_response(response):
     return text, image_paths
 
 
-def display_content(content):
+@st.cache_data(max_entries=200, show_spinner=False)
+def load_image_bytes(path, mtime_ns):
+    """
+    이미지 파일을 읽어 반환합니다. rerun마다 디스크에서 다시 읽지 않도록 캐시합니다.
+    (mtime_ns는 파일이 바뀐 경우 캐시를 무효화하기 위한 key)
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def display_image(image_path, key):
+    """
+    압축된 화면 표시용 rendition을 기본으로 보여주고,
+    "원본 보기"를 켠 경우에만 원본 이미지를 전송합니다.
+    """
+    # ArtifactStore에서 eviction된 이미지는 표시하지 않음
+    if not os.path.exists(image_path):
+        st.caption(f"(만료된 이미지: {image_path})")
+        return
+    path = display_path(image_path)
+    st.image(load_image_bytes(path, os.stat(path).st_mtime_ns), caption="")
+    if path != image_path:
+        if st.toggle("원본 보기", key=f"original-{key}"):
+            st.image(
+                load_image_bytes(image_path, os.stat(image_path).st_mtime_ns), caption=""
+            )
+
+
+def display_content(content, key="", artifacts=()):
+    """
+    답변 텍스트와 이번 턴의 tool 결과에 포함된 아티팩트를 표시합니다.
+    (LLM이 답변에 <img> 태그를 적은 경우에도 표시)
+    """
     text, image_paths = parse_response(content)
     st.write(text)
-    for image_path in image_paths:
-        st.image(image_path, caption="")
+    for artifact in artifacts:
+        if artifact.is_image and artifact.path not in image_paths:
+            image_paths.append(artifact.path)
+    for index, image_path in enumerate(image_paths):
+        display_image(image_path, key=f"{key}-{index}")
+    for artifact in artifacts:
+        if not artifact.is_image:
+            st.caption(f"📎 {artifact.name} ({artifact.mime}, {artifact.size:,} bytes)")
 
 
-def main():
-    init_page()
-    bq_client = BigQueryClient(st.session_state.code_interpreter_client)
-    data_analysis_agent = create_data_analysis_agent(bq_client)
-    config = {"configurable": {"thread_id": st.session_state["thread_id"]}}
+def display_code_interpreter_event(status, event):
+    """
+    CodeInterpreterClient.run_stream()의 이벤트를 status 컨테이너에 표시합니다.
+    """
+    if event.get("source") != "code_interpreter":
+        return
+    if event["type"] == "status":
+        status.update(label=f"Code Interpreter: {event['status']}...")
+    elif event["type"] == "code_done":
+        # 실행 중에는 stdout이 오지 않으므로 실행 중인 코드를 먼저 표시
+        status.code(event["code"], language="python")
+    elif event["type"] == "logs":
+        status.code(event["text"])
+    elif event["type"] == "file":
+        if event["path"].endswith((".png", ".jpeg", ".jpg", ".gif", ".webp")):
+            status.image(display_path(event["path"], "thumbnail"), caption="")
+        else:
+            status.write(event["path"])
+    elif event["type"] == "usage":
+        status.caption(
+            f"input tokens: {event['input_tokens']:,} "
+            f"(cached: {event['cached_tokens']:,}) / output tokens: {event['output_tokens']:,}"
+        )
 
-    for msg in st.session_state.messages:
+
+def display_history():
+    """
+    최근 HISTORY_PAGE_SIZE개의 메시지만 표시하고, 이전 메시지는 요청할 때 페이지 단위로 표시합니다.
+    (대화가 길어져도 rerun마다 그리는 양이 일정하도록)
+    """
+    messages = st.session_state.messages
+    visible = st.session_state.get("history_visible", HISTORY_PAGE_SIZE)
+    start = max(len(messages) - visible, 0)
+    if start > 0:
+        if st.button(f"이전 메시지 {start}개 중 {min(start, HISTORY_PAGE_SIZE)}개 더 보기"):
+            st.session_state.history_visible = visible + HISTORY_PAGE_SIZE
+            st.rerun()
+    for index in range(start, len(messages)):
+        msg = messages[index]
         with st.chat_message(msg["role"]):
-            display_content(msg["content"])
+            artifacts = [ArtifactRef(**item) for item in msg.get("artifacts", [])]
+            display_content(msg["content"], key=str(index), artifacts=artifacts)
 
-    if prompt := st.chat_input(placeholder="분석하고 싶은 내용을 입력해주세요."):
+
+def display_checkpoint_stats():
+    stats = get_checkpoint_store().stats()
+    st.sidebar.caption(
+        f"대화 저장소: {stats['threads']} threads / {stats['checkpoints']} checkpoints "
+        f"({stats['bytes'] / 1024:,.0f} KB)"
+    )
+
+
+def message_text(message):
+    """메시지(또는 chunk)의 content에서 텍스트만 꺼냅니다 (content block 리스트인 모델 포함)."""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block.get("text", "") for block in message.content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def display_token(placeholder, streamed, message_chunk, metadata):
+    """
+    stream_mode="messages"의 LLM 토큰을 도착하는 대로 표시합니다.
+    LLM 호출(step)이 바뀌면 새 답변으로 간주하여 처음부터 다시 표시합니다.
+    """
+    if metadata.get("langgraph_node") != "model":
+        return
+    if metadata.get("langgraph_step") != streamed["step"]:
+        streamed["step"] = metadata.get("langgraph_step")
+        streamed["text"] = ""
+    streamed["text"] += message_text(message_chunk)
+    if streamed["text"]:
+        placeholder.markdown(streamed["text"] + "▌")
+
+
+def display_step_update(status, placeholder, streamed, update):
+    """
+    stream_mode="updates"로 tool 호출의 시작/종료를 status에 표시합니다.
+    tool을 호출한 LLM 응답의 텍스트(중간 설명)는 답변 영역에서 status로 옮깁니다.
+    """
+    for node, node_update in (update or {}).items():
+        for message in (node_update or {}).get("messages", []):
+            if node == "model" and getattr(message, "tool_calls", None):
+                if streamed["text"]:
+                    status.write(streamed["text"])
+                    streamed["text"] = ""
+                    placeholder.empty()
+                for tool_call in message.tool_calls:
+                    status.write(f"🔧 {tool_call['name']} 실행 중...")
+                    status.update(label=f"{tool_call['name']} 실행 중...")
+            elif node == "tools" and getattr(message, "type", None) == "tool":
+                status.write(f"✅ {message.name} 완료")
+
+
+def display_context_report(status, event):
+    """ContextWindowMiddleware가 보고한 LLM 호출별 토큰 수를 표시합니다."""
+    if event.get("source") != "context":
+        return
+    message = f"context: {event['before']:,} tokens"
+    if event["pruned"]:
+        message += f" → {event['after']:,} tokens (이전 tool 결과 {event['pruned']}개 생략)"
+    status.caption(message)
+
+
+def format_cost(cost):
+    return "-" if cost is None else f"${cost:.4f}"
+
+
+def display_route_report(status, event, routes):
+    """ModelRouterMiddleware가 보고한 LLM 호출별 모델, 지연, 비용을 표시하고 routes에 모읍니다."""
+    if event.get("source") != "router":
+        return
+    routes.append(event)
+    status.caption(
+        f"LLM [{event['step']}] {event['model']}: {event['latency_ms']:,} ms, "
+        f"{event['input_tokens']:,} → {event['output_tokens']:,} tokens, "
+        f"{format_cost(event['cost_usd'])}"
+    )
+
+
+def display_route_summary(status, routes):
+    """턴 전체의 LLM 지연과 비용을, 모든 step을 강한 모델로 처리한 경우의 추정 비용과 함께 표시합니다."""
+    if not routes:
+        return
+    latency_ms = sum(event["latency_ms"] for event in routes)
+    costs = [event["cost_usd"] for event in routes]
+    baselines = [event["baseline_cost_usd"] for event in routes]
+    cost = None if None in costs else sum(costs)
+    message = f"LLM {len(routes)}회: {latency_ms:,} ms, {format_cost(cost)}"
+    if any(event["tier"] for event in routes) and None not in baselines:
+        message += f" (모두 강한 모델로 처리한 경우 추정 {format_cost(sum(baselines))})"
+    status.caption(message)
+
+
+def display_job_counts():
+    counts = default_job_manager().counts()
+    st.sidebar.caption(
+        f"백그라운드 작업: 실행 중 {counts['running']} / 대기 {counts['queued']}"
+    )
+
+
+def display_cache_stats():
+    stats = default_cache().stats()
+    st.sidebar.caption(
+        f"실행 결과 캐시: hit rate {stats['hit_rate']:.0%} "
+        f"({stats['hits']}/{stats['hits'] + stats['misses']}, {stats['entries']} entries)"
+    )
+
+
+def display_resource_counts():
+    # lifecycle은 OpenAI SDK를 import하므로 필요할 때 import
+    from src.lifecycle import default_lifecycle
+
+    counts = default_lifecycle().counts()
+    live = ", ".join(f"{kind} {count}" for kind, count in counts.items() if count)
+    st.sidebar.caption(f"원격 리소스: {live or '없음'}")
+
+
+def display_last_trace():
+    """직전 턴의 trace(Chrome trace-event JSON)를 내려받을 수 있도록 표시합니다."""
+    trace = st.session_state.get("last_trace")
+    if trace is None:
+        return
+    st.sidebar.download_button(
+        "직전 턴의 trace 다운로드",
+        data=trace.to_json(),
+        file_name="trace.json",
+        mime="application/json",
+        help="chrome://tracing 또는 https://ui.perfetto.dev 에서 열 수 있습니다",
+    )
+    with st.sidebar.expander("소요 시간 상위 구간"):
+        for name, duration_ms in trace.summary():
+            st.caption(f"{name}: {duration_ms:,.0f} ms")
+
+
+def run_turn(agent, checkpoint_store, prompt, config, status, answer_placeholder):
+    """
+    agent로 한 턴을 실행하며 진행 상황을 status에, 답변을 answer_placeholder에 토큰 단위로 표시합니다.
+    (백그라운드 작업에서는 Streamlit 컨테이너 대신 작업 저장소에 기록하는 recorder가 전달됨)
+
+    Returns:
+        tuple: (result, trace)
+            - result: 턴이 끝난 뒤의 agent 상태
+            - trace: 이 턴의 trace
+    """
+    thread_id = config["configurable"]["thread_id"]
+    streamed = {"step": None, "text": ""}
+    routes = []
+    result = None
+    # LLM 호출, tool 호출, BigQuery, 업로드, 원격 실행, 다운로드를 Span으로 기록
+    with start_trace("turn", thread_id=thread_id) as trace:
+        for mode, chunk in agent.stream(
+            {"messages": [("user", prompt)]},
+            {**config, "callbacks": [TracingCallbackHandler(trace)]},
+            stream_mode=["messages", "updates", "custom", "values"],
+        ):
+            if mode == "messages":
+                display_token(answer_placeholder, streamed, *chunk)
+            elif mode == "updates":
+                display_step_update(status, answer_placeholder, streamed, chunk)
+            elif mode == "custom":
+                display_code_interpreter_event(status, chunk)
+                display_context_report(status, chunk)
+                display_route_report(status, chunk, routes)
+            else:
+                result = chunk
+    # 대화의 최신 checkpoint만 남겨 저장소 크기를 대화 수에 비례하도록 유지
+    checkpoint_store.touch(thread_id)
+    checkpoint_store.compact_thread(thread_id)
+    display_route_summary(status, routes)
+    status.update(label="분석 완료", state="complete")
+    return result, trace
+
+
+def submit_turn_job(agent, prompt, config):
+    """
+    한 턴을 백그라운드 작업으로 실행하고 작업 ID를 반환합니다.
+    작업은 Streamlit 세션과 무관하게 실행되므로 st.*는 사용하지 않고 진행 상황을 작업 저장소에 기록합니다.
+    """
+    checkpoint_store = get_checkpoint_store()
+
+    def turn(job):
+        try:
+            _, trace = run_turn(
+                agent, checkpoint_store, prompt, config, job.recorder("status"), job.preview()
+            )
+        finally:
+            # 작업이 끝난 시점부터 client의 유지 시간을 계산 (작업이 길어도 결과가 바로 정리되지 않도록)
+            default_registry().touch(config["configurable"]["thread_id"])
+        return trace
+
+    return default_job_manager().submit(
+        turn,
+        thread_id=config["configurable"]["thread_id"],
+        # 새로고침으로 세션이 바뀌어도 작업이 끝날 때까지 Code Interpreter client를 유지
+        resources=[st.session_state.code_interpreter_client],
+    )
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def display_job(job_id):
+    """
+    백그라운드 작업의 진행 상황을 주기적으로 다시 읽어 표시합니다.
+    새로 추가된 진행 이벤트만 읽어 st.session_state에 모으고, 최근 JOB_EVENT_TAIL개만 다시 그립니다.
+    작업이 끝나면 checkpointer에서 대화를 다시 읽고 전체 화면을 갱신합니다.
+    """
+    jobs = default_job_manager()
+    try:
+        job = jobs.get(job_id)
+    except JobNotFoundError:
+        st.session_state.pop("job_progress", None)
+        st.query_params.pop("job", None)
+        st.rerun()
+    if job["status"] in ACTIVE_STATES:
+        progress = st.session_state.get("job_progress")
+        if progress is None or progress["job_id"] != job_id:
+            progress = st.session_state["job_progress"] = {
+                "job_id": job_id,
+                "position": 0,
+                "received": 0,
+                "events": collections.deque(maxlen=JOB_EVENT_TAIL),
+                "label": None,  # 마지막 status.update() (라벨은 오래된 이벤트가 잘려도 유지)
+            }
+        events, progress["position"] = jobs.read_events(job_id, progress["position"])
+        for event in events:
+            if event.get("method") == "update":
+                progress["label"] = event
+            else:
+                progress["received"] += 1
+                progress["events"].append(event)
+        with st.chat_message("assistant"):
+            status = st.status("분석 중...", expanded=False)
+            skipped = progress["received"] - len(progress["events"])
+            if skipped:
+                status.caption(f"(이전 진행 기록 {skipped:,}개 생략)")
+            replay([*progress["events"], progress["label"] or {}], {"status": status})
+            if job["preview"]:
+                st.markdown(job["preview"])
+        return
+
+    if job["status"] == "succeeded":
+        trace = jobs.result(job_id)
+        if trace is not None:
+            st.session_state["last_trace"] = trace
+    else:
+        st.session_state["job_error"] = job["error"]
+    st.session_state.pop("job_progress", None)
+    st.session_state.messages = load_history(st.session_state["thread_id"])
+    st.query_params.pop("job", None)
+    st.rerun()
+
+
+def main():
+    init_page()
+    display_cache_stats()
+    display_checkpoint_stats()
+    display_resource_counts()
+    display_job_counts()
+    # 기본은 토큰 단위 스트리밍(포그라운드). 백그라운드 작업은 새로고침해도 이어지지만
+    # 진행 상황을 JOB_POLL_SECONDS마다 다시 읽어 표시하므로 답변이 덜 매끄럽게 표시됨
+    background = st.sidebar.toggle(
+        "백그라운드에서 실행",
+        value=False,
+        help=(
+            "분석을 백그라운드 작업으로 실행합니다. 페이지를 새로고침해도 진행 중인 분석에 다시 연결되지만, "
+            f"답변은 토큰 단위가 아니라 {JOB_POLL_SECONDS:g}초 간격으로 갱신됩니다."
+        ),
+    )
+    data_analysis_agent = create_data_analysis_agent()
+    # 한 메시지의 여러 tool 호출은 최대 max_concurrency개의 스레드에서 동시에 실행
+    config = {
+        "configurable": {"thread_id": st.session_state["thread_id"]},
+        "max_concurrency": DEFAULT_MAX_PARALLEL_TOOLS,
+    }
+
+    display_history()
+    if error := st.session_state.pop("job_error", None):
+        st.error(f"분석 중 오류가 발생했습니다: {error}")
+
+    # 이 대화에서 진행 중인 백그라운드 작업이 있으면 (새로고침이나 다른 탭에서 열어도) 다시 연결하여 표시
+    jobs = default_job_manager()
+    thread_id = st.session_state["thread_id"]
+    job_id = jobs.active_job(thread_id) or st.query_params.get("job")
+    if job_id:
+        st.query_params["job"] = job_id
+        display_job(job_id)
+
+    if prompt := st.chat_input(
+        placeholder="분석하고 싶은 내용을 입력해주세요.",
+        disabled=job_id is not None or jobs.is_busy(thread_id),
+    ):
         st.chat_message("user").write(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
 
+        if background:
+            try:
+                job_id = submit_turn_job(data_analysis_agent, prompt, config)
+            except ThreadBusyError as e:
+                # 다른 탭에서 먼저 시작한 턴이 있으면 입력을 버리고 그 작업에 연결
+                st.session_state.messages.pop()
+                st.toast(THREAD_BUSY_MESSAGE)
+                job_id = e.job_id
+            # 작업 ID를 URL에 남겨 새로고침 후에도 다시 연결할 수 있도록 함
+            if job_id:
+                st.query_params["job"] = job_id
+            st.rerun()
+
         with st.chat_message("assistant"):
-            with st.spinner("분석 중..."):
-                result = data_analysis_agent.invoke(
-                    {"messages": [("user", prompt)]}, config
-                )
+            # Code Interpreter 실행 이벤트와 tool 진행 상황을 도착하는 대로 표시
+            status = st.status("분석 중...", expanded=False)
+            # LLM의 답변은 토큰 단위로 표시
+            answer_placeholder = st.empty()
+            try:
+                with jobs.claim(thread_id):
+                    result, trace = run_turn(
+                        data_analysis_agent, get_checkpoint_store(), prompt, config,
+                        status, answer_placeholder,
+                    )
+            except ThreadBusyError:
+                st.session_state.messages.pop()
+                st.toast(THREAD_BUSY_MESSAGE)
+                st.rerun()
+            st.session_state["last_trace"] = trace
             answer = result["messages"][-1].content
-            display_content(answer)
+            # 이미지 등의 아티팩트는 LLM의 답변이 아니라 tool 결과에서 가져옴
+            artifacts = turn_artifacts(result["messages"])
+            # 스트리밍한 텍스트를 이미지 등을 포함한 최종 답변으로 교체
+            with answer_placeholder.container():
+                display_content(
+                    answer, key=str(len(st.session_state.messages)), artifacts=artifacts
+                )
+
+        st.session_state.messages.append(
+            {
+                "role": "assistant",
+                "content": answer,
+                "artifacts": [artifact.model_dump() for artifact in artifacts],
+            }
+        )
 
-        st.session_state.messages.append({"role": "assistant", "content": answer})
+    display_last_trace()
 
 
 if __name__ == "__main__":
@@ -1,22 +1,30 @@
+import os
 import re
+import time
+import hashlib
 import streamlit as st
 from langsmith import uuid7
 
 from langchain.agents import create_agent
-from langgraph.checkpoint.memory import InMemorySaver
-
-# models
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
 
 # custom tools
-from src.code_interpreter import CodeInterpreterClient
-from tools.code_interpreter import code_interpreter_tool, set_code_interpreter_client
+from src.backend import create_code_interpreter_client
+from src.checkpointer import CheckpointStore
+from src.context_window import ContextWindowMiddleware
+from src.model_router import ModelRouterMiddleware
+from src.tool_concurrency import DEFAULT_MAX_PARALLEL_TOOLS, ToolConcurrencyMiddleware
+from src.result_cache import default_cache
+from src.renditions import display_path
+from src.session_registry import default_registry
+from src.tool_results import ArtifactRef, turn_artifacts
+from src.tracing import TracingCallbackHandler, start_trace
+from tools.code_interpreter import (
+    code_interpreter_tool,
+    code_interpreter_batch_tool,
+    read_execution_log,
+)
 from tools.bigquery import BigQueryClient
 
-from youngjin_langchain_tools import StreamlitLanggraphHandler
-
 ###### dotenv을 사용하지 않는 경우 삭제해주세요 ######
 try:
     from dotenv import load_dotenv
@@ -31,6 +39,13 @@ except ImportError:
     )
 ################################################
 
+# 기본으로 표시할 최근 메시지 수 (이전 메시지는 "더 보기"로 이 수만큼씩 표시)
+HISTORY_PAGE_SIZE = 10
+
+# step마다 모델을 고르는 모드와, 이 모드에서 사용하는 모델
+AUTO_MODEL = "Auto (cost/latency routing)"
+AUTO_ROUTES = {"fast": "Gemini 2.5 Flash", "strong": "GPT-5.2"}
+
 
 @st.cache_data  # 캐시를 사용하도록 변경
 def load_system_prompt(file_path):
@@ -48,47 +63,127 @@ def init_page():
     if clear_button or "messages" not in st.session_state:
         welcome_message = "안녕하세요! BigQuery 데이터 분석 에이전트입니다. 분석하고 싶은 내용을 입력해주세요 🤗"
         st.session_state.messages = [{"role": "assistant", "content": welcome_message}]
-        # 대화가 리셋될 때 Code Interpreter의 세션도 다시 생성
-        st.session_state.code_interpreter_client = CodeInterpreterClient()
-        set_code_interpreter_client(st.session_state.code_interpreter_client)
-        st.session_state["checkpointer"] = InMemorySaver()
+        # 대화가 리셋될 때 이전 세션의 아티팩트를 정리하고 Code Interpreter의 세션도 다시 생성
+        if "code_interpreter_client" in st.session_state:
+            default_registry().unregister(st.session_state["thread_id"])
+            st.session_state.code_interpreter_client.close()
+            # checkpointer에서 이전 대화의 checkpoint도 삭제
+            get_checkpoint_store().delete_thread(st.session_state["thread_id"])
         st.session_state["thread_id"] = str(uuid7())
+        st.session_state.code_interpreter_client = create_code_interpreter_client(
+            session_id=st.session_state["thread_id"]
+        )
+        # tool은 run config의 thread_id로 이 세션의 client를 찾음
+        default_registry().register(
+            st.session_state["thread_id"], st.session_state.code_interpreter_client
+        )
         st.session_state.custom_system_prompt = load_system_prompt(
             "./prompt/system_prompt.txt"
         )
         st.session_state.uploaded_files = []
+        st.session_state.history_visible = HISTORY_PAGE_SIZE
 
 
 def select_model():
-    models = ("GPT-5.2", "Claude Sonnet 4.5", "Gemini 2.5 Flash")
+    models = ("GPT-5.2", "Claude Sonnet 4.5", "Gemini 2.5 Flash", AUTO_MODEL)
     model = st.sidebar.radio("Choose a model:", models)
+    if model == AUTO_MODEL:
+        st.sidebar.caption(
+            f"테이블 선택, SQL 작성은 {AUTO_ROUTES['fast']}, "
+            f"분석, 답변 작성, 오류 처리, 긴 대화는 {AUTO_ROUTES['strong']}"
+        )
+    return model
+
+
+def create_chat_model(model):
+    # 선택한 provider의 SDK만 import (세 SDK를 모두 import하면 시작이 느려짐)
     if model == "GPT-5.2":
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(temperature=0, model="gpt-5.2")
     elif model == "Claude Sonnet 4.5":
+        from langchain_anthropic import ChatAnthropic
+
         return ChatAnthropic(temperature=0, model="claude-sonnet-4-5-20250929")
     elif model == "Gemini 2.5 Flash":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         return ChatGoogleGenerativeAI(temperature=0, model="gemini-2.5-flash")
 
 
-def create_data_analysis_agent(bq_client):
-    tools = [
+@st.cache_resource(show_spinner=False)
+def get_checkpoint_store():
+    # 대화는 thread_id로 구분되므로 모든 세션이 하나의 checkpointer(SQLite)를 공유
+    store = CheckpointStore()
+    # 시작 시 이전 checkpoint와 보존 기간이 지난 대화를 정리
+    store.compact()
+    return store
+
+
+def get_checkpointer():
+    return get_checkpoint_store().saver
+
+
+@st.cache_resource(show_spinner="BigQuery 테이블 정보를 가져오는 중...")
+def get_tools():
+    """
+    모든 세션이 공유하는 tool 목록
+    (BigQuery tool과 Code Interpreter tool은 실행 중인 세션의 client를 SessionRegistry에서 찾음)
+    """
+    bq_client = BigQueryClient()
+    return [
         bq_client.get_table_info_tool(),
         bq_client.exec_query_tool(),
         code_interpreter_tool,
+        code_interpreter_batch_tool,
+        read_execution_log,
     ]
-    llm = select_model()
-
-    agent = create_agent(
-        model=llm,
-        tools=tools,
-        system_prompt=st.session_state.custom_system_prompt,
-        checkpointer=st.session_state["checkpointer"],
-        debug=True,
+
+
+@st.cache_resource(show_spinner=False)
+def build_agent(model, system_prompt_hash, tool_names, _system_prompt, _tools):
+    """
+    컴파일된 agent를 (모델, system prompt의 hash, tool 목록)별로 캐시하여
+    rerun과 세션 간에 재사용합니다. (_로 시작하는 인자는 캐시 key에 포함되지 않음)
+    """
+    if model == AUTO_MODEL:
+        routes = {tier: create_chat_model(name) for tier, name in AUTO_ROUTES.items()}
+        chat_model = routes["strong"]
+    else:
+        routes = None
+        chat_model = create_chat_model(model)
+    return create_agent(
+        model=chat_model,
+        tools=_tools,
+        system_prompt=_system_prompt,
+        checkpointer=get_checkpointer(),
+        middleware=[
+            # 오래된 tool 결과를 줄여 LLM 입력을 토큰 예산 안으로 유지
+            ContextWindowMiddleware(),
+            # step별 모델 선택 (Auto인 경우)과 LLM 호출별 지연/비용 기록
+            ModelRouterMiddleware(routes),
+            # 병렬 tool 호출의 세션별 동시 실행 수 제한과 Code Interpreter 실행 순서 보장
+            ToolConcurrencyMiddleware(),
+        ],
     )
 
+
+def create_data_analysis_agent():
+    started_at = time.perf_counter()
+    tools = get_tools()
+    system_prompt = st.session_state.custom_system_prompt
+    agent = build_agent(
+        select_model(),
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        tuple(tool.name for tool in tools),
+        system_prompt,
+        tools,
+    )
+    st.sidebar.caption(f"agent 준비: {(time.perf_counter() - started_at) * 1000:,.1f} ms")
     return agent
 
 
+@st.cache_data(max_entries=1000, show_spinner=False)
 def parse_response(response):
     """
     response에서 text와 image_paths를 가져옵니다
@@ -112,48 +207,172 @@ def parse_response(response):
     return text, image_paths
 
 
-def display_content(content):
+@st.cache_data(max_entries=200, show_spinner=False)
+def load_image_bytes(path, mtime_ns):
+    """
+    이미지 파일을 읽어 반환합니다. rerun마다 디스크에서 다시 읽지 않도록 캐시합니다.
+    (mtime_ns는 파일이 바뀐 경우 캐시를 무효화하기 위한 key)
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def display_image(image_path, key):
+    """
+    압축된 화면 표시용 rendition을 기본으로 보여주고,
+    "원본 보기"를 켠 경우에만 원본 이미지를 전송합니다.
+    """
+    # ArtifactStore에서 eviction된 이미지는 표시하지 않음
+    if not os.path.exists(image_path):
+        st.caption(f"(만료된 이미지: {image_path})")
+        return
+    path = display_path(image_path)
+    st.image(load_image_bytes(path, os.stat(path).st_mtime_ns), caption="")
+    if path != image_path:
+        if st.toggle("원본 보기", key=f"original-{key}"):
+            st.image(
+                load_image_bytes(image_path, os.stat(image_path).st_mtime_ns), caption=""
+            )
+
+
+def display_content(content, key="", artifacts=()):
+    """
+    답변 텍스트와 이번 턴의 tool 결과에 포함된 아티팩트를 표시합니다.
+    (LLM이 답변에 <img> 태그를 적은 경우에도 표시)
+    """
     text, image_paths = parse_response(content)
     st.write(text)
-    for image_path in image_paths:
-        st.image(image_path, caption="")
+    for artifact in artifacts:
+        if artifact.is_image and artifact.path not in image_paths:
+            image_paths.append(artifact.path)
+    for index, image_path in enumerate(image_paths):
+        display_image(image_path, key=f"{key}-{index}")
+    for artifact in artifacts:
+        if not artifact.is_image:
+            st.caption(f"📎 {artifact.name} ({artifact.mime}, {artifact.size:,} bytes)")
+
+
+def display_history():
+    """
+    최근 HISTORY_PAGE_SIZE개의 메시지만 표시하고, 이전 메시지는 요청할 때 페이지 단위로 표시합니다.
+    (대화가 길어져도 rerun마다 그리는 양이 일정하도록)
+    """
+    messages = st.session_state.messages
+    visible = st.session_state.get("history_visible", HISTORY_PAGE_SIZE)
+    start = max(len(messages) - visible, 0)
+    if start > 0:
+        if st.button(f"이전 메시지 {start}개 중 {min(start, HISTORY_PAGE_SIZE)}개 더 보기"):
+            st.session_state.history_visible = visible + HISTORY_PAGE_SIZE
+            st.rerun()
+    for index in range(start, len(messages)):
+        msg = messages[index]
+        with st.chat_message(msg["role"]):
+            artifacts = [ArtifactRef(**item) for item in msg.get("artifacts", [])]
+            display_content(msg["content"], key=str(index), artifacts=artifacts)
+
+
+def display_checkpoint_stats():
+    stats = get_checkpoint_store().stats()
+    st.sidebar.caption(
+        f"대화 저장소: {stats['threads']} threads / {stats['checkpoints']} checkpoints "
+        f"({stats['bytes'] / 1024:,.0f} KB)"
+    )
+
+
+def display_cache_stats():
+    stats = default_cache().stats()
+    st.sidebar.caption(
+        f"실행 결과 캐시: hit rate {stats['hit_rate']:.0%} "
+        f"({stats['hits']}/{stats['hits'] + stats['misses']}, {stats['entries']} entries)"
+    )
+
+
+def display_resource_counts():
+    # lifecycle은 OpenAI SDK를 import하므로 필요할 때 import
+    from src.lifecycle import default_lifecycle
+
+    counts = default_lifecycle().counts()
+    live = ", ".join(f"{kind} {count}" for kind, count in counts.items() if count)
+    st.sidebar.caption(f"원격 리소스: {live or '없음'}")
+
+
+def display_last_trace():
+    """직전 턴의 trace(Chrome trace-event JSON)를 내려받을 수 있도록 표시합니다."""
+    trace = st.session_state.get("last_trace")
+    if trace is None:
+        return
+    st.sidebar.download_button(
+        "직전 턴의 trace 다운로드",
+        data=trace.to_json(),
+        file_name="trace.json",
+        mime="application/json",
+        help="chrome://tracing 또는 https://ui.perfetto.dev 에서 열 수 있습니다",
+    )
+    with st.sidebar.expander("소요 시간 상위 구간"):
+        for name, duration_ms in trace.summary():
+            st.caption(f"{name}: {duration_ms:,.0f} ms")
 
 
 def main():
     init_page()
-    bq_client = BigQueryClient(st.session_state.code_interpreter_client)
-    data_analysis_agent = create_data_analysis_agent(bq_client)
+    display_cache_stats()
+    display_checkpoint_stats()
+    display_resource_counts()
+    data_analysis_agent = create_data_analysis_agent()
 
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            display_content(msg["content"])
+    display_history()
 
     if prompt := st.chat_input(placeholder="분석하고 싶은 내용을 입력해주세요."):
         st.chat_message("user").write(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
 
         with st.chat_message("assistant"):
+            from youngjin_langchain_tools import StreamlitLanggraphHandler
+
             handler = StreamlitLanggraphHandler(
                 container=st.container(),
                 expand_new_thoughts=True,
                 max_thought_containers=4,
             )
 
-            response = handler.invoke(
-                agent=data_analysis_agent,
-                input={"messages": [{"role": "user", "content": prompt}]},
-                config={"configurable": {"thread_id": st.session_state["thread_id"]}},
-            )
+            # 한 메시지의 여러 tool 호출은 최대 max_concurrency개의 스레드에서 동시에 실행
+            config = {
+                "configurable": {"thread_id": st.session_state["thread_id"]},
+                "max_concurrency": DEFAULT_MAX_PARALLEL_TOOLS,
+            }
+            # LLM 호출, tool 호출, BigQuery, 업로드, 원격 실행, 다운로드를 Span으로 기록
+            with start_trace("turn", thread_id=st.session_state["thread_id"]) as trace:
+                response = handler.invoke(
+                    agent=data_analysis_agent,
+                    input={"messages": [{"role": "user", "content": prompt}]},
+                    config={**config, "callbacks": [TracingCallbackHandler(trace)]},
+                )
+            st.session_state["last_trace"] = trace
+            # 대화의 최신 checkpoint만 남겨 저장소 크기를 대화 수에 비례하도록 유지
+            get_checkpoint_store().touch(st.session_state["thread_id"])
+            get_checkpoint_store().compact_thread(st.session_state["thread_id"])
 
             if response:
-                # handler가 반환한 응답에서 이미지 처리
-                _, image_paths = parse_response(response)
-                for image_path in image_paths:
-                    st.image(image_path, caption="")
+                # 이미지 등의 아티팩트는 checkpointer에 저장된 이번 턴의 tool 결과에서 가져옴
+                messages = data_analysis_agent.get_state(config).values["messages"]
+                artifacts = turn_artifacts(messages)
+                image_paths = parse_response(response)[1] + [
+                    artifact.path for artifact in artifacts if artifact.is_image
+                ]
+                for index, image_path in enumerate(dict.fromkeys(image_paths)):
+                    display_image(
+                        image_path, key=f"{len(st.session_state.messages)}-{index}"
+                    )
                 st.session_state.messages.append(
-                    {"role": "assistant", "content": response}
+                    {
+                        "role": "assistant",
+                        "content": response,
+                        "artifacts": [artifact.model_dump() for artifact in artifacts],
+                    }
                 )
 
+    display_last_trace()
+
 
 if __name__ == "__main__":
     main()
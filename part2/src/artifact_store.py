@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+
+class ArtifactStore:
+    """
+    Code Interpreter가 생성한 파일(아티팩트)을 세션별로 관리하는 저장소
+
+    기존에는 모든 세션이 CWD 기준의 `./files/` 디렉토리 하나를 공유했고
+    파일이 삭제되지 않아 디렉토리가 계속 커졌습니다.
+    이 클래스는 다음 기능을 제공합니다：
+    1. 내용 기반 주소(content-addressed) 저장: 같은 바이트는 한 번만 저장
+    2. 세션별 네임스페이스: 세션마다 자신이 참조하는 아티팩트 목록(index)을 가짐
+    3. 용량/기간 기반 eviction 및 세션별 quota 적용
+    4. 세션 종료 시 정리(clear_session)
+
+    디렉토리 구조：
+    - {root}/objects/{sha256[:2]}/{sha256}{ext} : 실제 파일
+    - {root}/sessions/{session_id}.json      : 세션이 참조하는 아티팩트 목록
+
+    Example:
+    ===============
+    from src.artifact_store import default_store
+    store = default_store()
+    path = store.put("session-1", data_bytes, extension=".png")
+    store.clear_session("session-1")
+    """
+
+    def __init__(
+        self,
+        root="./files",
+        max_total_bytes=500 * 1024 * 1024,
+        max_age_seconds=7 * 24 * 60 * 60,
+        session_quota_bytes=100 * 1024 * 1024,
+    ):
+        self.root = root
+        self.max_total_bytes = max_total_bytes
+        self.max_age_seconds = max_age_seconds
+        self.session_quota_bytes = session_quota_bytes
+        self._lock = threading.RLock()
+        os.makedirs(self._objects_dir(), exist_ok=True)
+        os.makedirs(self._sessions_dir(), exist_ok=True)
+
+    def _objects_dir(self):
+        return os.path.join(self.root, "objects")
+
+    def _sessions_dir(self):
+        return os.path.join(self.root, "sessions")
+
+    def _object_path(self, digest, extension):
+        return os.path.join(self._objects_dir(), digest[:2], f"{digest}{extension}")
+
+    def _index_path(self, session_id):
+        return os.path.join(self._sessions_dir(), f"{session_id}.json")
+
+    def _load_index(self, session_id):
+        try:
+            with open(self._index_path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, session_id, index):
+        if not index:
+            try:
+                os.remove(self._index_path(session_id))
+            except FileNotFoundError:
+                pass
+            return
+        tmp_path = self._index_path(session_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path(session_id))
+
+    def _session_ids(self):
+        return [
+            name[: -len(".json")]
+            for name in os.listdir(self._sessions_dir())
+            if name.endswith(".json")
+        ]
+
+    def put(self, session_id, data_bytes, name=None, extension=""):
+        """
+        아티팩트를 저장하고 세션 index에 등록합니다.
+
+        Args:
+            session_id: 아티팩트를 소유하는 세션 ID
+            data_bytes: 파일 내용 (bytes)
+            name: 원본 파일명 또는 file_id (index에 기록)
+            extension: 저장할 파일의 확장자 (예: ".png")
+        Returns:
+            str: 저장된 파일의 경로
+        """
+        size = len(data_bytes)
+        if size > self.session_quota_bytes:
+            raise ValueError(
+                f"Artifact size ({size:,} bytes) exceeds session quota "
+                f"({self.session_quota_bytes:,} bytes)"
+            )
+
+        digest = hashlib.sha256(data_bytes).hexdigest()
+        path = self._object_path(digest, extension)
+        now = time.time()
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data_bytes)
+                os.replace(tmp_path, path)
+
+            index = self._load_index(session_id)
+            index[digest] = {
+                "name": name,
+                "path": path,
+                "size": size,
+                "created_at": index.get(digest, {}).get("created_at", now),
+                "last_access": now,
+            }
+            self._enforce_session_quota(session_id, index, keep=digest)
+            self._save_index(session_id, index)
+            self.enforce_limits()
+        return path
+
+    def list_session(self, session_id):
+        """세션이 참조하는 아티팩트 목록을 반환합니다."""
+        with self._lock:
+            return list(self._load_index(session_id).values())
+
+    def session_usage(self, session_id):
+        """세션이 사용 중인 용량(bytes)을 반환합니다."""
+        return sum(entry["size"] for entry in self.list_session(session_id))
+
+    def _enforce_session_quota(self, session_id, index, keep=None):
+        """세션 quota를 넘으면 오래된 아티팩트부터 index에서 제거합니다."""
+        entries = sorted(index.items(), key=lambda item: item[1]["last_access"])
+        used = sum(entry["size"] for _, entry in entries)
+        for digest, entry in entries:
+            if used <= self.session_quota_bytes:
+                break
+            if digest == keep:
+                continue
+            del index[digest]
+            used -= entry["size"]
+
+    def enforce_limits(self):
+        """
+        기간 및 전체 용량 제한을 적용합니다.
+
+        1. max_age_seconds보다 오래된 참조를 제거
+        2. 전체 용량이 max_total_bytes를 넘으면 가장 오래 사용되지 않은 참조부터 제거
+        3. 어떤 세션도 참조하지 않는 파일을 삭제
+        """
+        with self._lock:
+            now = time.time()
+            indexes = {sid: self._load_index(sid) for sid in self._session_ids()}
+
+            for sid, index in indexes.items():
+                for digest in list(index):
+                    if now - index[digest]["last_access"] > self.max_age_seconds:
+                        del index[digest]
+
+            # 같은 파일을 여러 세션이 참조할 수 있으므로 digest 단위로 용량 계산
+            sizes = {}
+            last_access = {}
+            for index in indexes.values():
+                for digest, entry in index.items():
+                    sizes[digest] = entry["size"]
+                    last_access[digest] = max(
+                        last_access.get(digest, 0), entry["last_access"]
+                    )
+            total = sum(sizes.values())
+            for digest in sorted(last_access, key=last_access.get):
+                if total <= self.max_total_bytes:
+                    break
+                for index in indexes.values():
+                    index.pop(digest, None)
+                total -= sizes[digest]
+
+            for sid, index in indexes.items():
+                self._save_index(sid, index)
+            self._collect_garbage(indexes)
+
+    def _collect_garbage(self, indexes):
+        """어떤 세션에서도 참조되지 않는 파일을 삭제합니다."""
+        referenced = {digest for index in indexes.values() for digest in index}
+        for dirpath, _, filenames in os.walk(self._objects_dir()):
+            for filename in filenames:
+                # 파생 파일(예: 썸네일)도 같은 digest로 시작하므로 함께 삭제됨
+                digest = filename.split(".")[0]
+                if digest not in referenced:
+                    try:
+                        os.remove(os.path.join(dirpath, filename))
+                    except FileNotFoundError:
+                        pass
+
+    def clear_session(self, session_id):
+        """세션의 index를 삭제하고 더 이상 참조되지 않는 파일을 정리합니다."""
+        with self._lock:
+            self._save_index(session_id, {})
+            indexes = {sid: self._load_index(sid) for sid in self._session_ids()}
+            self._collect_garbage(indexes)
+
+    def clear_all(self):
+        """저장소 전체를 삭제합니다."""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self._objects_dir(), exist_ok=True)
+            os.makedirs(self._sessions_dir(), exist_ok=True)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    """프로세스 전체에서 공유하는 ArtifactStore를 반환합니다."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -0,0 +1,47 @@
+import os
+
+
+# 배포 환경별로 Code Interpreter의 실행 백엔드를 선택
+# - "responses": OpenAI Responses API의 Code Interpreter (기본값)
+# - "local": 로컬 subprocess 커널 (src/local_kernel.py)
+# - "pool": 분석용 라이브러리를 미리 import 해둔 로컬 커널 pool (src/kernel_pool.py)
+BACKEND_ENV_VAR = "CODE_INTERPRETER_BACKEND"
+DEFAULT_BACKEND = "responses"
+
+# 실행 결과 캐시 사용 여부 ("0"이면 사용하지 않음)
+CACHE_ENV_VAR = "CODE_INTERPRETER_CACHE"
+
+
+def create_code_interpreter_client(session_id=None, backend=None, use_cache=None):
+    """
+    설정된 백엔드의 Code Interpreter client를 생성합니다.
+    모든 백엔드는 upload_file(file_content, filename), run(code) -> (text, files),
+    close() 인터페이스를 제공하며, 실행 결과 캐시(MemoizedCodeInterpreter)로 감싸서 반환합니다.
+
+    Args:
+        session_id: 세션 ID (아티팩트 저장소의 네임스페이스로 사용)
+        backend: 백엔드 이름. 생략하면 환경 변수 CODE_INTERPRETER_BACKEND를 사용
+        use_cache: 실행 결과 캐시 사용 여부. 생략하면 환경 변수 CODE_INTERPRETER_CACHE를 사용
+    """
+    from src.result_cache import MemoizedCodeInterpreter, default_cache
+
+    backend = (backend or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)).lower()
+    if backend == "responses":
+        from src.code_interpreter import CodeInterpreterClient
+
+        client = CodeInterpreterClient(session_id=session_id)
+    elif backend == "local":
+        from src.local_kernel import LocalKernelClient
+
+        client = LocalKernelClient(session_id=session_id)
+    elif backend == "pool":
+        from src.kernel_pool import default_pool
+        from src.local_kernel import LocalKernelClient
+
+        client = LocalKernelClient(session_id=session_id, kernel_pool=default_pool())
+    else:
+        raise ValueError(f"Unknown Code Interpreter backend: {backend}")
+
+    if use_cache is None:
+        use_cache = os.environ.get(CACHE_ENV_VAR, "1") != "0"
+    return MemoizedCodeInterpreter(client, default_cache() if use_cache else None)
@@ -0,0 +1,118 @@
+import os
+import json
+
+
+# 각 snippet의 실행 결과를 출력할 때 붙이는 구분자
+RESULT_MARKER = "__BATCH_RESULT__"
+
+# snippet이 생성한 파일을 찾을 디렉토리 (Code Interpreter의 /mnt/data 와 작업 디렉토리)
+BATCH_PROGRAM_TEMPLATE = '''
+import contextlib as _ctx, io as _io, os as _os, json as _json, traceback as _tb
+
+def _batch_snapshot():
+    _files = {{}}
+    for _root in {{"/mnt/data", _os.getcwd()}}:
+        if not _os.path.isdir(_root):
+            continue
+        for _dirpath, _, _filenames in _os.walk(_root):
+            for _filename in _filenames:
+                _path = _os.path.join(_dirpath, _filename)
+                _files[_path] = _os.stat(_path).st_mtime_ns
+    return _files
+
+for _i, _src in enumerate({snippets!r}):
+    _before = _batch_snapshot()
+    _out = _io.StringIO()
+    _error = None
+    with _ctx.redirect_stdout(_out), _ctx.redirect_stderr(_out):
+        try:
+            exec(compile(_src, "<snippet %d>" % _i, "exec"), globals())
+        except Exception:
+            _error = _tb.format_exc()
+    _after = _batch_snapshot()
+    _new_files = sorted(_os.path.basename(_p) for _p, _m in _after.items() if _before.get(_p) != _m)
+    print({marker!r} + _json.dumps(
+        {{"index": _i, "stdout": _out.getvalue(), "error": _error, "files": _new_files}},
+        ensure_ascii=False,
+    ))
+'''
+
+
+def build_batch_program(snippets):
+    """
+    여러 snippet을 하나의 Python 프로그램으로 합칩니다.
+    각 snippet은 같은 네임스페이스에서 순서대로 실행되며,
+    stdout / 오류 / 새로 생성된 파일명을 구분자와 함께 JSON 한 줄로 출력합니다.
+    """
+    return BATCH_PROGRAM_TEMPLATE.format(snippets=list(snippets), marker=RESULT_MARKER)
+
+
+def parse_batch_output(text, count):
+    """
+    build_batch_program()의 실행 결과 텍스트를 snippet별 결과로 나눕니다.
+
+    Returns:
+        tuple: (results, found)
+            - results: [{"index", "stdout", "error", "files"}, ...] (snippet 순서)
+            - found: 결과 구분자를 하나라도 찾았는지 여부 (False이면 프로그램이 실행되지 않은 것)
+    """
+    results = {}
+    for line in text.splitlines():
+        position = line.find(RESULT_MARKER)
+        if position < 0:
+            continue
+        try:
+            result = json.loads(line[position + len(RESULT_MARKER):])
+        except json.JSONDecodeError:
+            continue
+        results[result["index"]] = result
+    return [
+        results.get(
+            index,
+            {"index": index, "stdout": "", "error": "실행 결과를 찾을 수 없습니다", "files": []},
+        )
+        for index in range(count)
+    ], bool(results)
+
+
+def run_batch(client, snippets, on_event=None):
+    """
+    여러 snippet을 한 번의 run() 호출(= 한 번의 Responses API 왕복)로 실행합니다.
+
+    Args:
+        client: Code Interpreter client (run(code, on_event) 인터페이스)
+        snippets: 실행할 Python 코드 리스트
+        on_event: 스트리밍 이벤트(dict)를 받는 콜백 (선택)
+
+    Returns:
+        list[dict]: snippet별 {"index", "stdout", "error", "files"}
+            files는 로컬에 저장된 아티팩트 경로 리스트
+    """
+    if not snippets:
+        return []
+    downloaded = {}  # 파일명 -> 로컬 경로
+
+    def handle_event(event):
+        if event["type"] == "file" and event.get("name"):
+            downloaded[os.path.basename(event["name"])] = event["path"]
+        if on_event is not None:
+            on_event(event)
+
+    text_content, file_names = client.run(build_batch_program(snippets), on_event=handle_event)
+    results, found = parse_batch_output(text_content, len(snippets))
+
+    if not found:
+        # 프로그램 자체가 실행되지 않은 경우(API 오류, 문법 오류 등) 전체 텍스트를 첫 결과에 담아 반환
+        # (출력이 없는 snippet이나 모든 snippet이 실패한 경우는 구분자가 있으므로 해당하지 않음)
+        results[0]["error"] = text_content
+
+    assigned = set()
+    for result in results:
+        paths = [downloaded[name] for name in result["files"] if name in downloaded]
+        assigned.update(paths)
+        result["files"] = paths
+    # 파일명을 알 수 없는 아티팩트는 마지막 snippet에 포함
+    unassigned = [path for path in file_names if path not in assigned]
+    if unassigned and results:
+        results[-1]["files"].extend(unassigned)
+    return results
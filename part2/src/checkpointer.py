@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+# 대화 상태(LangGraph checkpoint)를 저장할 SQLite 파일
+CHECKPOINT_DB_ENV_VAR = "CHECKPOINT_DB_PATH"
+DEFAULT_DB_PATH = "./.checkpoints/checkpoints.sqlite"
+
+# 이 기간 동안 사용되지 않은 대화는 compact() 시 삭제
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+class CheckpointStore:
+    """
+    SqliteSaver(langgraph-checkpoint-sqlite) 기반의 디스크 checkpointer와 정리 기능
+
+    - saver: create_agent(checkpointer=...)에 전달하는 SqliteSaver
+    - compact_thread(): 대화의 최신 checkpoint만 남기고 이전 checkpoint를 삭제 (턴마다 호출)
+    - compact(): 모든 대화를 compact하고, 보존 기간이 지난 대화를 삭제한 뒤 VACUUM (시작 시 호출)
+    - delete_thread(): 대화를 삭제 ("Clear Conversation")
+
+    agent는 최신 checkpoint만 읽으므로 이전 checkpoint를 지워도 대화는 그대로 이어집니다.
+    (get_state_history()로 과거 상태를 거슬러 올라가는 기능은 사용할 수 없게 됨)
+    프로세스를 재시작해도 대화가 유지되며, WAL 모드로 여러 worker 프로세스가 같은 파일을 사용할 수 있습니다.
+    """
+
+    def __init__(self, path=None, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        self.path = path or os.environ.get(CHECKPOINT_DB_ENV_VAR, DEFAULT_DB_PATH)
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.saver = SqliteSaver(self.conn)
+        self.saver.setup()
+        # 대화별 마지막 사용 시각 (보존 기간 판정용)
+        with self.saver.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity "
+                "(thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+            )
+            self.conn.commit()
+        self._compact_lock = threading.Lock()
+
+    def touch(self, thread_id):
+        with self.saver.lock:
+            self.conn.execute(
+                "INSERT INTO thread_activity (thread_id, last_used) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_used = excluded.last_used",
+                (thread_id, time.time()),
+            )
+            self.conn.commit()
+
+    def delete_thread(self, thread_id):
+        self.saver.delete_thread(thread_id)
+        with self.saver.lock:
+            self.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+
+    def compact_thread(self, thread_id):
+        """
+        대화의 최신 checkpoint(와 그 pending writes)만 남기고 나머지를 삭제합니다.
+
+        Returns:
+            int: 삭제한 checkpoint 수
+        """
+        with self.saver.lock:
+            deleted = self._delete_old_checkpoints("WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+        return deleted
+
+    def compact(self, vacuum=True):
+        """
+        모든 대화를 compact하고 보존 기간이 지난 대화를 삭제합니다.
+
+        Returns:
+            dict: {"checkpoints": 삭제한 checkpoint 수, "threads": 삭제한 대화 수}
+        """
+        with self._compact_lock:
+            cutoff = time.time() - self.max_age_seconds
+            with self.saver.lock:
+                # 활동 기록이 없는 대화(이전 버전에서 저장된 대화 등)는 지금부터 보존 기간을 계산
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO thread_activity (thread_id, last_used) "
+                    "SELECT DISTINCT thread_id, ? FROM checkpoints",
+                    (time.time(),),
+                )
+                expired = [
+                    row[0] for row in self.conn.execute(
+                        "SELECT thread_id FROM thread_activity WHERE last_used < ?", (cutoff,)
+                    )
+                ]
+                self.conn.commit()
+            for thread_id in expired:
+                self.delete_thread(thread_id)
+
+            with self.saver.lock:
+                deleted = self._delete_old_checkpoints("", ())
+                self.conn.commit()
+                if vacuum:
+                    # 삭제로 생긴 빈 페이지를 반환하여 파일 크기를 줄임
+                    self.conn.execute("VACUUM")
+        return {"checkpoints": deleted, "threads": len(expired)}
+
+    def _delete_old_checkpoints(self, where, params):
+        # checkpoint_id는 시간순으로 정렬되는 UUID(v6)이므로 MAX가 최신 checkpoint
+        latest = (
+            "SELECT thread_id, checkpoint_ns, MAX(checkpoint_id) AS checkpoint_id "
+            f"FROM checkpoints {where} GROUP BY thread_id, checkpoint_ns"
+        )
+        cursor = self.conn.execute(
+            f"DELETE FROM checkpoints {where} {'AND' if where else 'WHERE'} "
+            f"(thread_id, checkpoint_ns, checkpoint_id) NOT IN ({latest})",
+            params + params,
+        )
+        self.conn.execute(
+            f"DELETE FROM writes {where} {'AND' if where else 'WHERE'} "
+            "(thread_id, checkpoint_ns, checkpoint_id) NOT IN "
+            "(SELECT thread_id, checkpoint_ns, checkpoint_id FROM checkpoints)",
+            params,
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        with self.saver.lock:
+            threads, checkpoints = self.conn.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+            ).fetchone()
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
@@ -1,9 +1,27 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_011/part2/src/code_interpreter.py
 
-import os
+import uuid
+import weakref
+import threading
 import traceback
 import mimetypes
 from openai import OpenAI
+from src.artifact_store import default_store
+from src.lifecycle import default_lifecycle
+from src.renditions import create_renditions
+from src.tracing import span
+from src.resilience import (
+    CircuitOpenError,
+    Deadline,
+    DeadlineExceeded,
+    call_with_resilience,
+)
+
+
+def _release_session(artifact_store, lifecycle, session_id):
+    """세션의 아티팩트와 원격 리소스(container 등)를 정리합니다."""
+    artifact_store.clear_session(session_id)
+    lifecycle.release_session(session_id)
 
 
 class CodeInterpreterClient:
@@ -19,10 +37,15 @@ class CodeInterpreterClient:
     주요 메서드：
     - upload_file(file_content): 파일을 업로드하여 Container에 등록한다
     - run(code): Responses API를 사용하여 Python 코드를 실행하거나 파일 분석을 수행한다
+    - close(): 세션 종료 시 세션의 아티팩트와 container를 정리한다
+
+    다운로드한 파일은 ArtifactStore의 세션 네임스페이스에 저장됩니다.
+    생성한 container와 업로드한 파일은 ResourceLifecycleManager에 기록되어
+    세션 종료 시(또는 다음 시작 시의 sweep에서) 삭제됩니다.
 
     Assistants API에서 Responses API로 마이그레이션:
     - Assistant + Thread → Container
-    - create_and_poll → responses.create (동기 방식)
+    - create_and_poll → responses.create (스트리밍 방식)
     - 파일 관리 방식 간소화
 
     Example:
@@ -32,22 +55,61 @@ class CodeInterpreterClient:
     code_interpreter.upload_file(open('file.csv', 'rb').read())
     code_interpreter.run("file.csv의 내용을 읽어서 그래프를 그려주세요")
     """
-    def __init__(self):
+    # 모든 요청이 같은 prefix(tools + instructions)를 공유하므로 같은 cache key로 라우팅
+    PROMPT_CACHE_KEY = "code-interpreter-runner-v1"
+
+    # 스트림의 마지막 이벤트 (deadline이 지난 뒤에 도착해도 처리)
+    TERMINAL_EVENT_TYPES = ("response.completed", "response.failed", "response.incomplete", "error")
+
+    def __init__(
+        self,
+        session_id=None,
+        artifact_store=None,
+        run_timeout=180,
+        chain_responses=False,
+        lifecycle=None,
+    ):
         self.file_ids = []
+        self.run_timeout = run_timeout  # run() 한 번에 허용하는 시간 (재시도 포함, 초)
+        # True이면 previous_response_id로 이전 호출과 연결 (이전 대화가 캐시 가능한 prefix가 됨)
+        self.chain_responses = chain_responses
+        self.last_response_id = None
+        self.last_usage = None
+        self.usage_totals = {"input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+        self.session_id = session_id or uuid.uuid4().hex
+        self.artifact_store = artifact_store or default_store()
+        self.lifecycle = lifecycle or default_lifecycle()
+        # client가 살아 있는 동안에는 idle 세션으로 정리하지 않도록 알림
+        self.lifecycle.attach(self.session_id, self)
+        # 같은 container에서의 실행은 한 번에 하나씩
+        # (병렬 tool 호출이 실행 상태와 last_response_id, 사용량 누적을 덮어쓰지 않도록 함)
+        self._lock = threading.Lock()
         self.openai_client = OpenAI()
         self.container_id = self._create_container()
-        self._create_file_directory()
+        # client가 GC될 때(세션 종료 시)에도 아티팩트와 container가 정리되도록 등록
+        self._finalizer = weakref.finalize(
+            self, _release_session, self.artifact_store, self.lifecycle, self.session_id
+        )
+        # 모든 요청에서 바이트 단위로 동일한 정적 instructions
+        # (요청마다 달라지는 코드는 input에만 넣어 캐시 가능한 prefix를 유지)
         self.code_intepreter_instruction = """
         제공된 데이터 분석용 Python 코드를 실행해주세요.
         실행한 결과를 반환해주세요. 당신의 분석 결과는 필요하지 않습니다.
         다시 한 번 반복합니다, 실행한 결과를 반환해주세요.
         파일 경로 등이 조금 틀려 있는 경우 적절히 수정해주세요.
         수정한 경우에는 수정한 내용을 설명해주세요.
+        **중요 규칙**:
+        - 코드 실행 결과(stdout, stderr)를 정확히 반환해주세요
+        - 오류 발생 시 전체 traceback을 포함해주세요
+        - 생성된 파일은 자동으로 첨부됩니다
         """
 
-    def _create_file_directory(self):
-        directory = "./files/"
-        os.makedirs(directory, exist_ok=True)
+    def close(self):
+        """
+        세션 종료 또는 "Clear Conversation" 시 호출하여
+        이 세션이 저장한 아티팩트와 container 등의 원격 리소스를 정리합니다.
+        """
+        self._finalizer()
 
     def _create_container(self):
         """
@@ -56,9 +118,11 @@ class CodeInterpreterClient:
 
         이전 Assistants API의 Assistant + Thread 조합을 대체합니다.
         """
-        container = self.openai_client.containers.create(
-            name="code-interpreter-bigquery-session"
+        container = call_with_resilience(
+            self.openai_client.containers.create,
+            name="code-interpreter-bigquery-session",
         )
+        self.lifecycle.register(self.session_id, "container", container.id)
         return container.id
 
     def upload_file(self, file_content, filename="uploaded_file.csv"):
@@ -72,41 +136,89 @@ class CodeInterpreterClient:
             filename: The filename accessible in container
         """
         # Container에 파일 직접 업로드 (Responses API 방식)
-        container_file = self.openai_client.containers.files.create(
-            container_id=self.container_id,
-            file=(filename, file_content),
-        )
+        with span("code_interpreter.upload", "upload", filename=filename, bytes=len(file_content)):
+            container_file = call_with_resilience(
+                self.openai_client.containers.files.create,
+                container_id=self.container_id,
+                file=(filename, file_content),
+            )
         self.file_ids.append(container_file.id)
+        self.lifecycle.register(
+            self.session_id, "container_file", container_file.id, parent_id=self.container_id
+        )
         return filename  # Container 내에서 접근 가능한 파일명 반환
 
-    def run(self, code):
+    def run(self, code, on_event=None):
         """
         Responses API를 사용하여 Python 코드를 실행합니다.
+        내부적으로 run_stream()을 소비하며, on_event가 주어지면
+        스트리밍 이벤트를 도착하는 대로 전달합니다.
 
         Args:
             code: 실행할 Python 코드 문자열
+            on_event: 스트리밍 이벤트(dict)를 받는 콜백 (선택)
 
         Returns:
             tuple: (text_content, file_names)
                 - text_content: 코드 실행 결과 텍스트
                 - file_names: 생성된 파일 경로 리스트
         """
-
-        prompt = f"""
-        다음 코드를 실행하고 결과를 반환해 주세요.
-        ```python
-        {code}
-        ```
-        **중요 규칙**:
-        - 코드 실행 결과(stdout, stderr)를 정확히 반환해주세요
-        - 오류 발생 시 전체 traceback을 포함해주세요
-        - 생성된 파일은 자동으로 첨부됩니다
+        text_content, file_names = "", []
+        with self._lock, span(
+            "code_interpreter.execute", "remote_exec", backend="responses"
+        ) as current:
+            for event in self.run_stream(code):
+                if on_event is not None:
+                    on_event(event)
+                if event["type"] == "usage":
+                    current.set(**{k: v for k, v in event.items() if k != "type"})
+                if event["type"] == "done":
+                    text_content, file_names = event["text"], event["files"]
+            current.set(files=len(file_names))
+        return text_content, file_names
+
+    def run_stream(self, code):
         """
+        Responses API의 스트리밍 모드로 Python 코드를 실행하고
+        이벤트를 도착하는 대로 yield 합니다.
+
+        Yields:
+            dict: 다음 중 하나
+                - {"type": "status", "status": "in_progress" | "interpreting" | "completed"}
+                - {"type": "code", "delta": 실행 중인 코드 조각}
+                - {"type": "code_done", "code": 실행을 시작하는 코드 전체}
+                - {"type": "logs", "text": stdout/stderr 로그 (code_interpreter_call마다 끝나는 즉시)}
+
+        Responses API는 실행 중의 stdout을 나누어 보내지 않으므로, 실행 중에는 상태와 코드를,
+        각 code_interpreter_call이 끝날 때마다 그 호출의 로그를 전달합니다.
+                - {"type": "text", "delta": 모델 메시지 조각}
+                - {"type": "file", "path": 다운로드된 파일 경로, "name": Container 내 파일명}
+                - {"type": "usage", "input_tokens", "cached_tokens", "output_tokens"}
+                - {"type": "done", "text": 최종 텍스트, "files": 파일 경로 리스트}
+        """
+
+        # 정적인 지시문은 instructions로 보내고, input에는 실행할 코드만 넣음
+        prompt = f"다음 코드를 실행하고 결과를 반환해 주세요.\n```python\n{code}\n```"
 
+        optional_params = {}
+        if self.chain_responses and self.last_response_id:
+            optional_params["previous_response_id"] = self.last_response_id
+
+        text_content = ""
+        code_output = ""  # code_interpreter 실행 결과
+        file_names = []
+        downloaded = set()  # 이미 다운로드한 (container_id, file_id)
+
+        deadline = Deadline(self.run_timeout)
+        self.lifecycle.touch(self.session_id)  # idle 세션 판정용
         try:
-            # Responses API를 사용하여 코드 실행
-            response = self.openai_client.responses.create(
+            # Responses API를 스트리밍 모드로 호출하여 코드 실행
+            # (스트림 연결까지는 재시도하며, 스트림 도중의 오류는 재시도하지 않음)
+            stream = call_with_resilience(
+                self.openai_client.responses.create,
+                deadline=deadline,
                 model="gpt-4o",
+                instructions=self.code_intepreter_instruction,
                 input=[
                     {
                         "role": "user",
@@ -125,69 +237,147 @@ class CodeInterpreterClient:
                     }
                 ],
                 tool_choice="auto",
+                include=["code_interpreter_call.outputs"],
+                prompt_cache_key=self.PROMPT_CACHE_KEY,
+                stream=True,
+                **optional_params,
             )
 
-            # 응답에서 텍스트와 파일 추출
-            text_content = ""
-            code_output = ""  # code_interpreter 실행 결과
-            file_info_list = []  # (container_id, file_id) 튜플 리스트
-
-            for item in response.output:
-                # code_interpreter_call에서 실제 실행 결과 추출
-                if item.type == "code_interpreter_call":
-                    # 코드 실행 결과 (stdout/stderr) 추출
-                    if hasattr(item, 'code_interpreter_call'):
-                        call_info = item.code_interpreter_call
-                        if hasattr(call_info, 'results'):
-                            for result in call_info.results:
-                                if hasattr(result, 'logs') and result.logs:
-                                    code_output += result.logs + "\n"
-                        if hasattr(call_info, 'error') and call_info.error:
-                            code_output += f"\n[ERROR]: {call_info.error}\n"
-
-                # 메시지 타입에서 텍스트 및 파일 추출
-                elif item.type == "message":
-                    for content in item.content:
-                        if content.type == "output_text":
-                            text_content += content.text
-
-                            # annotations에서 파일 정보 추출
-                            if hasattr(content, 'annotations') and content.annotations:
-                                for annotation in content.annotations:
-                                    if hasattr(annotation, 'type') and annotation.type == 'container_file_citation':
-                                        if hasattr(annotation, 'file_id') and hasattr(annotation, 'container_id'):
-                                            file_id = annotation.file_id
-                                            container_id = annotation.container_id
-                                            file_info_list.append((container_id, file_id))
+            try:
+                for event in stream:
+                    event_type = event.type
+                    # 이벤트를 계속 보내는 스트림은 timeout으로 끊기지 않으므로 이벤트마다 deadline 확인
+                    if deadline.expired() and event_type not in self.TERMINAL_EVENT_TYPES:
+                        raise DeadlineExceeded(
+                            f"Code Interpreter run exceeded {self.run_timeout}s deadline"
+                        )
+
+                    # code_interpreter_call의 진행 상태 (in_progress → interpreting → completed)
+                    if event_type.startswith("response.code_interpreter_call."):
+                        yield {"type": "status", "status": event_type.rsplit(".", 1)[-1]}
+
+                    # 실행 중인 코드
+                    elif event_type == "response.code_interpreter_call_code.delta":
+                        yield {"type": "code", "delta": event.delta}
+
+                    # 코드 작성이 끝나고 실행을 시작하는 시점에 코드 전체를 전달
+                    elif event_type == "response.code_interpreter_call_code.done":
+                        yield {"type": "code_done", "code": event.code}
+
+                    # code_interpreter_call 완료 시 실행 결과 (stdout/stderr) 추출
+                    elif event_type == "response.output_item.done":
+                        if event.item.type == "code_interpreter_call":
+                            logs = self._extract_logs(event.item)
+                            if logs:
+                                code_output += logs
+                                yield {"type": "logs", "text": logs}
+
+                    # 모델 메시지 텍스트
+                    elif event_type == "response.output_text.delta":
+                        text_content += event.delta
+                        yield {"type": "text", "delta": event.delta}
+
+                    # 파일 인용(annotation)이 도착하는 즉시 다운로드
+                    elif event_type == "response.output_text.annotation.added":
+                        file_info = self._extract_file_citation(event.annotation)
+                        if file_info and file_info[:2] not in downloaded:
+                            container_id, file_id, filename = file_info
+                            downloaded.add((container_id, file_id))
+                            downloaded_path = self._download_container_file(
+                                container_id, file_id, deadline=deadline
+                            )
+                            file_names.append(downloaded_path)
+                            yield {"type": "file", "path": downloaded_path, "name": filename}
+
+                    # 완료 시 response ID와 캐시된 토큰 수 등 사용량 기록
+                    elif event_type == "response.completed":
+                        self.last_response_id = event.response.id
+                        usage = self._record_usage(event.response.usage)
+                        if usage:
+                            yield {"type": "usage", **usage}
+
+                    elif event_type in ("response.failed", "error"):
+                        error = getattr(getattr(event, "response", None), "error", None)
+                        code_output += f"\n[ERROR]: {error or getattr(event, 'message', '')}\n"
+            finally:
+                # deadline 초과 등으로 중간에 빠져나온 경우 연결을 닫아 스트림 수신을 중단
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
 
             # 코드 실행 결과가 있으면 포함
             if code_output:
                 text_content = f"[실행 결과]\n{code_output}\n\n{text_content}"
 
-            # 파일 다운로드
-            file_names = []
-            if file_info_list:
-                for container_id, file_id in file_info_list:
-                    downloaded_path = self._download_container_file(container_id, file_id)
-                    file_names.append(downloaded_path)
-
-            return text_content, file_names
-
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # 장애 상황에서는 traceback 없이 빠르게 실패
+            text_content = f"[Code Interpreter 오류]\n{e}\n잠시 후 다시 시도해주세요."
+            print(text_content)
         except Exception as e:
-            error_msg = f"[Code Interpreter 오류]\n{traceback.format_exc()}"
-            print(error_msg)
-            return error_msg, []
+            text_content = f"[Code Interpreter 오류]\n{traceback.format_exc()}"
+            print(text_content)
 
-    def _download_container_file(self, container_id, file_id):
+        yield {"type": "done", "text": text_content, "files": file_names}
+
+    def _record_usage(self, usage):
+        """
+        Responses API의 usage에서 입력/캐시/출력 토큰 수를 추출하여 누적합니다.
+        cached_tokens는 prompt caching으로 재사용된 입력 토큰 수입니다.
+        """
+        if usage is None:
+            return None
+        details = getattr(usage, "input_tokens_details", None)
+        self.last_usage = {
+            "input_tokens": usage.input_tokens,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "output_tokens": usage.output_tokens,
+        }
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] += value
+        return self.last_usage
+
+    @staticmethod
+    def _extract_logs(item):
+        """code_interpreter_call 항목에서 stdout/stderr 로그를 추출합니다."""
+        logs = ""
+        for output in getattr(item, "outputs", None) or []:
+            if getattr(output, "type", None) == "logs" and output.logs:
+                logs += output.logs + "\n"
+        # 이전 SDK 형식 (item.code_interpreter_call.results)
+        call_info = getattr(item, "code_interpreter_call", None)
+        if call_info is not None:
+            for result in getattr(call_info, "results", None) or []:
+                if getattr(result, "logs", None):
+                    logs += result.logs + "\n"
+            if getattr(call_info, "error", None):
+                logs += f"\n[ERROR]: {call_info.error}\n"
+        return logs
+
+    @staticmethod
+    def _extract_file_citation(annotation):
+        """container_file_citation annotation에서 (container_id, file_id, filename)을 추출합니다."""
+        # 스트리밍 이벤트의 annotation은 dict로 전달될 수 있음
+        if isinstance(annotation, dict):
+            get = annotation.get
+        else:
+            get = lambda key: getattr(annotation, key, None)
+        if get("type") != "container_file_citation":
+            return None
+        if get("container_id") and get("file_id"):
+            return get("container_id"), get("file_id"), get("filename")
+        return None
+
+    def _download_container_file(self, container_id, file_id, deadline=None):
         """
         Container 파일을 다운로드하여 로컬에 저장합니다.
 
         Args:
             container_id: OpenAI Container ID
             file_id: Container 내의 파일 ID
+            deadline: run()의 Deadline (지정하면 남은 시간 안에서만 재시도)
 
         Returns:
-            str: 저장된 파일의 경로
+            str: ArtifactStore에 저장된 파일의 경로
         """
         # Container files content API를 사용하여 파일 다운로드
         # API path: GET /v1/containers/{container_id}/files/{file_id}/content
@@ -204,8 +394,14 @@ class CodeInterpreterClient:
             "Authorization": f"Bearer {api_key}",
         }
 
-        response = httpx.get(url, headers=headers)
-        response.raise_for_status()
+        def download(timeout=60):
+            response = httpx.get(url, headers=headers, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        with span("code_interpreter.download", "download", file_id=file_id) as current:
+            response = call_with_resilience(download, deadline=deadline)
+            current.set(bytes=len(response.content))
 
         data_bytes = response.content
 
@@ -219,8 +415,9 @@ class CodeInterpreterClient:
         if not extension:
             extension = ".png"
 
-        file_name = f"./files/{file_id}{extension}"
-        with open(file_name, "wb") as file:
-            file.write(data_bytes)
-
+        file_name = self.artifact_store.put(
+            self.session_id, data_bytes, name=file_id, extension=extension
+        )
+        # 화면 표시용 rendition과 썸네일을 원본 옆에 생성
+        create_renditions(file_name)
         return file_name
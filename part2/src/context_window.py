@@ -0,0 +1,130 @@
+import functools
+
+from langchain.agents.middleware import AgentMiddleware
+from langgraph.config import get_stream_writer
+
+from src.tracing import span
+
+
+# LLM에 보내는 대화 기록(system prompt 제외)의 토큰 예산
+DEFAULT_MAX_TOKENS = 12000
+
+# 예산을 넘어도 그대로 유지하는 최근 턴 수 (사용자 메시지 기준)
+DEFAULT_KEEP_RECENT_TURNS = 2
+
+# 생략한 tool 결과 대신 남겨둘 앞부분의 길이 (문자 수)
+STUB_PREVIEW_CHARS = 200
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name):
+    import tiktoken
+
+    return tiktoken.get_encoding(name)
+
+
+# 토큰 수를 기억해 둘 텍스트 수
+# (매 LLM 호출마다 대화 기록 전체를 다시 보내므로, 이전 step에서 센 메시지는 다시 encode하지 않음)
+TOKEN_CACHE_SIZE = 2048
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _count_text(text, encoding_name):
+    return len(_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+def count_tokens(message, encoding_name="o200k_base"):
+    """
+    메시지 하나의 토큰 수 (content + 메시지당 overhead)
+
+    텍스트별 결과를 캐시하므로, 같은 메시지를 이 middleware와 ModelRouterMiddleware에서
+    각각 세거나 다음 step에서 다시 세어도 tiktoken으로 encode하는 것은 처음 한 번뿐입니다.
+    """
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tokens = _count_text(content, encoding_name)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += _count_text(str(tool_call.get("args", "")), encoding_name)
+    return tokens + 4
+
+
+def count_messages(messages, encoding_name="o200k_base"):
+    """메시지 목록 전체의 토큰 수"""
+    return sum(count_tokens(message, encoding_name) for message in messages)
+
+
+def _stub(message, tokens):
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    preview = content[:STUB_PREVIEW_CHARS].rstrip()
+    return (
+        f"[이전 tool 결과 생략: {getattr(message, 'name', None) or 'tool'}, 약 {tokens:,} tokens]\n"
+        f"{preview}{' ...' if len(content) > len(preview) else ''}\n"
+        "(필요하면 tool을 다시 실행하세요)"
+    )
+
+
+def prune_messages(messages, max_tokens=DEFAULT_MAX_TOKENS, keep_recent_turns=DEFAULT_KEEP_RECENT_TURNS, counter=count_tokens):
+    """
+    대화 기록이 max_tokens를 넘으면, 최근 keep_recent_turns 턴보다 오래된 ToolMessage를
+    오래된 것부터 짧은 요약(stub)으로 바꿉니다. tool_call_id는 유지되므로 AIMessage의
+    tool_calls와의 대응은 깨지지 않습니다.
+
+    Returns:
+        tuple: (messages, report)
+            - report: {"before": 토큰 수, "after": 토큰 수, "pruned": stub으로 바꾼 메시지 수}
+    """
+    counts = [counter(message) for message in messages]
+    before = sum(counts)
+    report = {"before": before, "after": before, "pruned": 0}
+    if before <= max_tokens:
+        return messages, report
+
+    # 최근 keep_recent_turns개의 사용자 메시지 이후는 그대로 유지
+    human_indexes = [i for i, message in enumerate(messages) if message.type == "human"]
+    protected_from = human_indexes[-keep_recent_turns] if len(human_indexes) >= keep_recent_turns else 0
+
+    pruned = list(messages)
+    total = before
+    for index in range(protected_from):
+        if total <= max_tokens:
+            break
+        message = messages[index]
+        if message.type != "tool":
+            continue
+        stub = message.model_copy(update={"content": _stub(message, counts[index])})
+        stub_tokens = counter(stub)
+        if stub_tokens >= counts[index]:
+            continue
+        pruned[index] = stub
+        total -= counts[index] - stub_tokens
+        report["pruned"] += 1
+    report["after"] = total
+    return pruned, report
+
+
+class ContextWindowMiddleware(AgentMiddleware):
+    """
+    LLM을 호출하기 전에 대화 기록의 토큰 수를 측정하고, 예산을 넘으면 오래된 tool 결과
+    (테이블 스키마, 쿼리 샘플, 실행 로그 등)를 stub으로 바꾼 메시지로 호출합니다.
+
+    checkpoint에 저장된 대화 기록은 바꾸지 않고, 이번 LLM 호출의 입력만 줄입니다.
+    측정 결과는 custom stream 이벤트({"source": "context", ...})와 tracing Span으로 보고합니다.
+    """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, keep_recent_turns=DEFAULT_KEEP_RECENT_TURNS):
+        super().__init__()
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+
+    def wrap_model_call(self, request, handler):
+        with span("context.prune", "context") as current:
+            messages, report = prune_messages(
+                request.messages, self.max_tokens, self.keep_recent_turns
+            )
+            current.set(**report)
+        try:
+            get_stream_writer()({"source": "context", "type": "context", **report})
+        except RuntimeError:
+            pass  # LangGraph 실행 밖에서 호출된 경우
+        if report["pruned"]:
+            request = request.override(messages=messages)
+        return handler(request)
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from src.processes import pid_alive
+
+
+# 작업 상태와 진행 이벤트를 저장할 디렉토리
+JOBS_DIR_ENV_VAR = "JOBS_DIR"
+DEFAULT_JOBS_DIR = "./.jobs"
+
+# 동시에 실행하는 작업 수 (모든 세션 합계)
+DEFAULT_MAX_WORKERS = 4
+
+# 끝난 작업의 기록을 보관하는 기간
+DEFAULT_MAX_AGE_SECONDS = 24 * 3600
+
+# 메모리에 보관하는 끝난 작업의 반환값 수 (오래된 것부터 버림)
+DEFAULT_MAX_RESULTS = 100
+
+# 진행 중 미리보기(스트리밍 중인 답변)를 저장하는 최소 간격 (초)
+PREVIEW_FLUSH_SECONDS = 0.2
+
+ACTIVE_STATES = ("queued", "running")
+FINISHED_STATES = ("succeeded", "failed", "interrupted")
+
+
+class JobNotFoundError(LookupError):
+    """해당 ID의 작업 기록이 없는 경우"""
+
+
+class ThreadBusyError(RuntimeError):
+    """대화(thread)에서 이미 다른 턴이 실행 중인 경우 (job_id: 실행 중인 작업, 포그라운드 실행이면 None)"""
+
+    def __init__(self, thread_id, job_id=None):
+        super().__init__(f"Thread is already running a turn: {thread_id}")
+        self.thread_id = thread_id
+        self.job_id = job_id
+
+
+class JobContext:
+    """
+    작업 함수에 전달되는 객체로, 진행 상황을 작업 저장소에 기록합니다.
+
+    - emit(): 진행 이벤트를 events.jsonl에 추가 (UI는 새로 추가된 이벤트만 이어서 읽어 표시)
+    - update(): 작업 기록(job.json)의 필드를 갱신
+    - recorder(): UI 컨테이너(st.status 등) 대신 전달하여 메서드 호출을 이벤트로 기록
+    - preview(): 스트리밍 중인 답변을 기록하는 placeholder (마지막 내용만 보관)
+    """
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self._seq = 0
+        self._previews = []
+
+    def emit(self, event):
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "ts": time.time(), **event}, ensure_ascii=False)
+        with open(self.manager._events_path(self.job_id), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def update(self, **fields):
+        self.manager._update(self.job_id, **fields)
+
+    def recorder(self, target):
+        return _Recorder(self, target)
+
+    def preview(self):
+        recorder = _PreviewRecorder(self)
+        self._previews.append(recorder)
+        return recorder
+
+    def flush(self):
+        """간격 제한으로 아직 저장하지 않은 미리보기를 저장합니다 (작업이 끝나기 전에 호출)."""
+        for recorder in self._previews:
+            recorder.flush()
+
+
+class _Recorder:
+    """메서드 호출을 {"type": "call", "target", "method", "args", "kwargs"} 이벤트로 기록합니다."""
+
+    def __init__(self, context, target):
+        self._context = context
+        self._target = target
+
+    def __getattr__(self, method):
+        def record(*args, **kwargs):
+            self._context.emit({
+                "type": "call", "target": self._target,
+                "method": method, "args": list(args), "kwargs": kwargs,
+            })
+        return record
+
+
+class _PreviewRecorder:
+    """st.empty()처럼 markdown()/empty()를 받아, 마지막 내용만 작업 기록의 preview에 저장합니다."""
+
+    def __init__(self, context):
+        self._context = context
+        self._flushed_at = 0.0
+        self._pending = None  # 아직 저장하지 않은 마지막 내용
+
+    def markdown(self, text):
+        # 토큰마다 파일을 쓰지 않도록 간격을 두고 저장
+        self._pending = text
+        if time.monotonic() - self._flushed_at >= PREVIEW_FLUSH_SECONDS:
+            self.flush()
+
+    def empty(self):
+        self._pending = ""
+        self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        self._flushed_at = time.monotonic()
+        text, self._pending = self._pending, None
+        self._context.update(preview=text)
+
+
+def replay(events, targets):
+    """기록된 "call" 이벤트를 실제 UI 컨테이너(targets[target])에 다시 적용합니다."""
+    for event in events:
+        if event.get("type") != "call" or event["target"] not in targets:
+            continue
+        getattr(targets[event["target"]], event["method"])(*event["args"], **event["kwargs"])
+
+
+class JobManager:
+    """
+    agent 실행(한 턴) 등의 오래 걸리는 작업을 로컬 worker pool에서 실행하고
+    상태와 진행 이벤트를 디스크(./.jobs/<job_id>/)에 기록합니다.
+
+    작업은 Streamlit의 script 스레드와 무관하게 실행되므로 브라우저 연결이 끊기거나
+    페이지를 새로고침해도 계속 실행되며, UI는 작업 ID로 진행 상황을 다시 읽어 표시할 수 있습니다.
+    프로세스가 종료되어 중단된 작업은 "interrupted"로 표시됩니다.
+
+    한 대화(thread_id)에서는 한 번에 하나의 턴만 실행합니다.
+    (같은 ?thread=를 연 다른 탭이 동시에 agent를 실행하거나, 실행 중에 대화를 초기화하지 않도록 함)
+    실행 중인 턴은 active_job() / is_busy()로 확인하고, 작업이 아닌 실행(포그라운드)은 claim()으로 표시합니다.
+
+    Example:
+    ===============
+    jobs = default_job_manager()
+    job_id = jobs.submit(lambda job: job.emit({"type": "log", "text": "..."}), thread_id=thread_id)
+    jobs.get(job_id)["status"]  # queued / running / succeeded / failed / interrupted
+    events, position = jobs.read_events(job_id)
+    """
+
+    def __init__(self, root=None, max_workers=DEFAULT_MAX_WORKERS, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.root = root or os.environ.get(JOBS_DIR_ENV_VAR, DEFAULT_JOBS_DIR)
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(self.root, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        # 이 프로세스에서 실행 중인 작업의 Future와, 실행이 끝날 때까지 유지할 객체
+        self._live = {}
+        # 끝난 작업의 반환값 (trace 등 디스크에 저장하지 않는 객체)
+        self._results = {}
+        # 대화별로 실행 중인 작업 ID (claim()으로 표시한 포그라운드 실행은 None)
+        self._threads = {}
+        self._lock = threading.Lock()
+        self.sweep()
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def _record_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), "job.json")
+
+    def _events_path(self, job_id):
+        return os.path.join(self._job_dir(job_id), "events.jsonl")
+
+    def _write(self, record):
+        # 읽는 쪽이 쓰다 만 파일을 보지 않도록 임시 파일에 쓴 뒤 교체
+        path = self._record_path(record["job_id"])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _read(self, job_id):
+        try:
+            with open(self._record_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise JobNotFoundError(f"Job not found: {job_id}") from None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            record = self._read(job_id)
+            record.update(fields, updated_at=time.time())
+            self._write(record)
+        return record
+
+    def submit(self, fn, thread_id=None, resources=()):
+        """
+        fn(JobContext)을 worker pool에서 실행하도록 등록합니다.
+
+        Args:
+            fn: 작업 함수. 반환값은 result()로 가져올 수 있음 (이 프로세스 안에서만)
+            thread_id: 작업이 속한 대화 ID
+            resources: 작업이 끝날 때까지 GC되지 않도록 유지할 객체 (세션의 Code Interpreter client 등)
+
+        Returns:
+            str: 작업 ID
+
+        Raises:
+            ThreadBusyError: thread_id의 다른 턴이 실행 중인 경우
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            if thread_id is not None and thread_id in self._threads:
+                raise ThreadBusyError(thread_id, self._threads[thread_id])
+            os.makedirs(self._job_dir(job_id), exist_ok=True)
+            self._write({
+                "job_id": job_id,
+                "thread_id": thread_id,
+                "status": "queued",
+                "pid": os.getpid(),
+                "created_at": now,
+                "updated_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "preview": "",
+            })
+            self._live[job_id] = {
+                "future": None, "thread_id": thread_id, "resources": tuple(resources),
+            }
+            if thread_id is not None:
+                self._threads[thread_id] = job_id
+        future = self._executor.submit(self._run, job_id, fn)
+        with self._lock:
+            if job_id in self._live:
+                self._live[job_id]["future"] = future
+        return job_id
+
+    def _run(self, job_id, fn):
+        self._update(job_id, status="running", started_at=time.time())
+        context = JobContext(self, job_id)
+        try:
+            try:
+                result = fn(context)
+            finally:
+                # 끝나기 직전의 답변이 잘린 채로 보이지 않도록 상태를 바꾸기 전에 저장
+                context.flush()
+        except Exception as e:
+            self._update(
+                job_id,
+                status="failed",
+                finished_at=time.time(),
+                error=f"{type(e).__name__}: {e}",
+                traceback=traceback.format_exc(),
+            )
+        else:
+            with self._lock:
+                self._results[job_id] = result
+                while len(self._results) > DEFAULT_MAX_RESULTS:
+                    self._results.pop(next(iter(self._results)))
+            self._update(job_id, status="succeeded", finished_at=time.time())
+        finally:
+            with self._lock:
+                live = self._live.pop(job_id, None)
+                if live is not None and self._threads.get(live["thread_id"]) == job_id:
+                    del self._threads[live["thread_id"]]
+
+    def active_job(self, thread_id):
+        """thread_id에서 실행 중인 작업의 ID (없거나 포그라운드 실행이면 None)"""
+        with self._lock:
+            return self._threads.get(thread_id)
+
+    def is_busy(self, thread_id):
+        """thread_id에서 턴(작업 또는 포그라운드 실행)이 실행 중인지 여부"""
+        with self._lock:
+            return thread_id in self._threads
+
+    @contextmanager
+    def claim(self, thread_id):
+        """
+        작업으로 실행하지 않는 턴(포그라운드 실행)이 실행 중임을 표시합니다.
+        with 블록 동안 같은 thread_id의 submit() / claim()은 ThreadBusyError가 됩니다.
+        """
+        with self._lock:
+            if thread_id in self._threads:
+                raise ThreadBusyError(thread_id, self._threads[thread_id])
+            self._threads[thread_id] = None
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.pop(thread_id, None)
+
+    def get(self, job_id):
+        """
+        작업 기록을 반환합니다. 실행 중으로 기록되어 있지만 실행하던 프로세스가
+        없어진 작업은 "interrupted"로 바꿔 반환합니다.
+        """
+        record = self._read(job_id)
+        if record["status"] in ACTIVE_STATES:
+            with self._lock:
+                live = job_id in self._live
+            if not live and (record["pid"] == os.getpid() or not pid_alive(record["pid"])):
+                record = self._update(
+                    job_id, status="interrupted", finished_at=time.time(),
+                    error="작업을 실행하던 프로세스가 종료되었습니다",
+                )
+        return record
+
+    def read_events(self, job_id, position=0):
+        """
+        진행 이벤트 파일의 position(바이트 위치) 이후에 추가된 이벤트를 읽습니다.
+        진행 상황을 주기적으로 표시할 때 파일을 처음부터 다시 읽지 않도록 반환된 위치를 다음 호출에 전달합니다.
+
+        Returns:
+            tuple: (events, position)
+        """
+        events = []
+        try:
+            with open(self._events_path(job_id), "rb") as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # 아직 쓰는 중인 마지막 줄
+                    events.append(json.loads(line))
+                    position += len(line)
+        except FileNotFoundError:
+            pass
+        return events, position
+
+    def result(self, job_id):
+        """끝난 작업의 반환값 (다른 프로세스에서 실행했거나 실패한 작업이면 None)"""
+        with self._lock:
+            return self._results.get(job_id)
+
+    def counts(self):
+        """이 프로세스에서 대기 중 / 실행 중인 작업 수"""
+        with self._lock:
+            futures = [live["future"] for live in self._live.values()]
+        running = sum(1 for future in futures if future is not None and future.running())
+        return {"queued": len(futures) - running, "running": running}
+
+    def sweep(self):
+        """
+        보관 기간이 지난 끝난 작업의 기록을 삭제합니다.
+
+        Returns:
+            int: 삭제한 작업 수
+        """
+        cutoff = time.time() - self.max_age_seconds
+        removed = 0
+        for job_id in os.listdir(self.root):
+            try:
+                record = self.get(job_id)
+            except (JobNotFoundError, json.JSONDecodeError, NotADirectoryError):
+                continue
+            if record["status"] in FINISHED_STATES and (record["finished_at"] or 0) < cutoff:
+                shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+                with self._lock:
+                    self._results.pop(job_id, None)
+                removed += 1
+        return removed
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def default_job_manager():
+    """프로세스 전체에서 공유하는 JobManager를 반환합니다."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager()
+        return _default_manager
@@ -0,0 +1,139 @@
+import atexit
+import threading
+from src.local_kernel import LocalKernel
+
+
+# 커널 시작 시 미리 import 해둘 분석용 라이브러리
+# (새 프로세스에서 pandas / numpy / matplotlib을 import 하는 데 약 1초가 걸림)
+PRELOAD_CODE = """
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+"""
+
+
+class KernelPool:
+    """
+    분석용 라이브러리를 미리 import 해둔 로컬 커널의 pool
+
+    - 커널은 세션 단위로 대여(lease)되며, 세션이 끝나면 반환(release)됩니다.
+    - 반환된 커널은 재사용하지 않고 종료합니다(세션마다 새 커널). 네임스페이스만 되돌려서는 모듈 상태
+      (pd.options, monkeypatch), os.environ, 실행 중인 스레드 등이 다음 세션에 남기 때문입니다.
+    - 부족해진 커널은 백그라운드 스레드에서 새로 준비합니다. idle 커널이 있으면 lease()는 바로 반환하고,
+      없으면 준비 중인 커널을 최대 timeout초 기다린 뒤 직접 생성합니다.
+
+    Example:
+    ===============
+    from src.kernel_pool import default_pool
+    from src.local_kernel import LocalKernelClient
+    code_interpreter = LocalKernelClient(kernel_pool=default_pool())
+    code_interpreter.run("print(pd.__version__)")
+    """
+
+    def __init__(self, size=2, preload_code=PRELOAD_CODE):
+        self.size = size
+        self.preload_code = preload_code
+        self._idle = []
+        self._leases = {}  # session_id -> LocalKernel
+        self._spawning = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._replenish()
+
+    def _create_kernel(self):
+        # 시간 초과 등으로 재시작된 커널도 다시 사전 import 하도록 LocalKernel에 맡김
+        return LocalKernel(preload_code=self.preload_code)
+
+    def _spawn(self):
+        try:
+            kernel = self._create_kernel()
+        except Exception as e:
+            print(f"[KernelPool] failed to start kernel: {e}")
+            kernel = None
+        with self._cond:
+            self._spawning -= 1
+            if kernel is not None:
+                if self._closed:
+                    kernel.stop()
+                else:
+                    self._idle.append(kernel)
+            self._cond.notify_all()
+
+    def _replenish(self):
+        """idle 커널이 size개가 되도록 백그라운드에서 커널을 준비합니다."""
+        with self._cond:
+            if self._closed:
+                return
+            missing = self.size - len(self._idle) - self._spawning
+            for _ in range(max(missing, 0)):
+                self._spawning += 1
+                threading.Thread(target=self._spawn, daemon=True).start()
+
+    def lease(self, session_id, timeout=30):
+        """
+        세션에 커널을 대여합니다. 이미 대여한 세션이면 같은 커널을 반환합니다.
+        idle 커널이 없으면 준비될 때까지 최대 timeout초 기다린 뒤 직접 생성합니다.
+        """
+        with self._cond:
+            if session_id in self._leases:
+                return self._leases[session_id]
+            self._cond.wait_for(lambda: self._idle or not self._spawning, timeout=timeout)
+            kernel = self._idle.pop(0) if self._idle else None
+        if kernel is None or not kernel.is_alive():
+            kernel = self._create_kernel()
+        with self._cond:
+            # 기다리는 동안 같은 세션의 다른 lease()가 먼저 대여한 경우 그 커널을 사용
+            # (가져온 커널은 아직 사용하지 않았으므로 idle로 되돌림)
+            leased = self._leases.get(session_id)
+            if leased is not None:
+                if self._closed:
+                    kernel.stop()
+                else:
+                    self._idle.append(kernel)
+                    self._cond.notify_all()
+                return leased
+            self._leases[session_id] = kernel
+        self._replenish()
+        return kernel
+
+    def release(self, session_id):
+        """세션이 대여한 커널을 종료하고, 대신할 커널을 백그라운드에서 준비합니다."""
+        with self._cond:
+            kernel = self._leases.pop(session_id, None)
+        if kernel is None:
+            return
+        kernel.stop()
+        self._replenish()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "leased": len(self._leases),
+                "spawning": self._spawning,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            kernels = self._idle + list(self._leases.values())
+            self._idle = []
+            self._leases = {}
+        for kernel in kernels:
+            kernel.stop()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    """프로세스 전체에서 공유하는 KernelPool을 반환합니다."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = KernelPool()
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
@@ -0,0 +1,153 @@
+"""
+로컬 Python 커널 프로세스
+
+LocalKernel이 subprocess로 실행하는 스크립트입니다.
+stdin으로 JSON 요청을 한 줄씩 받아 처리하고, 결과를 JSON 한 줄로 반환합니다.
+실행 간에 전역 네임스페이스를 유지하므로 Code Interpreter처럼 상태가 이어집니다.
+
+요청 예시：
+- {"op": "exec", "code": "print(1 + 1)", "cpu_seconds": 30}
+- {"op": "chdir", "path": "/tmp/kernel-xxx"}
+
+메모리 제한은 `--memory-bytes N` 인자로 받아 시작할 때 설정합니다 (0이면 제한하지 않음).
+"""
+
+import io
+import os
+import sys
+import json
+import signal
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+try:
+    import resource
+except ImportError:  # Windows 등 resource 모듈이 없는 환경
+    resource = None
+
+
+class CpuTimeExceeded(Exception):
+    pass
+
+
+def _on_cpu_limit(signum, frame):
+    raise CpuTimeExceeded("CPU time limit exceeded")
+
+
+def _set_cpu_limit(cpu_seconds):
+    """현재까지 사용한 CPU 시간 + cpu_seconds를 soft limit으로 설정합니다."""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + int(cpu_seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _set_memory_limit(memory_bytes):
+    """주소 공간(RLIMIT_AS)을 memory_bytes로 제한합니다."""
+    if resource is None or not memory_bytes:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def _clear_cpu_limit():
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _save_open_figures(output_dir):
+    """
+    저장되지 않은 matplotlib figure를 PNG로 저장합니다.
+    Code Interpreter가 plt.show()의 결과를 이미지로 반환하는 동작을 흉내냅니다.
+    """
+    if "matplotlib.pyplot" not in sys.modules:
+        return []
+    plt = sys.modules["matplotlib.pyplot"]
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for num in plt.get_fignums():
+        path = os.path.join(output_dir, f"figure_{os.getpid()}_{num}.png")
+        plt.figure(num).savefig(path, bbox_inches="tight")
+        paths.append(path)
+    plt.close("all")
+    return paths
+
+
+def _new_namespace():
+    return {"__name__": "__main__", "__builtins__": __builtins__}
+
+
+def _parse_memory_bytes(argv):
+    if "--memory-bytes" in argv:
+        return int(argv[argv.index("--memory-bytes") + 1])
+    return 0
+
+
+def main():
+    _set_memory_limit(_parse_memory_bytes(sys.argv[1:]))
+
+    # 사용자 코드의 출력이 프로토콜을 깨뜨리지 않도록
+    # 원래의 stdout은 프로토콜 전용으로 복제하고 fd 1은 stderr로 돌린다
+    # stdin도 같은 방식으로 복제하여, 사용자 코드의 input()이나 exit()(stdin을 닫음)이
+    # 프로토콜에 영향을 주지 않도록 한다
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    os.dup2(2, 1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    sys.stdout = sys.stderr
+
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    namespace = _new_namespace()
+
+    while True:
+        line = requests.readline()
+        if not line:
+            break
+        request = json.loads(line)
+        op = request.get("op")
+        response = {"ok": True}
+
+        if op == "exec":
+            stdout, stderr = io.StringIO(), io.StringIO()
+            error = None
+            try:
+                _set_cpu_limit(request.get("cpu_seconds"))
+                code = compile(request["code"], "<cell>", "exec")
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    exec(code, namespace)
+            except BaseException as e:
+                # 이 스크립트의 프레임은 제외하고 사용자 코드의 traceback만 반환
+                tb = e.__traceback__.tb_next if e.__traceback__ else None
+                error = "".join(traceback.format_exception(type(e), e, tb))
+            finally:
+                _clear_cpu_limit()
+            try:
+                figures = _save_open_figures(request.get("figure_dir", "."))
+            except Exception:
+                figures = []
+            response.update(
+                stdout=stdout.getvalue(),
+                stderr=stderr.getvalue(),
+                error=error,
+                figures=figures,
+            )
+        elif op == "chdir":
+            os.makedirs(request["path"], exist_ok=True)
+            os.chdir(request["path"])
+        else:
+            response = {"ok": False, "error": f"Unknown op: {op}"}
+
+        protocol.write(json.dumps(response, ensure_ascii=False) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import uuid
+import time
+import queue
+import shutil
+import weakref
+import functools
+import tempfile
+import threading
+import subprocess
+from src.artifact_store import default_store
+from src.renditions import create_renditions
+from src.tracing import span
+
+
+WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernel_worker.py")
+
+# Code Interpreter 기준의 경로를 로컬 작업 디렉토리로 변환하기 위한 매핑
+UPLOAD_DIR_ALIASES = ("/mnt/user-data/uploads/", "/mnt/data/")
+
+
+class KernelTimeout(Exception):
+    pass
+
+
+class LocalKernel:
+    """
+    상태를 유지하는 로컬 Python 커널 프로세스 (src/kernel_worker.py)를 관리하는 클래스
+
+    - 프로세스 시작 시 메모리(RLIMIT_AS) 제한을 적용 (kernel_worker.py가 시작할 때 스스로 설정)
+    - 실행마다 CPU 시간 제한(RLIMIT_CPU)과 wall-clock 제한(timeout)을 적용
+    - 환경 변수(API 키 등)를 전달하지 않고 작업 디렉토리 안에서 실행
+
+    OS 수준의 완전한 격리는 아니므로, 신뢰할 수 있는 배포 환경에서만 사용하세요.
+
+    preload_code를 주면 프로세스를 시작할 때마다(시간 초과 등으로 재시작한 경우 포함) 먼저 실행합니다.
+    """
+
+    def __init__(
+        self, memory_bytes=2 * 1024 * 1024 * 1024, cpu_seconds=60, timeout=120, preload_code=None
+    ):
+        self.memory_bytes = memory_bytes
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+        self.preload_code = preload_code
+        self.cwd = None
+        self.process = None
+        self.start()
+
+    def start(self):
+        env = {
+            "PATH": os.environ.get("PATH", ""),
+            "MPLBACKEND": "Agg",
+            "PYTHONUNBUFFERED": "1",
+            "PYTHONIOENCODING": "utf-8",
+        }
+        # 자원 제한은 preexec_fn 대신 worker가 시작할 때 설정
+        # (preexec_fn은 pool의 스레드 등 부모 프로세스에 스레드가 있으면 안전하지 않음)
+        self.process = subprocess.Popen(
+            [sys.executable, "-u", WORKER_PATH, "--memory-bytes", str(self.memory_bytes or 0)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.cwd,
+            env=env,
+        )
+        # pipe에 select()를 사용할 수 없는 환경(Windows)에서도 timeout을 적용할 수 있도록
+        # 응답은 별도 스레드에서 읽어 queue로 전달 (프로세스가 종료되면 None)
+        self._responses = queue.Queue()
+        threading.Thread(
+            target=self._read_responses, args=(self.process.stdout, self._responses), daemon=True
+        ).start()
+        if self.preload_code:
+            # preload 중 종료되어도 재시작을 반복하지 않도록 restart=False
+            try:
+                result = self.request({"op": "exec", "code": self.preload_code}, restart=False)
+            except (KernelTimeout, RuntimeError) as e:
+                result = {"error": str(e)}
+            if result.get("error"):
+                print(f"[LocalKernel] preload failed:\n{result['error']}")
+
+    @staticmethod
+    def _read_responses(stdout, responses):
+        for line in iter(stdout.readline, b""):
+            responses.put(line)
+        responses.put(None)
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def request(self, payload, timeout=None, restart=True):
+        """
+        커널에 요청을 보내고 응답(dict)을 반환합니다.
+        시간 초과나 프로세스 종료 시 restart=True이면 커널을 다시 시작하고, False이면 종료만 합니다.
+        """
+        if not self.is_alive():
+            self.start()
+        self.process.stdin.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+
+        try:
+            line = self._responses.get(timeout=timeout or self.timeout)
+        except queue.Empty:
+            # 시간 초과 시 커널을 다시 시작 (상태는 초기화됨)
+            self.restart() if restart else self.stop()
+            raise KernelTimeout(f"Execution timed out after {timeout or self.timeout} seconds") from None
+        if not line:
+            # 메모리 제한 등으로 커널 프로세스가 종료된 경우
+            returncode = self.process.poll()
+            self.restart() if restart else self.stop()
+            raise RuntimeError(f"Kernel process exited (returncode={returncode})")
+        return json.loads(line)
+
+    def chdir(self, path):
+        """커널의 작업 디렉토리를 변경합니다. 재시작 후에도 유지됩니다."""
+        self.cwd = path
+        return self.request({"op": "chdir", "path": path})
+
+    def execute(self, code, figure_dir="."):
+        return self.request(
+            {"op": "exec", "code": code, "cpu_seconds": self.cpu_seconds, "figure_dir": figure_dir}
+        )
+
+
+class LocalKernelClient:
+    """
+    CodeInterpreterClient와 같은 인터페이스(run(code) -> (text, files))로
+    로컬 커널에서 Python 코드를 실행하는 클래스
+
+    Responses API 왕복(수 초) 없이 실행되므로 df.head() 같은 간단한 코드는
+    밀리초 단위로 결과를 돌려받을 수 있습니다.
+
+    주요 메서드：
+    - upload_file(file_content, filename): 작업 디렉토리의 uploads/에 파일을 저장한다
+    - run(code): 로컬 커널에서 Python 코드를 실행한다
+    - close(): 커널을 종료하고 작업 디렉토리와 아티팩트를 정리한다
+
+    Example:
+    ===============
+    from src.local_kernel import LocalKernelClient
+    code_interpreter = LocalKernelClient()
+    code_interpreter.upload_file(open('iris.csv', 'rb').read(), 'iris.csv')
+    code_interpreter.run("import pandas as pd\nprint(pd.read_csv('/mnt/user-data/uploads/iris.csv').head())")
+    """
+
+    def __init__(self, session_id=None, artifact_store=None, kernel_pool=None):
+        self.file_ids = []
+        self.session_id = session_id or uuid.uuid4().hex
+        self.artifact_store = artifact_store or default_store()
+        self.workdir = tempfile.mkdtemp(prefix=f"kernel-{self.session_id[:8]}-")
+        self.upload_dir = os.path.join(self.workdir, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        if kernel_pool is not None:
+            # 사전 준비된 커널을 pool에서 빌려오고, 종료 시 pool에 반환
+            self.kernel = kernel_pool.lease(self.session_id)
+            release_kernel = functools.partial(kernel_pool.release, self.session_id)
+        else:
+            self.kernel = LocalKernel()
+            release_kernel = self.kernel.stop
+        self.kernel.chdir(self.workdir)
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(
+            self, self._cleanup, release_kernel, self.workdir, self.artifact_store, self.session_id
+        )
+
+    @staticmethod
+    def _cleanup(release_kernel, workdir, artifact_store, session_id):
+        release_kernel()
+        shutil.rmtree(workdir, ignore_errors=True)
+        artifact_store.clear_session(session_id)
+
+    def close(self):
+        """세션 종료 시 커널, 작업 디렉토리, 아티팩트를 정리합니다."""
+        self._finalizer()
+
+    def upload_file(self, file_content, filename="uploaded_file.csv"):
+        """
+        파일을 작업 디렉토리의 uploads/에 저장합니다.
+
+        Args:
+            file_content: File content (bytes)
+            filename: 저장할 파일명
+        Returns:
+            filename: 커널에서 접근 가능한 파일명
+        """
+        with span("code_interpreter.upload", "upload", filename=filename, bytes=len(file_content)):
+            with open(os.path.join(self.upload_dir, filename), "wb") as f:
+                f.write(file_content)
+        self.file_ids.append(filename)
+        return filename
+
+    def _rewrite_paths(self, code):
+        """Code Interpreter 기준의 경로(/mnt/...)를 로컬 경로로 변환합니다."""
+        for alias in UPLOAD_DIR_ALIASES:
+            code = code.replace(alias, self.upload_dir + os.sep)
+        return code
+
+    def _snapshot(self):
+        """작업 디렉토리의 파일 목록과 수정 시각을 반환합니다."""
+        snapshot = {}
+        for dirpath, _, filenames in os.walk(self.workdir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                snapshot[path] = os.stat(path).st_mtime_ns
+        return snapshot
+
+    def _store_file(self, path):
+        with open(path, "rb") as f:
+            data_bytes = f.read()
+        extension = os.path.splitext(path)[1]
+        stored_path = self.artifact_store.put(
+            self.session_id,
+            data_bytes,
+            name=os.path.relpath(path, self.workdir),
+            extension=extension,
+        )
+        create_renditions(stored_path)
+        return stored_path
+
+    def run(self, code, on_event=None):
+        """
+        로컬 커널에서 Python 코드를 실행합니다.
+
+        Args:
+            code: 실행할 Python 코드 문자열
+            on_event: 이벤트(dict)를 받는 콜백 (CodeInterpreterClient.run_stream()과 같은 형식)
+
+        Returns:
+            tuple: (text_content, file_names)
+        """
+        emit = on_event or (lambda event: None)
+        with self._lock:
+            emit({"type": "status", "status": "interpreting"})
+            before = self._snapshot()
+            started_at = time.perf_counter()
+            try:
+                with span("code_interpreter.execute", "remote_exec", backend="local"):
+                    result = self.kernel.execute(self._rewrite_paths(code), figure_dir=self.workdir)
+            except (KernelTimeout, RuntimeError) as e:
+                text_content = f"[Code Interpreter 오류]\n{e}\n(커널이 다시 시작되어 이전 상태가 초기화되었습니다)"
+                emit({"type": "done", "text": text_content, "files": []})
+                return text_content, []
+            elapsed = time.perf_counter() - started_at
+
+            code_output = result.get("stdout", "") + result.get("stderr", "")
+            if result.get("error"):
+                code_output += f"\n[ERROR]: {result['error']}"
+            if code_output:
+                emit({"type": "logs", "text": code_output})
+
+            file_names = []
+            after = self._snapshot()
+            for path, mtime in sorted(after.items()):
+                if before.get(path) != mtime:
+                    stored_path = self._store_file(path)
+                    file_names.append(stored_path)
+                    emit({"type": "file", "path": stored_path, "name": os.path.basename(path)})
+
+            text_content = f"[실행 결과]\n{code_output}\n\n(local kernel, {elapsed * 1000:.0f} ms)"
+            emit({"type": "status", "status": "completed"})
+            emit({"type": "done", "text": text_content, "files": file_names})
+            return text_content, file_names
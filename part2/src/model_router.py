@@ -0,0 +1,123 @@
+import time
+
+from langchain.agents.middleware import AgentMiddleware
+from langgraph.config import get_stream_writer
+
+from src.context_window import count_messages
+from src.tracing import span
+
+
+# 모델별 가격 (USD / 1M tokens, (input, output))
+MODEL_PRICES = {
+    "gpt-5.2": (1.75, 14.00),
+    "claude-sonnet-4-5-20250929": (3.00, 15.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+# 대화 기록이 이 토큰 수를 넘으면 step 종류와 관계없이 강한 모델을 사용
+DEFAULT_LARGE_CONTEXT_TOKENS = 8000
+
+# 결과를 받은 뒤의 step이 간단한 작업(테이블 선택, SQL 작성)인 tool
+FAST_FOLLOWUP_TOOLS = {"sql_table_info"}
+
+
+def model_name(chat_model):
+    """chat model 객체의 모델 ID (provider마다 속성 이름이 다름)"""
+    name = getattr(chat_model, "model_name", None) or getattr(chat_model, "model", None) or ""
+    return str(name).removeprefix("models/")
+
+
+def estimate_cost(name, input_tokens, output_tokens):
+    """토큰 수로 비용(USD)을 계산합니다. 가격을 모르는 모델이면 None을 반환합니다."""
+    if name not in MODEL_PRICES:
+        return None
+    input_price, output_price = MODEL_PRICES[name]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def classify_step(messages, context_tokens, large_context_tokens=DEFAULT_LARGE_CONTEXT_TOKENS):
+    """
+    이번 LLM 호출이 어떤 step인지 판단하고 사용할 모델 등급을 반환합니다.
+
+    - plan: 턴의 첫 호출 (분석할 테이블 선택) → fast
+    - write_sql: 테이블 정보를 받은 직후 (SQL 작성) → fast
+    - analysis: 쿼리/코드 실행 결과를 받은 직후 (분석 코드 작성, 답변 작성) → strong
+    - recover: tool이 오류를 반환한 직후 → strong
+    - large_context: 대화 기록이 large_context_tokens를 넘는 경우 → strong
+
+    Returns:
+        tuple: (step, "fast" 또는 "strong")
+    """
+    # 마지막 AIMessage 이후의 ToolMessage (= 직전 step에서 실행한 tool의 결과)
+    tool_messages = []
+    for message in reversed(messages):
+        if message.type != "tool":
+            break
+        tool_messages.append(message)
+
+    if context_tokens > large_context_tokens:
+        return "large_context", "strong"
+    if any(getattr(message, "status", None) == "error" for message in tool_messages):
+        return "recover", "strong"
+    if not tool_messages:
+        return "plan", "fast"
+    if all(message.name in FAST_FOLLOWUP_TOOLS for message in tool_messages):
+        return "write_sql", "fast"
+    return "analysis", "strong"
+
+
+class ModelRouterMiddleware(AgentMiddleware):
+    """
+    LLM 호출(step)마다 step 종류와 대화 기록의 크기로 모델을 고르고, 호출별 지연과 비용을 기록합니다.
+
+    models={"fast": 빠르고 저렴한 모델, "strong": 강한 모델}을 전달하면 라우팅하고,
+    None이면 create_agent(model=...)의 모델을 그대로 사용하면서 지연과 비용만 기록합니다.
+    (고정 모델과 라우팅의 결과를 같은 기준으로 비교할 수 있도록 함)
+
+    측정 결과는 custom stream 이벤트({"source": "router", ...})와 tracing Span으로 보고합니다.
+    이벤트의 baseline_cost_usd는 같은 토큰 수를 강한 모델로 처리했을 때의 추정 비용입니다.
+    """
+
+    def __init__(self, models=None, large_context_tokens=DEFAULT_LARGE_CONTEXT_TOKENS):
+        super().__init__()
+        self.models = models
+        self.large_context_tokens = large_context_tokens
+
+    def wrap_model_call(self, request, handler):
+        # ContextWindowMiddleware가 먼저 센 메시지이므로 캐시된 토큰 수를 사용 (다시 encode하지 않음)
+        context_tokens = count_messages(request.messages)
+        step, tier = classify_step(request.messages, context_tokens, self.large_context_tokens)
+        if self.models:
+            request = request.override(model=self.models[tier])
+        else:
+            tier = None
+        name = model_name(request.model)
+
+        with span("model.route", "llm", step=step, tier=tier, model=name) as current:
+            started_at = time.perf_counter()
+            response = handler(request)
+            latency_ms = int((time.perf_counter() - started_at) * 1000)
+
+            usage = {}
+            for message in response.result:
+                usage = getattr(message, "usage_metadata", None) or usage
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+            baseline = model_name(self.models["strong"]) if self.models else name
+            report = {
+                "step": step,
+                "tier": tier,
+                "model": name,
+                "context_tokens": context_tokens,
+                "latency_ms": latency_ms,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cost_usd": estimate_cost(name, input_tokens, output_tokens),
+                "baseline_cost_usd": estimate_cost(baseline, input_tokens, output_tokens),
+            }
+            current.set(**report)
+        try:
+            get_stream_writer()({"source": "router", "type": "route", **report})
+        except RuntimeError:
+            pass  # LangGraph 실행 밖에서 호출된 경우
+        return response
@@ -0,0 +1,75 @@
+import os
+
+
+# LLM에 그대로 전달할 실행 결과의 최대 길이 (문자 수)
+# 이보다 긴 결과는 앞/뒤 일부만 남기고, 전체 로그는 아티팩트로 저장
+DEFAULT_MAX_CHARS = 4000
+
+# read_execution_log 도구가 한 번에 반환하는 길이 (문자 수)
+DEFAULT_PAGE_CHARS = 4000
+
+
+def truncate_output(text, max_chars=DEFAULT_MAX_CHARS, head_ratio=0.6):
+    """
+    max_chars를 넘는 텍스트를 앞부분(head)과 뒷부분(tail)만 남기고 자릅니다.
+
+    Returns:
+        tuple: (text, truncated)
+    """
+    if len(text) <= max_chars:
+        return text, False
+    head_chars = int(max_chars * head_ratio)
+    tail_chars = max_chars - head_chars
+    omitted = len(text) - head_chars - tail_chars
+    preview = (
+        f"{text[:head_chars]}\n"
+        f"... [중략: 전체 {len(text):,}자 중 {omitted:,}자 생략] ...\n"
+        f"{text[-tail_chars:] if tail_chars else ''}"
+    )
+    return preview, True
+
+
+def spill_and_truncate(text, session_id, artifact_store, max_chars=DEFAULT_MAX_CHARS):
+    """
+    출력이 예산을 넘으면 전체 로그를 아티팩트(.log)로 저장하고 잘린 미리보기를 반환합니다.
+
+    Returns:
+        tuple: (text, truncated, log_path)
+            - log_path: 전체 로그의 경로 (잘리지 않은 경우 None)
+    """
+    preview, truncated = truncate_output(text, max_chars)
+    if not truncated:
+        return text, False, None
+    log_path = artifact_store.put(
+        session_id, text.encode("utf-8"), name="execution.log", extension=".log"
+    )
+    preview += (
+        f"\n\n[전체 로그: {log_path} "
+        f"(read_execution_log 도구에 offset을 지정하여 페이지 단위로 조회 가능)]"
+    )
+    return preview, True, log_path
+
+
+def read_log_page(path, artifact_store, offset=0, limit=DEFAULT_PAGE_CHARS):
+    """
+    spill_and_truncate()가 저장한 로그의 일부를 반환합니다.
+    아티팩트 저장소 안의 .log 파일만 읽을 수 있습니다.
+
+    한 번에 반환하는 길이는 출력 예산과 같은 DEFAULT_PAGE_CHARS로 제한하고,
+    음수 offset은 0으로 취급합니다.
+    """
+    offset = max(int(offset), 0)
+    limit = min(max(int(limit), 1), DEFAULT_PAGE_CHARS)
+    root = os.path.realpath(artifact_store.root)
+    real_path = os.path.realpath(path)
+    if not real_path.startswith(root + os.sep) or not real_path.endswith(".log"):
+        raise ValueError(f"Not an execution log: {path}")
+    with open(real_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    page = text[offset:offset + limit]
+    next_offset = offset + len(page)
+    footer = (
+        f"\n\n[{offset:,}-{next_offset:,} / 전체 {len(text):,}자"
+        + (f", 다음 offset: {next_offset}]" if next_offset < len(text) else ", 끝]")
+    )
+    return page + footer
@@ -0,0 +1,19 @@
+import os
+
+
+def pid_alive(pid):
+    """
+    같은 호스트에서 pid의 프로세스가 살아 있는지 확인합니다.
+
+    signal 0으로 확인하는 방법은 POSIX에서만 안전하므로 (Windows의 os.kill은 프로세스를 종료함)
+    그 외의 환경에서는 살아 있는 것으로 간주합니다. 호출하는 쪽은 lease 만료 등으로 보완해야 합니다.
+    """
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,59 @@
+import os
+
+
+IMAGE_EXTENSIONS = (".png", ".jpeg", ".jpg", ".gif", ".bmp", ".webp")
+
+# 화면 표시용 / 썸네일용 이미지의 최대 크기(px)와 WebP 품질
+RENDITION_SIZES = {"display": 1280, "thumbnail": 320}
+WEBP_QUALITY = 80
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def rendition_path(path, kind):
+    """
+    원본 이미지 옆에 저장되는 rendition의 경로를 반환합니다.
+    예: ./files/objects/ab/abcd.png -> ./files/objects/ab/abcd.display.webp
+    """
+    return f"{os.path.splitext(path)[0]}.{kind}.webp"
+
+
+def create_renditions(path):
+    """
+    다운로드한 이미지로부터 화면 표시용(display)과 썸네일(thumbnail) WebP를 생성합니다.
+    Pillow가 없거나 이미지가 아닌 경우에는 아무것도 하지 않습니다.
+
+    Returns:
+        dict: {"display": 경로, "thumbnail": 경로} (생성된 것만 포함)
+    """
+    if not is_image(path):
+        return {}
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    created = {}
+    try:
+        with Image.open(path) as image:
+            image.load()
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA")
+            for kind, max_size in RENDITION_SIZES.items():
+                output_path = rendition_path(path, kind)
+                if not os.path.exists(output_path):
+                    rendition = image.copy()
+                    rendition.thumbnail((max_size, max_size))
+                    rendition.save(output_path, "WEBP", quality=WEBP_QUALITY)
+                created[kind] = output_path
+    except OSError as e:
+        print(f"[renditions] failed to process {path}: {e}")
+    return created
+
+
+def display_path(path, kind="display"):
+    """rendition이 있으면 그 경로를, 없으면 원본 경로를 반환합니다."""
+    candidate = rendition_path(path, kind)
+    return candidate if os.path.exists(candidate) else path
@@ -0,0 +1,193 @@
+import time
+import random
+import threading
+
+import httpx
+import openai
+
+
+# 재시도할 HTTP 상태 코드 (timeout, rate limit, 서버 오류)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Assistants API의 run.last_error.code 중 재시도할 코드
+RETRYABLE_ERROR_CODES = {"rate_limit_exceeded", "server_error"}
+
+
+class CircuitOpenError(Exception):
+    """circuit breaker가 열려 있어 호출을 즉시 거부한 경우"""
+
+
+class DeadlineExceeded(Exception):
+    """호출별 deadline을 넘긴 경우"""
+
+
+def is_retryable(exc):
+    """
+    일시적인 오류(429, 5xx, timeout, 연결 오류)인지 판별합니다.
+    400, 401 등 요청 자체가 잘못된 오류는 재시도하지 않습니다.
+    """
+    if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None and isinstance(exc, httpx.HTTPStatusError):
+        status_code = exc.response.status_code
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return getattr(exc, "code", None) in RETRYABLE_ERROR_CODES
+
+
+class RetryPolicy:
+    """
+    지수 backoff + full jitter 재시도 정책
+
+    n번째 재시도 전 대기 시간 = uniform(0, min(max_delay, base_delay * 2**n))
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold에 도달하면 reset_timeout 동안 호출을 즉시 거부합니다.
+    reset_timeout이 지나면 한 번의 시험 호출(half-open)만 허용하고,
+    성공하면 닫히고 실패하면 다시 열립니다. 시험 호출이 끝날 때까지 다른 호출은 계속 즉시 거부합니다.
+
+    장애 상황에서 세션들이 느린 호출에 묶여 스레드가 쌓이는 대신 빠르게 실패하도록 합니다.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        호출해도 되는지 확인합니다. 거부하는 경우 CircuitOpenError가 발생합니다.
+
+        Returns:
+            bool: 이 호출이 half-open 상태의 시험 호출인지 여부
+                (True이면 호출이 끝난 뒤 결과와 관계없이 release_trial()을 호출해야 함)
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(
+                        f"Circuit '{self.name}' is open; failing fast "
+                        f"(retry after {self.reset_timeout:.0f}s)"
+                    )
+                self.state = "half-open"
+            if self.state == "half-open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError(
+                        f"Circuit '{self.name}' is half-open; failing fast while a trial call is in flight"
+                    )
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self):
+        """
+        시험 호출을 끝냅니다. 성공/실패를 기록하지 못한 경우(재시도하지 않는 오류, deadline 초과 등)
+        half-open 상태로 남으므로 다음 호출이 다시 시험 호출이 됩니다.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class Deadline:
+    """호출 전체(재시도 포함)에 허용된 시간"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def call_with_resilience(
+    func, *args, policy=None, breaker=None, deadline=None, timeout_kwarg="timeout", **kwargs
+):
+    """
+    재시도 정책, circuit breaker, deadline을 적용하여 func를 호출합니다.
+
+    Args:
+        func: 호출할 함수 (OpenAI SDK 메서드 등)
+        policy: RetryPolicy (생략 시 기본 정책)
+        breaker: CircuitBreaker (생략 시 default_breaker())
+        deadline: Deadline (지정하면 남은 시간을 func의 timeout 인자로 전달)
+        timeout_kwarg: 남은 시간을 전달할 인자 이름 (None이면 전달하지 않음)
+    """
+    policy = policy or RetryPolicy()
+    breaker = breaker or default_breaker()
+
+    for attempt in range(policy.max_attempts):
+        trial = breaker.before_call()
+        try:
+            if deadline is not None:
+                if deadline.expired():
+                    raise DeadlineExceeded("Deadline exceeded before the call completed")
+                if timeout_kwarg:
+                    kwargs[timeout_kwarg] = deadline.remaining()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= policy.max_attempts:
+                    raise
+                delay = policy.backoff(attempt)
+                if deadline is not None:
+                    if deadline.remaining() <= delay:
+                        raise DeadlineExceeded("Deadline exceeded while retrying") from e
+                print(f"[Retry] {type(e).__name__}: {e} (attempt {attempt + 1}/{policy.max_attempts}, {delay:.1f}s 대기)")
+            else:
+                breaker.record_success()
+                return result
+        finally:
+            # 시험 호출이 결과를 기록하지 못하고 끝나도 half-open에 묶이지 않도록 해제
+            if trial:
+                breaker.release_trial()
+        time.sleep(delay)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def default_breaker(name="openai"):
+    """프로세스 전체에서 공유하는 이름별 CircuitBreaker를 반환합니다."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
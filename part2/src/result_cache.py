@@ -0,0 +1,265 @@
+import os
+import uuid
+import hashlib
+import textwrap
+import threading
+from collections import OrderedDict
+from src.renditions import create_renditions
+from src.tracing import span
+
+
+# 코드 안에 이 주석이 있으면 캐시를 사용하지 않음 (난수, 현재 시각 등 비결정적 코드용)
+NO_CACHE_MARKER = "# no-cache"
+
+# 오류가 발생한 실행 결과는 캐시하지 않음
+ERROR_MARKERS = ("[Code Interpreter 오류]", "[ERROR]:")
+
+
+def normalize_code(code):
+    """
+    캐시 키 계산을 위해 코드를 정규화합니다.
+    들여쓰기 공통 부분, 줄 끝 공백, 빈 줄의 차이는 같은 코드로 취급합니다.
+    """
+    lines = textwrap.dedent(code).splitlines()
+    return "\n".join(line.rstrip() for line in lines if line.strip())
+
+
+class ResultCache:
+    """
+    Code Interpreter 실행 결과를 저장하는 크기 제한 LRU 캐시
+
+    키는 정규화된 코드와 코드가 읽는 파일의 내용 hash로 계산하며,
+    값으로 텍스트 결과와 아티팩트 경로를 저장합니다.
+    여러 세션에서 공유할 수 있도록 thread-safe 하게 구현되어 있습니다.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=50 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> {"text", "files", "size"}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(code, file_hashes, history=""):
+        """
+        Args:
+            code: 실행할 코드
+            file_hashes: {파일명: sha256} 중 코드가 참조하는 파일의 hash
+            history: 세션에서 이전에 실행한 코드의 digest (변수 등 상태 의존성 반영)
+        """
+        digest = hashlib.sha256(history.encode("utf-8"))
+        digest.update(normalize_code(code).encode("utf-8"))
+        for filename in sorted(file_hashes):
+            digest.update(f"\0{filename}\0{file_hashes[filename]}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def discard(self, key):
+        """캐시된 아티팩트가 사라진 경우 등 항목을 무효화합니다."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry["size"]
+                # get()에서 hit로 집계된 것을 miss로 정정
+                self.hits -= 1
+                self.misses += 1
+
+    def put(self, key, text, files):
+        size = len(text.encode("utf-8")) + sum(
+            os.path.getsize(path) for path in files if os.path.exists(path)
+        )
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)["size"]
+            self._entries[key] = {"text": text, "files": list(files), "size": size}
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["size"]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+class MemoizedCodeInterpreter:
+    """
+    Code Interpreter client 앞단에서 실행 결과를 재사용하는 wrapper
+
+    재시도, 후속 질문, 같은 파일을 분석하는 다른 세션 등에서
+    동일한 코드가 다시 실행되면 캐시된 텍스트와 아티팩트를 반환합니다.
+
+    코드는 이전에 실행한 코드(변수 정의 등)와 그 코드가 읽은 데이터에 의존하므로, 캐시 키에는
+    세션에서 지금까지 실행한 코드와 업로드한 파일의 digest가 포함됩니다.
+    (같은 코드라도 다른 데이터를 읽은 세션에서는 다른 키가 됨)
+    캐시 hit로 실제 실행을 건너뛴 코드는 다음 cache miss 때 출력 없이 먼저 실행하여
+    커널/Container의 상태를 맞춥니다.
+
+    난수, 현재 시각, 외부 상태에 의존하는 코드는 run(code, cacheable=False)
+    또는 코드 안의 `# no-cache` 주석으로 캐시를 끄세요.
+
+    Example:
+    ===============
+    from src.result_cache import MemoizedCodeInterpreter, default_cache
+    code_interpreter = MemoizedCodeInterpreter(CodeInterpreterClient(), default_cache())
+    code_interpreter.run("print(1 + 1)")
+    """
+
+    def __init__(self, client, cache=None):
+        self.client = client
+        self.cache = cache
+        self.file_hashes = {}  # 업로드한 파일명 -> sha256
+        self._history = ""  # 지금까지 실행한 코드와 업로드한 파일의 digest
+        self._uploads = []  # 다음 실행 전에 _history에 반영할 업로드 (파일명, sha256)
+        self._pending = []  # 캐시 hit로 아직 실제로 실행되지 않은 코드
+        # 병렬 tool 호출에서 실행(_history, _pending 갱신)은 한 번에 하나씩,
+        # 업로드(exec_query)는 실행과 동시에 할 수 있도록 lock을 나눔
+        self._run_lock = threading.RLock()
+        self._files_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # session_id, artifact_store, close() 등은 감싼 client에 위임
+        return getattr(self.client, name)
+
+    def upload_file(self, file_content, filename="uploaded_file.csv"):
+        digest = hashlib.sha256(file_content).hexdigest()
+        with self._files_lock:
+            self.file_hashes[filename] = digest
+            # 업로드는 실행과 동시에 할 수 있으므로 _history에는 다음 실행을 시작할 때 반영
+            self._uploads.append((filename, digest))
+        return self.client.upload_file(file_content, filename)
+
+    def _referenced_file_hashes(self, code):
+        with self._files_lock:
+            file_hashes = dict(self.file_hashes)
+        return {
+            filename: digest
+            for filename, digest in file_hashes.items()
+            if filename in code
+        }
+
+    def _restore_files(self, files):
+        """캐시된 아티팩트를 현재 세션의 저장소에 다시 등록합니다."""
+        restored = []
+        for path in files:
+            with open(path, "rb") as f:
+                data_bytes = f.read()
+            restored_path = self.artifact_store.put(
+                self.session_id,
+                data_bytes,
+                name=os.path.basename(path),
+                extension=os.path.splitext(path)[1],
+            )
+            create_renditions(restored_path)
+            restored.append(restored_path)
+        return restored
+
+    def _with_pending(self, code):
+        """캐시 hit로 건너뛴 코드를 출력 없이 먼저 실행하도록 앞에 붙입니다."""
+        if not self._pending:
+            return code
+        replay = "\n".join(
+            f"    exec(compile({pending!r}, '<cached>', 'exec'))" for pending in self._pending
+        )
+        self._pending = []
+        return (
+            "import contextlib as _ctx, io as _io\n"
+            "with _ctx.redirect_stdout(_io.StringIO()), _ctx.redirect_stderr(_io.StringIO()):\n"
+            f"{replay}\n"
+            f"{code}"
+        )
+
+    def _advance_history(self, code):
+        self._history = hashlib.sha256(
+            (self._history + normalize_code(code)).encode("utf-8")
+        ).hexdigest()
+
+    def _absorb_uploads(self):
+        """지난 실행 이후 업로드한 파일을 _history에 반영합니다 (같은 파일명을 덮어쓴 경우 포함)."""
+        with self._files_lock:
+            uploads, self._uploads = self._uploads, []
+        for filename, digest in uploads:
+            self._advance_history(f"# upload {filename} {digest}")
+
+    def _poison_history(self):
+        """
+        실행 후의 커널 상태를 코드로 재현할 수 없는 경우(오류로 중단, 비결정적 코드) 고유한 값을 섞어
+        이후의 캐시 키가 이전에 저장된 어떤 상태와도 일치하지 않도록 합니다.
+        """
+        self._advance_history(f"# unreproducible state {uuid.uuid4().hex}")
+
+    def run(self, code, on_event=None, cacheable=True):
+        with self._run_lock:
+            return self._run(code, on_event, cacheable)
+
+    def _run(self, code, on_event, cacheable):
+        self._absorb_uploads()
+        if self.cache is None or not cacheable or NO_CACHE_MARKER in code:
+            self._poison_history()
+            return self.client.run(self._with_pending(code), on_event=on_event)
+
+        emit = on_event or (lambda event: None)
+        key = self.cache.make_key(code, self._referenced_file_hashes(code), self._history)
+        with span("result_cache.lookup", "cache") as current:
+            entry = self.cache.get(key)
+            current.set(hit=entry is not None)
+        if entry is not None:
+            try:
+                files = self._restore_files(entry["files"])
+            except (FileNotFoundError, ValueError):
+                # 아티팩트가 eviction 된 경우 다시 실행
+                self.cache.discard(key)
+            else:
+                # 키에는 코드가 읽은 파일의 hash가 포함되므로 이후의 키도 같은 데이터에서만 일치
+                self._history = key
+                self._pending.append(textwrap.dedent(code))
+                emit({"type": "status", "status": "cached"})
+                for path in files:
+                    emit({"type": "file", "path": path})
+                emit({"type": "done", "text": entry["text"], "files": files})
+                return entry["text"], files
+
+        text_content, file_names = self.client.run(self._with_pending(code), on_event=on_event)
+        if any(marker in text_content for marker in ERROR_MARKERS):
+            # 오류 전까지 실행된 부분(x = 2; 1/0의 x 등)이나 커널 재시작으로 상태가 달라졌을 수 있음
+            self._poison_history()
+        else:
+            self._history = key
+            self.cache.put(key, text_content, file_names)
+        return text_content, file_names
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """프로세스 전체(모든 세션)에서 공유하는 ResultCache를 반환합니다."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
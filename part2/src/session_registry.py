@@ -0,0 +1,147 @@
+import time
+import weakref
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# LangGraph의 run config가 없는 경우(tool을 직접 호출하는 경우 등)에 사용하는 세션 ID
+_current_session_id = contextvars.ContextVar("code_interpreter_session_id", default=None)
+
+# register(keep_alive=True)로 등록한 client를 마지막 사용 후 유지하는 시간 (초)
+# (ResourceLifecycleManager의 idle_timeout과 같은 값)
+DEFAULT_KEEP_ALIVE_SECONDS = 3600
+
+
+class SessionNotFoundError(LookupError):
+    """세션 ID를 결정할 수 없거나, 해당 세션의 client가 등록되어 있지 않은 경우"""
+
+
+class SessionRegistry:
+    """
+    세션 ID(= LangGraph의 thread_id) → Code Interpreter client 레지스트리
+
+    여러 Streamlit 세션이 같은 프로세스에서 동시에 tool을 실행해도
+    각 tool 호출이 자신의 세션의 client(container)를 사용하도록 합니다.
+
+    기본적으로 client의 수명은 st.session_state가 관리하며, 레지스트리는 약한 참조만 가집니다.
+    (브라우저를 닫아 세션이 사라지면 client가 GC되어 finalizer로 정리됨)
+    keep_alive=True로 등록한 client는 브라우저 세션이 아니라 대화(thread)에 속하는 것으로 보고,
+    unregister()하거나 keep_alive_seconds 동안 사용되지 않을 때까지 강한 참조로 유지합니다.
+    (백그라운드 작업이 끝난 뒤 ?thread=로 다시 연결해도 같은 container와 아티팩트를 사용)
+    """
+
+    def __init__(self, keep_alive_seconds=DEFAULT_KEEP_ALIVE_SECONDS):
+        self.keep_alive_seconds = keep_alive_seconds
+        self._clients = weakref.WeakValueDictionary()
+        self._kept = {}  # session_id → (client, 마지막 사용 시각)
+        self._lock = threading.Lock()
+
+    def register(self, session_id, client, keep_alive=False):
+        with self._lock:
+            # 놓은 client의 finalizer가 lock 안에서 실행되지 않도록 함수가 끝날 때까지 유지
+            expired = self._expire_kept()
+            self._clients[session_id] = client
+            if keep_alive:
+                self._kept[session_id] = (client, time.monotonic())
+
+    def unregister(self, session_id):
+        """세션의 client를 레지스트리에서 제거하고 반환합니다 (없으면 None)."""
+        with self._lock:
+            self._kept.pop(session_id, None)
+            return self._clients.pop(session_id, None)
+
+    def _expire_kept(self):
+        """
+        오래 사용되지 않은 대화의 강한 참조를 놓고, 놓은 client를 반환합니다.
+        (다른 참조가 없으면 GC되어 finalizer로 정리되므로, 호출한 쪽은 lock을 푼 뒤에 반환값을 버림)
+        """
+        cutoff = time.monotonic() - self.keep_alive_seconds
+        expired = [sid for sid, (_, used_at) in self._kept.items() if used_at < cutoff]
+        return [self._kept.pop(session_id)[0] for session_id in expired]
+
+    def touch(self, session_id):
+        """keep_alive로 유지 중인 client의 마지막 사용 시각을 갱신합니다."""
+        with self._lock:
+            if session_id in self._kept:
+                self._kept[session_id] = (self._kept[session_id][0], time.monotonic())
+
+    def get(self, session_id):
+        with self._lock:
+            # 놓은 client의 finalizer가 lock 안에서 실행되지 않도록 함수가 끝날 때까지 유지
+            expired = self._expire_kept()
+            client = self._clients.get(session_id)
+        self.touch(session_id)
+        if client is None:
+            raise SessionNotFoundError(
+                f"No Code Interpreter client is registered for session: {session_id}"
+            )
+        return client
+
+    def resolve(self, config=None):
+        """
+        현재 실행 중인 세션의 client를 반환합니다.
+
+        세션 ID는 다음 순서로 결정합니다:
+        1. config["configurable"]의 session_id 또는 thread_id (LangGraph의 run config)
+        2. session_scope()로 설정한 context variable
+        """
+        session_id = session_id_from_config(config)
+        if session_id is None:
+            raise SessionNotFoundError(
+                "Cannot determine the session: pass thread_id in the run config "
+                "or use session_scope()"
+            )
+        return self.get(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+def session_id_from_config(config=None):
+    """run config의 session_id 또는 thread_id, 없으면 session_scope()의 세션 ID (없으면 None)"""
+    configurable = (config or {}).get("configurable", {})
+    return (
+        configurable.get("session_id")
+        or configurable.get("thread_id")
+        or _current_session_id.get()
+    )
+
+
+@contextmanager
+def session_scope(session_id):
+    """with 블록 안에서 실행되는 tool 호출이 session_id의 client를 사용하도록 합니다."""
+    token = _current_session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session_id.reset(token)
+
+
+def current_client():
+    """
+    tool 실행 중에 호출하여, 이 tool 호출을 실행 중인 세션의 Code Interpreter client를 반환합니다.
+    LangGraph가 별도 스레드에서 tool을 실행하므로 st.session_state 대신
+    run config의 thread_id(또는 session_scope())로 SessionRegistry에서 찾습니다.
+    """
+    from langgraph.config import get_config
+
+    try:
+        config = get_config()
+    except RuntimeError:
+        config = None  # LangGraph 실행 밖에서 직접 호출된 경우
+    return default_registry().resolve(config)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry():
+    """프로세스 전체에서 공유하는 SessionRegistry를 반환합니다."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = SessionRegistry()
+        return _default_registry
@@ -0,0 +1,148 @@
+import threading
+
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+from langgraph.config import get_config
+
+from src.session_registry import session_id_from_config
+from src.tracing import span
+
+
+# 한 세션에서 동시에 실행하는 tool 호출 수 (run config의 max_concurrency에도 같은 값을 사용)
+DEFAULT_MAX_PARALLEL_TOOLS = 4
+
+# 세션의 실행 상태(커널 / container)를 공유하므로 한 번에 하나씩, LLM이 호출한 순서대로 실행하는 tool
+DEFAULT_EXCLUSIVE_TOOLS = frozenset({"code_interpreter_tool", "code_interpreter_batch_tool"})
+
+# 앞선 배타적 tool 호출을 기다리는 최대 시간 (초)
+# (앞선 호출이 실행되지 않은 경우에도 무한히 기다리지 않도록 함)
+DEFAULT_ORDER_TIMEOUT = 600
+
+
+class _SessionSlots:
+    """세션별 동시 실행 수 제한과 배타적 tool의 실행 순서"""
+
+    def __init__(self, max_parallel):
+        self.semaphore = threading.BoundedSemaphore(max_parallel)
+        self.condition = threading.Condition()
+        self.exclusive_running = False
+        self.finished = set()  # 완료한 배타적 tool 호출의 ID
+        self.active = 0  # 대기 또는 실행 중인 tool 호출 수 (0이 되면 정리)
+
+
+def _exclusive_call_ids(messages, tool_call_id, exclusive_tools):
+    """
+    tool_call_id를 포함하는 AIMessage에서 배타적 tool 호출의 ID를 순서대로 반환합니다.
+    """
+    for message in reversed(messages):
+        tool_calls = getattr(message, "tool_calls", None) or []
+        if any(tool_call["id"] == tool_call_id for tool_call in tool_calls):
+            return [
+                tool_call["id"] for tool_call in tool_calls
+                if tool_call["name"] in exclusive_tools
+            ]
+    return [tool_call_id]
+
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """
+    LLM이 한 메시지에서 여러 tool을 호출하면 agent는 tool 호출을 병렬로 실행합니다
+    (run config의 max_concurrency가 스레드 수의 상한, ToolMessage는 호출 순서대로 기록됨).
+    이 middleware는 병렬 실행에 세션별 제한을 적용합니다.
+
+    - 한 세션에서 동시에 실행하는 tool 호출은 max_parallel개까지
+    - exclusive_tools(Code Interpreter)는 한 번에 하나씩, LLM이 호출한 순서대로 실행
+      (같은 커널의 변수와 파일을 사용하는 코드가 앞선 코드의 결과를 볼 수 있도록 함)
+
+    테이블 정보 조회, 쿼리 실행처럼 서로 독립적인 호출은 동시에 실행되므로
+    tool 단계의 소요 시간은 각 호출 시간의 합이 아니라 가장 긴 호출의 시간에 가까워집니다.
+    """
+
+    def __init__(
+        self,
+        max_parallel=DEFAULT_MAX_PARALLEL_TOOLS,
+        exclusive_tools=DEFAULT_EXCLUSIVE_TOOLS,
+        order_timeout=DEFAULT_ORDER_TIMEOUT,
+    ):
+        super().__init__()
+        self.max_parallel = max_parallel
+        self.exclusive_tools = frozenset(exclusive_tools)
+        self.order_timeout = order_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _acquire_slots(self, session_id):
+        with self._lock:
+            slots = self._sessions.get(session_id)
+            if slots is None:
+                slots = self._sessions[session_id] = _SessionSlots(self.max_parallel)
+            slots.active += 1
+            return slots
+
+    def _release_slots(self, session_id, slots):
+        with self._lock, slots.condition:
+            slots.active -= 1
+            # 아직 도착하지 않은 뒤의 배타적 호출이 finished를 참조하므로 순서가 끝난 경우에만 정리
+            if slots.active == 0 and not slots.finished and self._sessions.get(session_id) is slots:
+                del self._sessions[session_id]
+
+    def wrap_tool_call(self, request, handler):
+        try:
+            config = get_config()
+        except RuntimeError:
+            config = None  # LangGraph 실행 밖에서 호출된 경우
+        session_id = session_id_from_config(config)
+        tool_call = request.tool_call
+        exclusive = tool_call["name"] in self.exclusive_tools
+
+        slots = self._acquire_slots(session_id)
+        try:
+            with span("tool.wait", "tool", tool=tool_call["name"], exclusive=exclusive):
+                if exclusive:
+                    # 같은 메시지의 앞선 배타적 호출이 끝날 때까지 기다린 뒤 실행 권한을 얻음
+                    # (동시 실행 수보다 먼저 얻어야 앞선 호출이 자리를 얻지 못하는 교착을 피할 수 있음)
+                    order = _exclusive_call_ids(
+                        request.state.get("messages", []), tool_call["id"], self.exclusive_tools
+                    )
+                    predecessors = order[:order.index(tool_call["id"])] if tool_call["id"] in order else []
+                    with slots.condition:
+                        ready = slots.condition.wait_for(
+                            lambda: not slots.exclusive_running
+                            and all(call_id in slots.finished for call_id in predecessors),
+                            timeout=self.order_timeout,
+                        )
+                        if not ready:
+                            # 앞선 호출이 아직 실행 중일 수 있으므로 실행하지 않고 오류를 반환
+                            # (뒤의 호출이 이 호출을 기다리지 않도록 완료로 기록)
+                            self._finish_exclusive(slots, tool_call["id"], order)
+                            return ToolMessage(
+                                content=(
+                                    f"[{tool_call['name']} 실행 취소] 앞선 코드 실행이 "
+                                    f"{self.order_timeout}초 안에 끝나지 않아 이 호출을 실행하지 않았습니다. "
+                                    "앞선 실행의 결과를 확인한 뒤 필요하면 다시 호출하세요."
+                                ),
+                                tool_call_id=tool_call["id"],
+                                name=tool_call["name"],
+                                status="error",
+                            )
+                        slots.exclusive_running = True
+                slots.semaphore.acquire()
+            try:
+                return handler(request)
+            finally:
+                slots.semaphore.release()
+                if exclusive:
+                    with slots.condition:
+                        slots.exclusive_running = False
+                        self._finish_exclusive(slots, tool_call["id"], order)
+        finally:
+            self._release_slots(session_id, slots)
+
+    @staticmethod
+    def _finish_exclusive(slots, tool_call_id, order):
+        """배타적 호출을 완료로 기록하고 기다리는 호출을 깨웁니다 (slots.condition 안에서 호출)."""
+        slots.finished.add(tool_call_id)
+        # 시간 초과로 순서를 건너뛴 호출이 있으면 마지막 호출이 가장 늦게 끝나지 않을 수 있음
+        if order and all(call_id in slots.finished for call_id in order):
+            slots.finished.difference_update(order)
+        slots.condition.notify_all()
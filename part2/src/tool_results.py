@@ -0,0 +1,109 @@
+import os
+import mimetypes
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ArtifactRef(BaseModel):
+    """Code Interpreter가 생성한 파일(아티팩트)의 참조"""
+
+    id: str = Field(description="아티팩트 ID (내용의 sha256)")
+    name: str = Field(description="파일명")
+    mime: str = Field(description="MIME type")
+    size: int = Field(description="파일 크기 (bytes)")
+    path: str = Field(description="로컬 경로 (UI 표시용, LLM에는 전달하지 않음)")
+
+    @classmethod
+    def from_path(cls, path):
+        name = os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0  # 이미 eviction된 아티팩트
+        return cls(
+            id=name.split(".")[0],
+            name=name,
+            mime=mimetypes.guess_type(path)[0] or "application/octet-stream",
+            size=size,
+            path=path,
+        )
+
+    @property
+    def is_image(self):
+        return self.mime.startswith("image/")
+
+
+class CodeExecutionResult(BaseModel):
+    """code_interpreter_tool의 실행 결과"""
+
+    text: str = Field(description="실행 결과 (stdout, 오류 메시지 등)")
+    truncated: bool = Field(default=False, description="출력 예산을 넘어 잘렸는지 여부")
+    log_path: Optional[str] = Field(default=None, description="잘린 경우 전체 로그의 경로")
+    elapsed_ms: int = Field(default=0, description="실행 시간 (ms)")
+    cached: bool = Field(default=False, description="실행 결과 캐시에서 가져왔는지 여부")
+    artifacts: List[ArtifactRef] = Field(default_factory=list)
+
+
+class SnippetResult(BaseModel):
+    """code_interpreter_batch_tool의 snippet별 실행 결과"""
+
+    index: int
+    stdout: str
+    error: Optional[str] = None
+    truncated: bool = False
+    artifacts: List[ArtifactRef] = Field(default_factory=list)
+
+
+class BatchExecutionResult(BaseModel):
+    """code_interpreter_batch_tool의 실행 결과"""
+
+    results: List[SnippetResult]
+    elapsed_ms: int = 0
+
+
+# LLM에 전달하는 내용에서 제외할 필드
+# (로컬 경로는 UI만 사용하므로 LLM이 답변에 다시 적을 필요가 없음)
+_LLM_EXCLUDE = {"artifacts": {"__all__": {"path"}}}
+
+
+def to_llm_content(result):
+    """
+    tool 결과를 LLM에 전달할 JSON 문자열로 변환합니다.
+    아티팩트는 ID, 파일명, MIME type, 크기만 전달합니다.
+    """
+    if isinstance(result, BatchExecutionResult):
+        exclude = {"results": {"__all__": _LLM_EXCLUDE}}
+    else:
+        exclude = _LLM_EXCLUDE
+    return result.model_dump_json(exclude=exclude)
+
+
+def collect_artifacts(artifact):
+    """
+    ToolMessage.artifact(model_dump() 결과)에서 ArtifactRef를 모두 꺼냅니다.
+    CodeExecutionResult와 BatchExecutionResult를 모두 처리합니다.
+    """
+    if not isinstance(artifact, dict):
+        return []
+    refs = [ArtifactRef(**item) for item in artifact.get("artifacts", [])]
+    for result in artifact.get("results", []):
+        refs.extend(ArtifactRef(**item) for item in result.get("artifacts", []))
+    return refs
+
+
+def turn_artifacts(messages):
+    """
+    마지막 사용자 메시지 이후(= 이번 턴)의 ToolMessage에서 아티팩트를 모아 반환합니다.
+    같은 아티팩트는 한 번만 포함합니다.
+    """
+    start = 0
+    for index, message in enumerate(messages):
+        if getattr(message, "type", None) == "human":
+            start = index + 1
+    refs = {}
+    for message in messages[start:]:
+        if getattr(message, "type", None) == "tool":
+            for ref in collect_artifacts(getattr(message, "artifact", None)):
+                refs.setdefault(ref.path, ref)
+    return list(refs.values())
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# 현재 기록 중인 Trace와 Span (LangGraph는 context를 복사해서 tool을 다른 스레드에서 실행하므로
+# 부모/자식 관계가 스레드를 넘어 유지됨)
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_PID = os.getpid()
+
+
+class Span:
+    """시작/종료 시각과 부모 Span을 가진 하나의 구간"""
+
+    def __init__(self, trace, name, category, parent=None, args=None):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.span_id = trace.next_span_id()
+        self.args = dict(args or {})
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+
+    def set(self, **args):
+        """Span에 속성(토큰 수, 행 수 등)을 추가합니다."""
+        self.args.update(args)
+
+    def finish(self):
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+            self.trace.add(self)
+
+    @property
+    def duration_ms(self):
+        end_ns = self.end_ns or time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """
+    한 턴(사용자 입력 1회)의 Span을 모아 Chrome trace-event JSON으로 내보냅니다.
+    출력한 JSON은 chrome://tracing 또는 https://ui.perfetto.dev 에서 flame chart로 볼 수 있습니다.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.spans = []
+        self._span_ids = 0
+        self._lock = threading.Lock()
+        self.start_ns = time.perf_counter_ns()
+
+    def next_span_id(self):
+        with self._lock:
+            self._span_ids += 1
+            return self._span_ids
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome_trace(self):
+        """Chrome trace-event 형식(complete event, "ph": "X")의 dict를 반환합니다."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_ns)
+        thread_ids = {}
+        events = []
+        for span in spans:
+            tid = thread_ids.setdefault(span.thread_id, len(thread_ids) + 1)
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start_ns - self.start_ns) / 1000,  # µs
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": _PID,
+                "tid": tid,
+                "args": {
+                    "span_id": span.span_id,
+                    "parent_id": span.parent.span_id if span.parent else None,
+                    **{key: _jsonable(value) for key, value in span.args.items()},
+                },
+            })
+        for thread_id, tid in thread_ids.items():
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": _PID, "tid": tid,
+                "args": {"name": f"thread-{tid}"},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace": self.name}}
+
+    def to_json(self):
+        return json.dumps(self.to_chrome_trace(), ensure_ascii=False)
+
+    def summary(self, limit=10):
+        """소요 시간이 긴 Span 순으로 (이름, ms) 리스트를 반환합니다."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.duration_ms, reverse=True)
+        return [(span.name, round(span.duration_ms, 1)) for span in spans[:limit]]
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+@contextmanager
+def start_trace(name="turn", **args):
+    """
+    한 턴의 trace를 시작하고, 루트 Span을 현재 Span으로 설정합니다.
+
+    with start_trace("turn") as trace:
+        agent.invoke(...)
+    trace.to_json()
+    """
+    trace = Trace(name)
+    root = Span(trace, name, "turn", args=args)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(root)
+    try:
+        yield trace
+    finally:
+        root.finish()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name, category="app", **args):
+    """
+    현재 Span의 자식 Span을 기록합니다. trace가 시작되지 않았으면 기록하지 않습니다.
+
+    with span("bigquery.query", "bigquery", query=query) as s:
+        ...
+        s.set(rows=len(df))
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NoopSpan()
+        return
+    current = Span(trace, name, category, parent=_current_span.get(), args=args)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+
+
+class _NoopSpan:
+    def set(self, **args):
+        pass
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def _callback_handler_base():
+    # langchain이 없는 환경에서도 tracing의 나머지 기능은 사용할 수 있도록 함
+    try:
+        from langchain_core.callbacks import BaseCallbackHandler
+    except ImportError:
+        return object
+    return BaseCallbackHandler
+
+
+class TracingCallbackHandler(_callback_handler_base()):
+    """
+    LangChain callback으로 LLM 호출과 tool 호출을 Span으로 기록합니다.
+    config={"callbacks": [TracingCallbackHandler(trace)]} 로 전달합니다.
+
+    tool 실행 중에 기록되는 Span(BigQuery, 업로드, 원격 실행 등)은 tool Span의 자식이 됩니다.
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._spans = {}  # run_id -> (Span, 이전 현재 Span)
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, parent_run_id, name, category, **args):
+        with self._lock:
+            parent_entry = self._spans.get(parent_run_id)
+        previous = _current_span.get()
+        parent = parent_entry[0] if parent_entry else previous
+        current = Span(self.trace, name, category, parent=parent, args=args)
+        with self._lock:
+            self._spans[run_id] = (current, previous)
+        # 같은 context에서 실행되는 tool 본문의 Span이 이 Span의 자식이 되도록 설정
+        _current_span.set(current)
+
+    def _end(self, run_id, **args):
+        with self._lock:
+            entry = self._spans.pop(run_id, None)
+        if entry is None:
+            return
+        current, previous = entry
+        current.set(**args)
+        current.finish()
+        if _current_span.get() is current:
+            _current_span.set(previous)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or (serialized or {}).get("name")
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm", messages=sum(map(len, messages)))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or (serialized or {}).get("name")
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        self._end(run_id, **{key: value for key, value in usage.items() if isinstance(value, int)})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, parent_run_id, f"tool:{name}", "tool", input_chars=len(input_str or ""))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=f"{type(error).__name__}: {error}")
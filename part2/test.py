@@ -1,5 +1,4 @@
 import os
-import magic
 import traceback
 import mimetypes
 from openai import OpenAI
@@ -136,6 +135,9 @@ class CodeInterpreterClient:
         data = self.openai_client.files.content(file_id)
         data_bytes = data.read()
 
+        # python-magic(libmagic)은 파일을 다운로드할 때 처음 import
+        import magic
+
         # 파일의 내용으로부터 MIME 타입을 추출
         mime_type = magic.from_buffer(data_bytes, mime=True)
 
@@ -0,0 +1,145 @@
+"""
+part2 - Code Interpreter 실행 결과 캐시 테스트
+
+테스트 항목:
+1. 같은 코드라도 다른 데이터를 업로드한 세션은 다른 세션의 결과를 재사용하지 않는지
+2. 같은 파일명으로 다시 업로드하면 이전 데이터의 결과를 재사용하지 않는지
+3. 같은 데이터와 같은 코드는 세션이 달라도 캐시를 재사용하는지
+
+외부 API를 호출하지 않으므로 `python test_result_cache.py` 또는 pytest로 실행할 수 있습니다.
+"""
+
+import io
+import os
+import sys
+import contextlib
+
+# 프로젝트 루트 기준으로 import 할 수 있도록 path 설정
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.result_cache import MemoizedCodeInterpreter, ResultCache
+
+
+class FakeClient:
+    """업로드한 파일을 read_file()로 읽을 수 있는 네임스페이스에서 코드를 실행하는 테스트용 client"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.files = {}
+        self.namespace = {"read_file": lambda name: self.files[name].decode("utf-8")}
+        self.runs = 0
+
+    def upload_file(self, file_content, filename="uploaded_file.csv"):
+        self.files[filename] = file_content
+        return filename
+
+    def run(self, code, on_event=None):
+        self.runs += 1
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            exec(code, self.namespace)
+        return f"[실행 결과]\n{stdout.getvalue()}", []
+
+
+LOAD_CODE = "values = [int(v) for v in read_file('data.csv').split(',')]"
+MEAN_CODE = "print(sum(values) / len(values))"
+
+
+def analyze(session, data, filename="data.csv"):
+    session.upload_file(data, filename)
+    session.run(LOAD_CODE)
+    text, _ = session.run(MEAN_CODE)
+    return text
+
+
+def test_different_data_does_not_share_results():
+    """테스트 1: 같은 코드를 다른 데이터에 실행한 세션끼리 결과를 공유하지 않는지 확인"""
+    print("=" * 60)
+    print("테스트 1: 다른 데이터 → 다른 캐시 키")
+    print("=" * 60)
+
+    cache = ResultCache()
+    session_a = MemoizedCodeInterpreter(FakeClient("a"), cache)
+    session_b = MemoizedCodeInterpreter(FakeClient("b"), cache)
+
+    text_a = analyze(session_a, b"1,2,3")
+    text_b = analyze(session_b, b"10,20,30")
+
+    assert "2.0" in text_a, f"세션 A의 결과가 올바르지 않습니다: {text_a}"
+    assert "20.0" in text_b, f"세션 B가 세션 A의 결과를 받았습니다: {text_b}"
+    assert session_b.client.runs == 2, "세션 B의 코드가 실행되지 않고 캐시에서 반환되었습니다"
+
+    print("\n✅ 테스트 1 통과: 데이터가 다르면 캐시를 재사용하지 않음\n")
+
+
+def test_reupload_invalidates_results():
+    """테스트 2: 같은 파일명으로 다른 데이터를 다시 업로드한 경우 (BigQuery 결과 업로드 등)"""
+    print("=" * 60)
+    print("테스트 2: 같은 파일명으로 다시 업로드")
+    print("=" * 60)
+
+    cache = ResultCache()
+    session = MemoizedCodeInterpreter(FakeClient("a"), cache)
+
+    first = analyze(session, b"1,2,3")
+    second = analyze(session, b"4,5,6")
+
+    assert "2.0" in first and "5.0" in second, f"다시 업로드한 데이터가 반영되지 않았습니다: {second}"
+    assert session.client.runs == 4, "다시 업로드한 뒤의 코드가 캐시에서 반환되었습니다"
+
+    print("\n✅ 테스트 2 통과: 업로드가 이후의 캐시 키에 반영됨\n")
+
+
+def test_same_data_shares_results():
+    """테스트 3: 같은 데이터와 같은 코드는 다른 세션에서도 캐시를 재사용하는지 확인"""
+    print("=" * 60)
+    print("테스트 3: 같은 데이터 → 캐시 재사용")
+    print("=" * 60)
+
+    cache = ResultCache()
+    session_a = MemoizedCodeInterpreter(FakeClient("a"), cache)
+    session_b = MemoizedCodeInterpreter(FakeClient("b"), cache)
+
+    text_a = analyze(session_a, b"1,2,3")
+    text_b = analyze(session_b, b"1,2,3")
+
+    assert text_a == text_b
+    assert session_b.client.runs == 0, "같은 데이터와 코드인데 캐시를 재사용하지 않았습니다"
+    assert cache.stats()["hits"] == 2
+
+    print("\n✅ 테스트 3 통과: 같은 데이터의 결과는 재사용됨\n")
+
+
+if __name__ == "__main__":
+    print("🚀 실행 결과 캐시 테스트 시작")
+    print(f"{'=' * 60}\n")
+
+    results = {}
+    tests = [
+        ("다른 데이터", test_different_data_does_not_share_results),
+        ("다시 업로드", test_reupload_invalidates_results),
+        ("같은 데이터", test_same_data_shares_results),
+    ]
+
+    for name, test_func in tests:
+        try:
+            test_func()
+            results[name] = True
+        except AssertionError as e:
+            print(f"\n❌ {name} 실패: {e}\n")
+            results[name] = False
+
+    # 결과 요약
+    print("=" * 60)
+    print("📊 테스트 결과 요약")
+    print("=" * 60)
+    for name, passed in results.items():
+        status = "✅ 통과" if passed else "❌ 실패"
+        print(f"  {status} - {name}")
+
+    total = len(results)
+    passed = sum(1 for v in results.values() if v)
+    print(f"\n결과: {passed}/{total} 통과")
+
+    if passed < total:
+        sys.exit(1)
@@ -0,0 +1,298 @@
+"""
+part2 - 세션별 Code Interpreter client 레지스트리 동시성 테스트
+
+테스트 항목:
+1. 여러 세션이 동시에 tool을 실행해도 각자의 client로 라우팅되는지 (run config의 thread_id)
+2. session_scope()의 context variable이 스레드 간에 섞이지 않는지
+3. 등록되지 않은 세션은 다른 세션의 client로 대체되지 않고 오류가 되는지
+4. 레지스트리가 client의 수명을 늘리지 않는지 (세션이 사라지면 GC)
+5. tool이 LangGraph의 get_config()로 자신의 세션의 client를 찾는지 (worker 스레드에서 실행)
+6. keep_alive로 등록한 client가 세션이 사라져도 유지되고, 사용되지 않으면 정리되는지
+
+외부 API를 호출하지 않으므로 `python test_session_registry.py` 또는 pytest로 실행할 수 있습니다.
+"""
+
+import os
+import sys
+import gc
+import time
+import types
+import tempfile
+import unittest
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 프로젝트 루트 기준으로 import 할 수 있도록 path 설정
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.session_registry import (
+    SessionNotFoundError,
+    SessionRegistry,
+    default_registry,
+    session_scope,
+)
+
+
+class FakeClient:
+    """run()을 호출한 세션을 기록하는 테스트용 client"""
+
+    def __init__(self, session_id, artifact_store=None):
+        self.session_id = session_id
+        self.artifact_store = artifact_store
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, code, caller_session_id):
+        with self._lock:
+            self.calls.append(caller_session_id)
+        return f"{self.session_id}: {code}", []
+
+
+def test_concurrent_sessions_use_own_client():
+    """테스트 1: 여러 세션의 동시 tool 호출이 각자의 client로 라우팅되는지 확인"""
+    print("=" * 60)
+    print("테스트 1: 동시 실행 시 세션별 client 라우팅 (run config)")
+    print("=" * 60)
+
+    registry = SessionRegistry()
+    clients = {f"session-{i}": FakeClient(f"session-{i}") for i in range(8)}
+    for session_id, client in clients.items():
+        registry.register(session_id, client)
+
+    start = threading.Barrier(16)
+
+    def call_tool(session_id):
+        # LangGraph가 tool 실행 시 전달하는 run config와 같은 형태
+        config = {"configurable": {"thread_id": session_id}}
+        start.wait()
+        client = registry.resolve(config)
+        text, _ = client.run("print(1)", caller_session_id=session_id)
+        return session_id, text
+
+    jobs = [session_id for session_id in clients for _ in range(50)]
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(call_tool, jobs))
+
+    for session_id, text in results:
+        assert text.startswith(f"{session_id}:"), f"다른 세션의 client가 사용되었습니다: {session_id} -> {text}"
+    for session_id, client in clients.items():
+        assert len(client.calls) == 50, f"{session_id}의 호출 수가 50이 아닙니다: {len(client.calls)}"
+        assert set(client.calls) == {session_id}, f"{session_id}의 client가 다른 세션에서 호출되었습니다"
+
+    print(f"\n✅ 테스트 1 통과: {len(jobs)}회의 동시 호출이 모두 자신의 client로 라우팅됨\n")
+
+
+def test_session_scope_is_thread_local():
+    """테스트 2: session_scope()가 스레드마다 독립적인지 확인"""
+    print("=" * 60)
+    print("테스트 2: session_scope()의 context variable 격리")
+    print("=" * 60)
+
+    registry = SessionRegistry()
+    clients = {f"scope-{i}": FakeClient(f"scope-{i}") for i in range(4)}
+    for session_id, client in clients.items():
+        registry.register(session_id, client)
+
+    # 모든 스레드가 scope에 들어간 뒤에 resolve하여 서로 덮어쓰지 않는지 확인
+    entered = threading.Barrier(len(clients))
+    mismatches = []
+
+    def worker(session_id):
+        with session_scope(session_id):
+            entered.wait()
+            for _ in range(100):
+                if registry.resolve().session_id != session_id:
+                    mismatches.append(session_id)
+
+    threads = [threading.Thread(target=worker, args=(session_id,)) for session_id in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not mismatches, f"다른 세션의 client가 반환되었습니다: {mismatches[:5]}"
+    print("\n✅ 테스트 2 통과: 스레드별 session_scope가 격리됨\n")
+
+
+def test_unknown_session_raises():
+    """테스트 3: 등록되지 않은 세션은 오류가 되는지 확인"""
+    print("=" * 60)
+    print("테스트 3: 등록되지 않은 세션 / 세션 ID 없음")
+    print("=" * 60)
+
+    registry = SessionRegistry()
+    registry.register("known", FakeClient("known"))
+
+    for config in ({"configurable": {"thread_id": "unknown"}}, None):
+        try:
+            registry.resolve(config)
+        except SessionNotFoundError as e:
+            print(f"  SessionNotFoundError: {e}")
+        else:
+            raise AssertionError(f"SessionNotFoundError가 발생해야 합니다: {config}")
+
+    print("\n✅ 테스트 3 통과: 다른 세션의 client로 대체되지 않음\n")
+
+
+def test_registry_does_not_keep_clients_alive():
+    """테스트 4: 세션이 client를 놓으면 레지스트리에서도 사라지는지 확인"""
+    print("=" * 60)
+    print("테스트 4: client 수명 (약한 참조)")
+    print("=" * 60)
+
+    registry = SessionRegistry()
+    client = FakeClient("temporary")
+    registry.register("temporary", client)
+    assert len(registry) == 1
+
+    del client
+    gc.collect()
+    assert len(registry) == 0, "세션이 사라진 뒤에도 client가 레지스트리에 남아 있습니다"
+
+    print("\n✅ 테스트 4 통과: 레지스트리가 client를 붙잡지 않음\n")
+
+
+def test_keep_alive_outlives_session():
+    """테스트 6: keep_alive client의 수명이 세션이 아니라 대화의 사용 여부를 따르는지 확인"""
+    print("=" * 60)
+    print("테스트 6: keep_alive client 수명")
+    print("=" * 60)
+
+    registry = SessionRegistry(keep_alive_seconds=0.2)
+    client = FakeClient("thread")
+    registry.register("thread", client, keep_alive=True)
+    client_ref = weakref.ref(client)
+
+    # 브라우저 세션(st.session_state)이 client를 놓아도 대화의 client는 유지
+    del client
+    gc.collect()
+    assert registry.get("thread") is client_ref(), "세션이 사라지자 대화의 client가 정리되었습니다"
+
+    # 사용 중이면 유지 시간이 연장됨
+    time.sleep(0.15)
+    registry.touch("thread")
+    time.sleep(0.1)
+    assert registry.get("thread") is client_ref(), "사용 중인 client가 정리되었습니다"
+
+    # 유지 시간 동안 사용되지 않으면 다음 레지스트리 접근 시 놓음
+    time.sleep(0.3)
+    registry.register("other", FakeClient("other"))
+    gc.collect()
+    assert client_ref() is None, "사용되지 않는 client가 계속 유지되고 있습니다"
+
+    # unregister()하면 즉시 놓음 ("Clear Conversation")
+    client = FakeClient("cleared")
+    registry.register("cleared", client, keep_alive=True)
+    client_ref = weakref.ref(client)
+    del client
+    registry.unregister("cleared")
+    gc.collect()
+    assert client_ref() is None, "unregister() 후에도 client가 유지되고 있습니다"
+
+    print("\n✅ 테스트 6 통과: 대화 단위로 유지되고 idle 시간이 지나거나 초기화하면 정리됨\n")
+
+
+def test_tool_resolves_client_from_langgraph_config():
+    """테스트 5: tool이 worker 스레드에서 get_config()의 thread_id로 자신의 client를 찾는지 확인"""
+    print("=" * 60)
+    print("테스트 5: LangGraph run config → tool → current_client()")
+    print("=" * 60)
+
+    try:
+        from tools.code_interpreter import read_execution_log
+    except ImportError as e:
+        # 실제 tool과 LangGraph 없이 tool 본문을 흉내 내면 검증이 되지 않으므로 건너뜀
+        raise unittest.SkipTest(f"tools.code_interpreter를 import할 수 없습니다: {e}")
+
+    registry = default_registry()
+    with tempfile.TemporaryDirectory() as root:
+        # 세션마다 다른 아티팩트 저장소를 주고, 그 안에 세션 ID를 적은 로그를 둠
+        # (다른 세션의 client를 고르면 저장소 밖의 경로가 되어 읽기에 실패함)
+        clients, log_paths = {}, {}
+        for i in range(8):
+            session_id = f"tool-session-{i}"
+            store_root = os.path.join(root, session_id)
+            os.makedirs(store_root)
+            log_paths[session_id] = os.path.join(store_root, "execution.log")
+            with open(log_paths[session_id], "w", encoding="utf-8") as f:
+                f.write(f"log of {session_id}")
+            clients[session_id] = FakeClient(session_id, types.SimpleNamespace(root=store_root))
+            registry.register(session_id, clients[session_id])
+
+        start = threading.Barrier(16)
+
+        def call_tool(session_id):
+            # LangGraph가 tool을 실행할 때처럼 RunnableConfig를 전달 (get_config()로 조회됨)
+            start.wait()
+            return read_execution_log.invoke(
+                {"path": log_paths[session_id]},
+                config={"configurable": {"thread_id": session_id}},
+            )
+
+        def call_unknown():
+            return read_execution_log.invoke(
+                {"path": log_paths["tool-session-0"]},
+                config={"configurable": {"thread_id": "unknown"}},
+            )
+
+        try:
+            jobs = [session_id for session_id in clients for _ in range(20)]
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                results = list(executor.map(call_tool, jobs))
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                unknown = executor.submit(call_unknown).result()
+        finally:
+            for session_id in clients:
+                registry.unregister(session_id)
+
+    for session_id, text in zip(jobs, results):
+        assert text.startswith(f"log of {session_id}\n"), \
+            f"다른 세션의 client가 사용되었습니다: {session_id} -> {text[:80]}"
+    assert "No Code Interpreter client is registered for session: unknown" in unknown, \
+        f"등록되지 않은 세션의 오류가 tool 결과로 전달되지 않았습니다: {unknown}"
+    print(f"  미등록 세션: {unknown.splitlines()[0]}")
+
+    print(f"\n✅ 테스트 5 통과: {len(jobs)}회의 tool 호출이 run config의 thread_id로 자신의 client를 사용함\n")
+
+
+if __name__ == "__main__":
+    print("🚀 세션 레지스트리 동시성 테스트 시작")
+    print(f"{'=' * 60}\n")
+
+    results = {}
+    tests = [
+        ("동시 실행 라우팅", test_concurrent_sessions_use_own_client),
+        ("session_scope 격리", test_session_scope_is_thread_local),
+        ("미등록 세션", test_unknown_session_raises),
+        ("client 수명", test_registry_does_not_keep_clients_alive),
+        ("tool의 run config 라우팅", test_tool_resolves_client_from_langgraph_config),
+        ("keep_alive client 수명", test_keep_alive_outlives_session),
+    ]
+
+    for name, test_func in tests:
+        try:
+            test_func()
+            results[name] = True
+        except unittest.SkipTest as e:
+            print(f"\n⏭️ {name} 건너뜀: {e}\n")
+            results[name] = None
+        except AssertionError as e:
+            print(f"\n❌ {name} 실패: {e}\n")
+            results[name] = False
+
+    # 결과 요약
+    print("=" * 60)
+    print("📊 테스트 결과 요약")
+    print("=" * 60)
+    for name, passed in results.items():
+        status = "⏭️ 건너뜀" if passed is None else "✅ 통과" if passed else "❌ 실패"
+        print(f"  {status} - {name}")
+
+    total = sum(1 for v in results.values() if v is not None)
+    passed = sum(1 for v in results.values() if v)
+    skipped = len(results) - total
+    print(f"\n결과: {passed}/{total} 통과" + (f" ({skipped}개 건너뜀)" if skipped else ""))
+
+    if passed < total:
+        sys.exit(1)
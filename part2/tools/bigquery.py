@@ -1,11 +1,14 @@
-import pandas as pd
 import streamlit as st
-from typing import Optional
-from google.cloud import bigquery
-from google.oauth2 import service_account
+from typing import Optional, TYPE_CHECKING
 from langchain_core.tools import Tool, StructuredTool
 from pydantic import BaseModel, Field
-from src.code_interpreter import CodeInterpreterClient
+from src.session_registry import SessionNotFoundError, current_client
+from src.tracing import span
+
+# 타입 힌트 전용 import (google-cloud-bigquery, pandas, openai는 실제로 사용할 때 import)
+if TYPE_CHECKING:
+    import pandas as pd
+    from src.code_interpreter import CodeInterpreterClient
 
 
 class SqlTableInfoInput(BaseModel):
@@ -22,10 +25,13 @@ class BigQueryClient:
     BigQuery 클라이언트 (Responses API 기반)
 
     Assistants API에서 Responses API로 마이그레이션된 Code Interpreter를 사용합니다.
+
+    code_interpreter를 생략하면 tool을 실행 중인 세션의 client에 업로드하므로
+    하나의 BigQueryClient(와 tool)를 여러 세션이 공유할 수 있습니다.
     """
     def __init__(
         self,
-        code_interpreter: CodeInterpreterClient,
+        code_interpreter: Optional["CodeInterpreterClient"] = None,
         project_id: str = "youtube-api-client-480202",  ## 이 부분은 자신이 등록한 구글 클라우드 프로젝트 이름으로 변경
         # "bigquery-public-data"란?
         # Google이 공개해 둔 "공공 데이터(public dataset)"
@@ -35,6 +41,10 @@ class BigQueryClient:
         dataset_project_id: str = "bigquery-public-data",
         dataset_id: str = "google_trends",
     ) -> None:
+        # 무거운 Google Cloud SDK는 BigQueryClient를 처음 생성할 때 import
+        from google.cloud import bigquery
+        from google.oauth2 import service_account
+
         credentials = service_account.Credentials.from_service_account_info(
             st.secrets["gcp_service_account"]
         )
@@ -56,12 +66,19 @@ class BigQueryClient:
         table_names = self._exec_query(query).table_name.tolist()
         return ", ".join(table_names)
 
-    def _exec_query(self, query: str, limit: int = None) -> pd.DataFrame:
+    def _exec_query(self, query: str, limit: int = None) -> "pd.DataFrame":
         """SQL을 실행하여 Pandas DataFrame으로 반환"""
         if limit is not None:
             query += f"\nLIMIT {limit}"
-        query_job = self.client.query(query)
-        return query_job.result().to_dataframe(create_bqstorage_client=True)
+        with span("bigquery.query", "bigquery", query=query) as current:
+            query_job = self.client.query(query)
+            df = query_job.result().to_dataframe(create_bqstorage_client=True)
+            current.set(
+                job_id=query_job.job_id,
+                rows=len(df),
+                bytes_processed=query_job.total_bytes_processed,
+            )
+        return df
 
     def exec_query_and_upload(self, query: str, limit: int = None) -> str:
         """
@@ -72,9 +89,17 @@ class BigQueryClient:
         try:
             df = self._exec_query(query, limit)
             csv_data = df.to_csv().encode("utf-8")
-            file_id = self.code_interpreter.upload_file(csv_data)
+            code_interpreter = self.code_interpreter or current_client()
+            file_id = code_interpreter.upload_file(csv_data)
             # Responses API에서는 Container를 사용하므로 파일 경로가 다를 수 있음
             return f"sql:\n```\n{query}\n```\n\nsample results:\n{df.head()}\n\nfull result was uploaded with File ID: {file_id} (accessible in Code Interpreter)"
+        except SessionNotFoundError as e:
+            # 쿼리는 성공했지만 결과를 올릴 Code Interpreter 세션이 없는 경우
+            return (
+                "SQL succeeded but the result could not be uploaded because the Code Interpreter "
+                f"session is not available:\n```\n{e}\n```\n"
+                "Do not retry; ask the user to start a new conversation (Clear Conversation)."
+            )
         except Exception as e:
             return f"SQL execution failed. Error message is as follows:\n```\n{e}\n```"
 
@@ -1,27 +1,59 @@
 from langchain_core.tools import tool
+from langgraph.config import get_stream_writer
 from pydantic import BaseModel, Field
-import json
+from typing import List
+import time
+from src.batch import run_batch
+from src.output_budget import (
+    DEFAULT_MAX_CHARS,
+    DEFAULT_PAGE_CHARS,
+    read_log_page,
+    spill_and_truncate,
+    truncate_output,
+)
+from src.session_registry import SessionNotFoundError, current_client
+from src.tool_results import (
+    ArtifactRef,
+    BatchExecutionResult,
+    CodeExecutionResult,
+    SnippetResult,
+    to_llm_content,
+)
 
 
-# 모듈 레벨 변수 - LangGraph가 별도 스레드에서 tool을 실행하므로
-# st.session_state 대신 이 변수를 통해 client에 접근
-_code_interpreter_client = None
+def _get_event_writer():
+    """
+    LangGraph의 custom stream writer를 반환합니다.
+    agent.stream(stream_mode="custom")으로 실행 중일 때 UI가 이벤트를 받을 수 있으며,
+    그 외의 경우(직접 호출 등)에는 아무것도 하지 않는 함수를 반환합니다.
+    """
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda event: None
 
 
-def set_code_interpreter_client(client):
-    """main.py에서 세션 초기화 시 호출하여 client를 설정"""
-    global _code_interpreter_client
-    _code_interpreter_client = client
+def _session_error(error):
+    """이 세션의 Code Interpreter client를 찾지 못한 경우 LLM에 전달할 메시지"""
+    return (
+        f"[Code Interpreter 세션 오류]\n{error}\n"
+        "코드 실행 환경이 종료되었거나 준비되지 않았습니다. 같은 호출을 반복하지 말고, "
+        "사용자에게 대화를 새로 시작(Clear Conversation)한 뒤 다시 요청하도록 안내하세요."
+    )
 
 
 class ExecPythonInput(BaseModel):
     """타입을 지정하기 위한 클래스"""
 
     code: str = Field()
+    deterministic: bool = Field(
+        default=True,
+        description="난수, 현재 시각 등에 의존하여 실행할 때마다 결과가 달라지는 코드라면 False",
+    )
 
 
-@tool(args_schema=ExecPythonInput)
-def code_interpreter_tool(code):
+@tool(args_schema=ExecPythonInput, response_format="content_and_artifact")
+def code_interpreter_tool(code, deterministic=True):
     """
     Code Interpreter를 사용해 Python 코드를 실행합니다.
     (Responses API 기반 - 새로운 마이그레이션 버전)
@@ -35,18 +67,134 @@ def code_interpreter_tool(code):
     - seaborn 오류 → matplotlib 또는 pandas.plot 사용
     - 최대 2회 시도 후 사용자에게 보고
 
+    같은 코드의 실행 결과는 캐시되어 재사용됩니다.
+    결과가 매번 달라지는 코드는 deterministic=False로 호출하세요.
+
     Returns:
     - text: Code Interpreter의 코드 실행 결과
-    - files: Code Interpreter가 생성한 파일 경로 (`./files/` 이하)
+      (너무 긴 경우 앞/뒤 일부만 반환되며, 전체 로그는 read_execution_log로 조회)
+    - truncated, log_path: 출력이 잘렸는지 여부와 전체 로그의 경로
+    - elapsed_ms, cached: 실행 시간과 캐시 사용 여부
+    - artifacts: 생성한 파일의 ID, 파일명, MIME type, 크기
+      (생성한 이미지는 화면에 자동으로 표시되므로 답변에 경로를 적을 필요가 없음)
     """
-    print("\n\n=== Executing Code (Responses API) ===")
-    print(code)
-    print("======================================\n\n")
+    try:
+        client = current_client()
+    except SessionNotFoundError as e:
+        return _session_error(e), None
+    # 실행 중 이벤트(상태, 로그, 파일)를 UI로 전달
+    writer = _get_event_writer()
+    statuses = []
+
+    def on_event(event):
+        if event["type"] == "status":
+            statuses.append(event["status"])
+        writer({"source": "code_interpreter", **event})
+
+    started = time.perf_counter()
+    text_result, file_names = client.run(code, on_event=on_event, cacheable=deterministic)
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+
+    # 출력 예산을 넘는 긴 로그는 앞/뒤만 남기고 전체 로그는 아티팩트로 저장
+    text_result, truncated, log_path = spill_and_truncate(
+        text_result, client.session_id, client.artifact_store
+    )
+
+    result = CodeExecutionResult(
+        text=text_result,
+        truncated=truncated,
+        log_path=log_path,
+        elapsed_ms=elapsed_ms,
+        cached="cached" in statuses,
+        artifacts=[ArtifactRef.from_path(path) for path in file_names or []],
+    )
+    # LLM에는 로컬 경로를 뺀 요약을, UI에는 ToolMessage.artifact로 전체 결과를 전달
+    return to_llm_content(result), result.model_dump()
 
-    text_result, file_names = _code_interpreter_client.run(code)
 
-    # 결과를 명확한 형식으로 포맷팅
-    if file_names:
-        return json.dumps([text_result, file_names], ensure_ascii=False)
-    else:
-        return json.dumps([text_result, []], ensure_ascii=False)
+class ExecPythonBatchInput(BaseModel):
+    """타입을 지정하기 위한 클래스"""
+
+    snippets: List[str] = Field(
+        min_length=1, description="독립적으로 실행할 Python 코드 리스트 (순서대로 실행, 1개 이상)"
+    )
+
+
+@tool(args_schema=ExecPythonBatchInput, response_format="content_and_artifact")
+def code_interpreter_batch_tool(snippets):
+    """
+    서로 독립적인 여러 Python 코드를 Code Interpreter에서 한 번에 실행합니다.
+    (요약 표, 그래프, 상관 행렬처럼 여러 계산이 필요한 경우 code_interpreter_tool을
+    여러 번 호출하는 대신 이 도구를 한 번 호출하세요)
+
+    - 모든 snippet은 같은 Container / 같은 네임스페이스에서 순서대로 실행됩니다.
+    - 한 snippet에서 오류가 발생해도 나머지 snippet은 계속 실행됩니다.
+
+    Returns:
+    - results: snippet별 결과 리스트 [{"index", "stdout", "error", "truncated", "artifacts"}, ...]
+    - elapsed_ms: 전체 실행 시간
+    """
+    try:
+        client = current_client()
+    except SessionNotFoundError as e:
+        return _session_error(e), None
+    writer = _get_event_writer()
+    started = time.perf_counter()
+    results = run_batch(
+        client,
+        snippets,
+        on_event=lambda event: writer({"source": "code_interpreter", **event}),
+    )
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+
+    snippet_results = []
+    # snippet별 stdout / error에도 출력 예산을 나누어 적용
+    max_chars = max(1000, DEFAULT_MAX_CHARS // max(len(results), 1))
+    for result in results:
+        stdout, truncated, _ = spill_and_truncate(
+            result["stdout"],
+            client.session_id,
+            client.artifact_store,
+            max_chars=max_chars,
+        )
+        # traceback이 긴 오류도 같은 예산으로 앞/뒤만 남김
+        error = result["error"]
+        if error:
+            error, error_truncated = truncate_output(error, max_chars=max_chars)
+            truncated = truncated or error_truncated
+        snippet_results.append(
+            SnippetResult(
+                index=result["index"],
+                stdout=stdout,
+                error=error,
+                truncated=truncated,
+                artifacts=[ArtifactRef.from_path(path) for path in result["files"]],
+            )
+        )
+    batch_result = BatchExecutionResult(results=snippet_results, elapsed_ms=elapsed_ms)
+    return to_llm_content(batch_result), batch_result.model_dump()
+
+
+class ReadExecutionLogInput(BaseModel):
+    """타입을 지정하기 위한 클래스"""
+
+    path: str = Field(description="실행 결과에 표시된 전체 로그 경로 (.log)")
+    offset: int = Field(default=0, description="읽기 시작할 위치 (문자 단위, 0 이상)")
+    limit: int = Field(
+        default=DEFAULT_PAGE_CHARS,
+        description=f"읽을 길이 (문자 단위, 최대 {DEFAULT_PAGE_CHARS})",
+    )
+
+
+@tool(args_schema=ReadExecutionLogInput)
+def read_execution_log(path, offset=0, limit=DEFAULT_PAGE_CHARS):
+    """
+    Code Interpreter 실행 결과가 너무 길어 잘린 경우, 저장된 전체 로그를 페이지 단위로 읽습니다.
+    필요한 부분만 offset/limit으로 지정해서 읽어주세요.
+    """
+    try:
+        return read_log_page(path, current_client().artifact_store, offset, limit)
+    except SessionNotFoundError as e:
+        return _session_error(e)
+    except (ValueError, FileNotFoundError) as e:
+        return f"로그를 읽을 수 없습니다: {e}"
@@ -48,7 +48,9 @@ def init_page():
     if clear_button or "messages" not in st.session_state:
         welcome_message = "안녕하세요! BigQuery 데이터 분석 에이전트입니다. 분석하고 싶은 내용을 입력해주세요 🤗"
         st.session_state.messages = [{"role": "assistant", "content": welcome_message}]
-        # 대화가 리셋될 때 Code Interpreter의 세션도 다시 생성
+        # 대화가 리셋될 때 이전 세션의 assistant, thread, 파일을 삭제하고 Code Interpreter의 세션도 다시 생성
+        if "code_interpreter_client" in st.session_state:
+            st.session_state.code_interpreter_client.close()
         st.session_state.code_interpreter_client = CodeInterpreterClient()
         set_code_interpreter_client(st.session_state.code_interpreter_client)
         st.session_state["checkpointer"] = InMemorySaver()
@@ -1,13 +1,117 @@
 # GitHub: https://github.com/naotaka1128/llm_app_codes/chapter_011/part2/src/code_interpreter.py
 
 import os
-import traceback
-from openai import OpenAI
+import time
+import uuid
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from openai import AssistantEventHandler, OpenAI
 from dotenv import load_dotenv
+from src.lifecycle import default_lifecycle
+from src.resilience import (
+    CircuitOpenError,
+    Deadline,
+    DeadlineExceeded,
+    RetryPolicy,
+    call_with_resilience,
+)
 
 load_dotenv()
 
 
+class RunFailedError(ValueError):
+    """run이 completed 이외의 상태로 끝난 경우 (last_error.code로 재시도 여부를 판단)"""
+
+    def __init__(self, status, error):
+        super().__init__(f"Run failed with status: {status}, error: {error}")
+        self.status = status
+        self.code = getattr(error, "code", None)
+
+
+# 이 이벤트를 받으면 run이 끝난 것으로 판단
+RUN_TERMINAL_EVENTS = {
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+}
+
+# run이 이 상태이면 더 이상 진행되지 않음 (재시도 전에 이전 run이 이 상태가 될 때까지 기다림)
+RUN_TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete"}
+
+# 중단한 run이 취소될 때까지 기다리는 최대 시간 (초)
+RUN_CANCEL_TIMEOUT = 15
+
+
+class CodeInterpreterEventHandler(AssistantEventHandler):
+    """
+    runs.stream()의 이벤트를 받아 처리하는 handler
+
+    - code interpreter의 로그 delta를 도착하는 대로 on_event로 전달
+    - 메시지의 텍스트와 이미지/파일 ID를 이벤트 스트림에서 수집
+    - thread.run.completed 등 run 종료 이벤트를 받으면 바로 상태를 기록
+      (create_and_poll처럼 polling 간격만큼 기다리지 않음)
+    - deadline이 지나면 다음 이벤트에서 DeadlineExceeded를 발생시켜 스트림을 중단
+    """
+
+    def __init__(self, on_event=None, deadline=None):
+        super().__init__()
+        self._emit = on_event or (lambda event: None)
+        self.deadline = deadline
+        self.text_content = ""
+        self.file_ids = []
+        self.run_id = None
+        self.run_status = None
+        self.last_error = None
+
+    def _add_file_id(self, file_id):
+        if file_id and file_id not in self.file_ids:
+            self.file_ids.append(file_id)
+
+    def on_event(self, event):
+        if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step."):
+            self.run_id = event.data.id
+        if event.event in RUN_TERMINAL_EVENTS:
+            self.run_status = event.data.status
+            self.last_error = getattr(event.data, "last_error", None)
+            self._emit({"type": "status", "status": self.run_status})
+        elif self.deadline is not None and self.deadline.expired():
+            raise DeadlineExceeded("Deadline exceeded while the run was streaming")
+
+    def on_tool_call_delta(self, delta, snapshot):
+        if delta.type != "code_interpreter" or delta.code_interpreter is None:
+            return
+        if delta.code_interpreter.input:
+            self._emit({"type": "code", "delta": delta.code_interpreter.input})
+        for output in delta.code_interpreter.outputs or []:
+            if output.type == "logs" and output.logs:
+                self._emit({"type": "logs", "text": output.logs})
+
+    def on_text_delta(self, delta, snapshot):
+        if delta.value:
+            self._emit({"type": "text", "delta": delta.value})
+
+    def on_image_file_done(self, image_file):
+        self._add_file_id(getattr(image_file, "file_id", None))
+
+    def on_message_done(self, message):
+        # 1) content blocks에서 text와 file_id 추출 (마지막 메시지의 텍스트를 사용)
+        for content in message.content:
+            if content.type == "text":
+                self.text_content = content.text.value
+                for annotation in content.text.annotations:
+                    file_path = getattr(annotation, "file_path", None)
+                    self._add_file_id(getattr(file_path, "file_id", None))
+            elif content.type == "image_file":
+                self._add_file_id(getattr(content.image_file, "file_id", None))
+
+        # 2) attachments에서도 file_id 추출 (annotation이 누락될 수 있으므로)
+        for attachment in getattr(message, "attachments", None) or []:
+            self._add_file_id(getattr(attachment, "file_id", None))
+
+
 class CodeInterpreterClient:
     """
     OpenAI의 Assistants API의 Code Interpreter Tool을 사용하여
@@ -20,6 +124,8 @@ class CodeInterpreterClient:
 
     주요 메서드：
     - upload_file(file_content): 파일을 업로드하여 Assistants API에 등록한다
+    - upload_files(file_contents): 여러 파일을 병렬로 업로드한다
+    - close(): 세션 종료 시 assistant, thread, 업로드한 파일을 삭제한다
     - run(prompt): Assistants API를 사용하여 Python 코드를 실행하거나 파일 분석을 수행한다
 
     Example:
@@ -29,11 +135,23 @@ class CodeInterpreterClient:
     code_interpreter.upload_file(open('file.csv', 'rb').read())
     code_interpreter.run("file.csv의 내용을 읽어서 그래프를 그려주세요")
     """
-    def __init__(self):
+    def __init__(self, run_timeout=300, session_id=None, lifecycle=None):
         self.file_ids = []
+        # 다음 메시지에 첨부할 file_id (run() 시 message attachments로 thread에 추가)
+        self._pending_file_ids = []
+        self._file_lock = threading.Lock()
+        self.run_timeout = run_timeout  # run() 한 번에 허용하는 시간 (재시도 포함, 초)
+        self.session_id = session_id or uuid.uuid4().hex
+        self.lifecycle = lifecycle or default_lifecycle()
+        # client가 살아 있는 동안에는 idle 세션으로 정리하지 않도록 알림
+        self.lifecycle.attach(self.session_id, self)
         self.openai_client = OpenAI()
         self.assistant_id = self._create_assistant_agent()
         self.thread_id = self._create_thread()
+        # client가 GC될 때(세션 종료 시)에도 assistant, thread, 파일이 삭제되도록 등록
+        self._finalizer = weakref.finalize(
+            self, self.lifecycle.release_session, self.session_id
+        )
         self._create_file_directory()
         self.code_intepreter_instruction = """
         제공된 데이터 분석용 Python 코드를 실행해주세요.
@@ -45,6 +163,13 @@ class CodeInterpreterClient:
         예: [파일명](sandbox:/mnt/data/파일명)
         """
 
+    def close(self):
+        """
+        세션 종료 또는 "Clear Conversation" 시 호출하여
+        이 세션이 생성한 assistant, thread, 업로드한 파일을 삭제합니다.
+        """
+        self._finalizer()
+
     def _create_file_directory(self):
         directory = "./files/"
         os.makedirs(directory, exist_ok=True)
@@ -85,6 +210,7 @@ class CodeInterpreterClient:
                 }
             }
         )
+        self.lifecycle.register(self.session_id, "assistant", self.assistant.id)
         return self.assistant.id
 
     def _create_thread(self):
@@ -98,11 +224,12 @@ class CodeInterpreterClient:
             tool_resources=ToolResources(code_interpreter=None, file_search=None))
         """
         thread = self.openai_client.beta.threads.create()
+        self.lifecycle.register(self.session_id, "thread", thread.id)
         return thread.id
 
     def upload_file(self, file_content):
         """
-        Upload file to assistant agent
+        Upload file and attach it to the thread with the next message
 
         OpenAI Assistants API Response Example:
         FileObject(
@@ -123,21 +250,43 @@ class CodeInterpreterClient:
             file=file_content,
             purpose='assistants'
         )
-        self.file_ids.append(file.id)
-        self._add_file_to_assistant_agent()  # Update assistant with new files
+        self.lifecycle.register(self.session_id, "file", file.id)
+        # assistant 전체의 file_ids를 매번 갱신하는 대신, 다음 메시지의 attachments로 thread에 추가
+        # (업로드마다 O(1)이고 공유 assistant 객체를 변경하지 않음)
+        with self._file_lock:
+            self.file_ids.append(file.id)
+            self._pending_file_ids.append(file.id)
         return file.id
 
-    def _add_file_to_assistant_agent(self):
-        self.assistant = self.openai_client.beta.assistants.update(
-            assistant_id=self.assistant_id,
-            tool_resources={
-                "code_interpreter": {
-                    "file_ids": self.file_ids
-                }
-            }
-        )
+    def upload_files(self, file_contents, max_workers=4):
+        """
+        여러 파일을 병렬로 업로드합니다.
+
+        Args:
+            file_contents (list): 파일 내용(bytes)의 리스트
+        Returns:
+            list: 업로드한 순서대로의 file_id 리스트
+        """
+        if not file_contents:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_contents))) as executor:
+            return list(executor.map(self.upload_file, file_contents))
+
+    def _take_attachments(self):
+        """아직 thread에 첨부하지 않은 파일을 message attachments 형식으로 꺼냅니다."""
+        with self._file_lock:
+            file_ids, self._pending_file_ids = self._pending_file_ids, []
+        return [
+            {"file_id": file_id, "tools": [{"type": "code_interpreter"}]}
+            for file_id in file_ids
+        ]
 
-    def run(self, code, max_retries=2):
+    def _restore_attachments(self, attachments):
+        """메시지 추가에 실패한 경우 첨부 대기 목록으로 되돌립니다."""
+        with self._file_lock:
+            self._pending_file_ids[:0] = [a["file_id"] for a in attachments]
+
+    def run(self, code, max_retries=2, on_event=None):
         """
         Assistants API Response Example
         ===============
@@ -203,71 +352,42 @@ class CodeInterpreterClient:
         - 이미지를 생성한 경우에도 경로를 포함해주세요 (예: sandbox:/mnt/data/output.png)
         """
 
-        for attempt in range(max_retries + 1):
-            # add message to thread
-            self.openai_client.beta.threads.messages.create(
+        # add message to thread
+        # (메시지는 한 번만 추가하고, 실패 시에는 같은 thread에서 run 생성만 재시도)
+        # 새로 업로드한 파일은 이 메시지의 attachments로 thread에 첨부
+        self.lifecycle.touch(self.session_id)  # idle 세션 판정용
+        attachments = self._take_attachments()
+        try:
+            call_with_resilience(
+                self.openai_client.beta.threads.messages.create,
                 thread_id=self.thread_id,
                 role="user",
-                content=prompt
+                content=prompt,
+                attachments=attachments,
             )
+        except Exception:
+            self._restore_attachments(attachments)
+            raise
 
-            # run assistant to get response
-            run = self.openai_client.beta.threads.runs.create_and_poll(
-                thread_id=self.thread_id,
-                assistant_id=self.assistant_id,
-                instructions=self.code_intepreter_instruction
+        # run assistant to get response
+        # 일시적인 오류(rate limit, server error)는 지수 backoff + jitter로 재시도
+        deadline = Deadline(self.run_timeout)
+        try:
+            handler = call_with_resilience(
+                self._stream_run,
+                on_event,
+                deadline,
+                policy=RetryPolicy(max_attempts=max_retries + 1),
+                deadline=deadline,
+                timeout_kwarg=None,
             )
-            if run.status == 'completed':
-                break
-            elif run.status == "failed":
-                error_msg = getattr(run, 'last_error', None)
-                print(f"[Run Status] {run.status} (attempt {attempt + 1}/{max_retries + 1})")
-                print(f"[Run Error] {error_msg}")
-                if attempt < max_retries:
-                    import time
-                    print(f"  재시도 대기 중 (3초)...")
-                    time.sleep(3)
-                    self.thread_id = self._create_thread()
-                    continue
-                else:
-                    raise ValueError(f"Run failed with status: {run.status}, error: {error_msg}")
-            else:
-                error_msg = getattr(run, 'last_error', None)
-                raise ValueError(f"Run ended with unexpected status: {run.status}, error: {error_msg}")
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            raise ValueError(f"Run failed: {e}") from e
 
         # run.status == "completed" 인 경우에만 여기에 도달
-        message = self.openai_client.beta.threads.messages.list(
-            thread_id=self.thread_id,
-            limit=1  # Get the last message
-        )
-        try:
-            msg = message.data[0]
-            file_ids = []
-            text_content = ""
-
-            # 1) content blocks에서 text와 file_id 추출
-            for content in msg.content:
-                if content.type == "text":
-                    text_content = content.text.value
-                    for annotation in content.text.annotations:
-                        file_path = getattr(annotation, "file_path", None)
-                        file_id = getattr(file_path, "file_id", None)
-                        if file_id:
-                            file_ids.append(file_id)
-                elif content.type == "image_file":
-                    image_file_id = getattr(content.image_file, "file_id", None)
-                    if image_file_id:
-                        file_ids.append(image_file_id)
-
-            # 2) attachments에서도 file_id 추출 (annotation이 누락될 수 있으므로)
-            if hasattr(msg, "attachments") and msg.attachments:
-                for attachment in msg.attachments:
-                    att_file_id = getattr(attachment, "file_id", None)
-                    if att_file_id and att_file_id not in file_ids:
-                        file_ids.append(att_file_id)
-        except:
-            print(traceback.format_exc())
-            return None, None
+        # 텍스트와 file_id는 이벤트 스트림에서 이미 수집됨 (messages.list 호출 불필요)
+        text_content = handler.text_content
+        file_ids = handler.file_ids
 
         file_names = []
         if file_ids:
@@ -276,6 +396,54 @@ class CodeInterpreterClient:
 
         return text_content, file_names
 
+    def _stream_run(self, on_event=None, deadline=None):
+        """
+        run을 스트리밍으로 실행하고, 이벤트를 수집한 handler를 반환합니다.
+        run이 completed 이외의 상태로 끝나면 RunFailedError를 발생시킵니다.
+
+        deadline의 남은 시간을 요청의 timeout으로 전달하고(응답이 멈춘 경우),
+        이벤트마다 deadline을 확인합니다(이벤트가 계속 도착하지만 끝나지 않는 경우).
+        스트림이 도중에 중단되면 run을 취소하여, 재시도가 같은 thread에서 실행 중인
+        이전 run과 겹치지 않도록 합니다.
+        """
+        handler = CodeInterpreterEventHandler(on_event, deadline)
+        optional_params = {}
+        if deadline is not None:
+            optional_params["timeout"] = deadline.remaining()
+        try:
+            with self.openai_client.beta.threads.runs.stream(
+                thread_id=self.thread_id,
+                assistant_id=self.assistant_id,
+                instructions=self.code_intepreter_instruction,
+                event_handler=handler,
+                **optional_params,
+            ) as stream:
+                stream.until_done()
+        except BaseException:
+            if handler.run_id is not None and handler.run_status is None:
+                self._cancel_run(handler.run_id)
+            raise
+        if handler.run_status != "completed":
+            print(f"[Run Status] {handler.run_status}")
+            print(f"[Run Error] {handler.last_error}")
+            raise RunFailedError(handler.run_status, handler.last_error)
+        return handler
+
+    def _cancel_run(self, run_id):
+        """
+        run을 취소하고 종료 상태가 될 때까지 최대 RUN_CANCEL_TIMEOUT초 기다립니다.
+        (취소에 실패해도 원래의 오류를 그대로 전달하도록 예외는 발생시키지 않음)
+        """
+        runs = self.openai_client.beta.threads.runs
+        try:
+            run = runs.cancel(run_id=run_id, thread_id=self.thread_id)
+            expires_at = time.monotonic() + RUN_CANCEL_TIMEOUT
+            while run.status not in RUN_TERMINAL_STATUSES and time.monotonic() < expires_at:
+                time.sleep(0.5)
+                run = runs.retrieve(run_id=run_id, thread_id=self.thread_id)
+        except Exception as e:
+            print(f"[Run Cancel] {run_id}: {type(e).__name__}: {e}")
+
     def _download_file(self, file_id):
         data = self.openai_client.files.content(file_id)
         data_bytes = data.read()
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import uuid
+import socket
+import weakref
+import threading
+import contextlib
+
+import openai
+from openai import OpenAI
+from src.processes import pid_alive
+
+try:
+    import fcntl
+except ImportError:  # Windows 등 fcntl 모듈이 없는 환경
+    fcntl = None
+
+
+# ledger에 기록하는 원격 리소스의 종류와 삭제 순서
+# (컨테이너 안의 파일 → 컨테이너, 파일 → thread → assistant)
+RESOURCE_KINDS = ("container_file", "file", "thread", "assistant", "container")
+
+# 이 프로세스가 기록한 리소스를 구분하기 위한 ID
+# (heartbeat가 끊긴 프로세스가 남긴 리소스는 sweep()에서 정리)
+PROCESS_TOKEN = uuid.uuid4().hex
+
+# heartbeat와 sweep()을 실행하는 간격 (초)
+DEFAULT_HEARTBEAT_INTERVAL = 60
+
+# 마지막 heartbeat 이후 이 시간이 지난 프로세스는 종료된 것으로 간주 (초)
+DEFAULT_OWNER_TIMEOUT = 5 * 60
+
+
+class ResourceLifecycleManager:
+    """
+    세션이 생성한 원격 리소스(container, assistant, thread, file)를 ledger 파일에 기록하고
+    세션 종료 시 삭제합니다.
+
+    - attach(): 세션의 client를 알려, client가 살아 있는 동안에는 idle 세션으로 정리하지 않음
+    - register(): 리소스를 생성한 직후 호출하여 ledger에 기록
+    - touch(): 세션이 사용 중임을 기록 (idle_timeout 판정에 사용)
+    - release_session(): 세션 종료("Clear Conversation", client GC) 시 세션의 리소스를 삭제
+    - heartbeat(): 이 프로세스가 살아 있음을 기록 (owner lease 갱신)
+    - sweep(): 종료된 프로세스가 남긴 리소스와 idle_timeout을 넘긴 세션의 리소스를 삭제
+    - start(): 백그라운드에서 heartbeat()와 sweep()을 주기적으로 실행
+    - counts(): 살아 있는 리소스의 수를 종류별로 반환
+
+    같은 ledger를 여러 앱 프로세스가 함께 사용할 수 있습니다.
+    각 프로세스는 heartbeat로 자신의 lease를 갱신하며, sweep()은 lease가 만료되었거나
+    (같은 호스트에서) 프로세스가 없어진 owner의 리소스만 삭제합니다.
+    idle 세션은 세션을 만든 프로세스가 직접 정리하며, client가 아직 살아 있는 세션은 제외합니다.
+    (살아 있는 client의 리소스는 client가 정리될 때(finalizer) 삭제되므로,
+    idle 정리는 정리에 실패하고 남은 리소스를 다시 삭제하는 역할만 합니다)
+
+    삭제에 실패한 리소스는 ledger에 남겨두고 다음 sweep()에서 다시 삭제를 시도합니다.
+    """
+
+    def __init__(
+        self,
+        ledger_path="./.lifecycle/resources.json",
+        idle_timeout=3600,
+        openai_client=None,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+        owner_timeout=DEFAULT_OWNER_TIMEOUT,
+    ):
+        self.ledger_path = ledger_path
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.owner_timeout = owner_timeout
+        self._openai_client = openai_client
+        self._lock = threading.RLock()
+        self._clients = weakref.WeakValueDictionary()  # session_id → 살아 있는 client
+        self._stopped = threading.Event()
+        self._thread = None
+        os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+
+    @property
+    def openai_client(self):
+        if self._openai_client is None:
+            self._openai_client = OpenAI()
+        return self._openai_client
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """스레드 간(RLock)과 프로세스 간(ledger 옆의 .lock 파일) ledger 접근을 직렬화합니다."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.ledger_path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.ledger_path, "r", encoding="utf-8") as f:
+                ledger = json.load(f)
+        except (OSError, ValueError):
+            ledger = {}
+        ledger.setdefault("resources", [])
+        ledger.setdefault("sessions", {})
+        ledger.setdefault("owners", {})
+        return ledger
+
+    def _renew_lease(self, ledger):
+        ledger["owners"][PROCESS_TOKEN] = {
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "last_seen": time.time(),
+        }
+
+    def _owner_expired(self, owner, now):
+        if owner is None:
+            return True  # lease를 기록하지 않은 이전 버전의 ledger
+        if owner["host"] == socket.gethostname() and not pid_alive(owner["pid"]):
+            return True
+        return now - owner["last_seen"] > self.owner_timeout
+
+    def _save(self, ledger):
+        # 중간에 프로세스가 종료되어도 ledger가 깨지지 않도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{self.ledger_path}.{PROCESS_TOKEN}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(ledger, f, ensure_ascii=False)
+        os.replace(tmp_path, self.ledger_path)
+
+    def attach(self, session_id, client):
+        """세션의 client를 기록합니다 (약한 참조). client가 살아 있는 동안에는 sweep()에서 제외합니다."""
+        with self._lock:
+            self._clients[session_id] = client
+
+    def register(self, session_id, kind, resource_id, parent_id=None):
+        """
+        원격 리소스를 ledger에 기록합니다.
+
+        Args:
+            kind: RESOURCE_KINDS 중 하나
+            resource_id: OpenAI의 리소스 ID
+            parent_id: container_file인 경우 container ID
+        """
+        if kind not in RESOURCE_KINDS:
+            raise ValueError(f"Unknown resource kind: {kind}")
+        with self._locked():
+            ledger = self._load()
+            self._renew_lease(ledger)
+            ledger["resources"].append({
+                "kind": kind,
+                "id": resource_id,
+                "parent_id": parent_id,
+                "session_id": session_id,
+                "owner": PROCESS_TOKEN,
+                "created_at": time.time(),
+            })
+            ledger["sessions"][session_id] = time.time()
+            self._save(ledger)
+
+    def touch(self, session_id):
+        with self._locked():
+            ledger = self._load()
+            self._renew_lease(ledger)
+            if session_id in ledger["sessions"]:
+                ledger["sessions"][session_id] = time.time()
+            self._save(ledger)
+
+    def release_session(self, session_id):
+        """세션이 생성한 리소스를 모두 삭제합니다."""
+        return self._release(lambda resource: resource["session_id"] == session_id)
+
+    def heartbeat(self):
+        """이 프로세스의 lease를 갱신합니다. owner_timeout보다 짧은 간격으로 호출해야 합니다."""
+        with self._locked():
+            ledger = self._load()
+            self._renew_lease(ledger)
+            self._save(ledger)
+
+    def sweep(self):
+        """
+        누수된 리소스를 삭제합니다. 앱 시작 시와 이후 주기적으로 호출합니다.
+        - lease가 만료된 프로세스(재시작 전의 앱 등)가 기록한 리소스
+        - 이 프로세스가 만든 세션 중 idle_timeout 동안 사용되지 않았고 client도 남아 있지 않은 세션의 리소스
+          (client의 정리가 실패하고 남은 리소스)
+        """
+        with self._locked():
+            ledger = self._load()
+        now = time.time()
+        expired_owners = {
+            resource["owner"] for resource in ledger["resources"]
+            if resource["owner"] != PROCESS_TOKEN
+            and self._owner_expired(ledger["owners"].get(resource["owner"]), now)
+        }
+        with self._lock:
+            attached = set(self._clients.keys())
+        idle_sessions = {
+            session_id for session_id, last_used in ledger["sessions"].items()
+            if now - last_used > self.idle_timeout and session_id not in attached
+        }
+        return self._release(
+            lambda resource: resource["owner"] in expired_owners
+            or (resource["owner"] == PROCESS_TOKEN and resource["session_id"] in idle_sessions)
+        )
+
+    def start(self):
+        """백그라운드 스레드에서 heartbeat()와 sweep()을 heartbeat_interval마다 실행합니다."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._maintain, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _maintain(self):
+        while not self._stopped.is_set():
+            try:
+                self.heartbeat()
+                self.sweep()
+            except Exception as e:
+                print(f"[lifecycle] sweep failed: {e}")
+            self._stopped.wait(self.heartbeat_interval)
+
+    def counts(self):
+        """살아 있는 리소스의 수를 종류별로 반환합니다."""
+        with self._locked():
+            resources = self._load()["resources"]
+        counts = {kind: 0 for kind in RESOURCE_KINDS}
+        for resource in resources:
+            counts[resource["kind"]] += 1
+        return counts
+
+    def _release(self, predicate):
+        with self._locked():
+            targets = [r for r in self._load()["resources"] if predicate(r)]
+        targets.sort(key=lambda r: RESOURCE_KINDS.index(r["kind"]))
+
+        deleted = []
+        for resource in targets:
+            # 컨테이너를 삭제하면 안의 파일도 함께 삭제되므로 개별 삭제는 생략
+            if resource["kind"] == "container_file" and any(
+                r["kind"] == "container" and r["id"] == resource["parent_id"] for r in targets
+            ):
+                deleted.append(resource)
+                continue
+            try:
+                self._delete(resource)
+            except openai.NotFoundError:
+                pass  # 이미 삭제됨 (만료된 container 등)
+            except Exception as e:
+                print(f"[lifecycle] failed to delete {resource['kind']} {resource['id']}: {e}")
+                continue
+            deleted.append(resource)
+
+        with self._locked():
+            ledger = self._load()
+            deleted_keys = {(r["kind"], r["id"]) for r in deleted}
+            ledger["resources"] = [
+                r for r in ledger["resources"] if (r["kind"], r["id"]) not in deleted_keys
+            ]
+            live_sessions = {r["session_id"] for r in ledger["resources"]}
+            ledger["sessions"] = {
+                session_id: last_used for session_id, last_used in ledger["sessions"].items()
+                if session_id in live_sessions
+            }
+            # 리소스가 남지 않은 다른 프로세스의 lease는 정리
+            live_owners = {r["owner"] for r in ledger["resources"]} | {PROCESS_TOKEN}
+            ledger["owners"] = {
+                owner: lease for owner, lease in ledger["owners"].items() if owner in live_owners
+            }
+            self._save(ledger)
+        return len(deleted)
+
+    def _delete(self, resource):
+        kind, resource_id = resource["kind"], resource["id"]
+        if kind == "container":
+            self.openai_client.containers.delete(resource_id)
+        elif kind == "container_file":
+            self.openai_client.containers.files.delete(
+                resource_id, container_id=resource["parent_id"]
+            )
+        elif kind == "file":
+            self.openai_client.files.delete(resource_id)
+        elif kind == "thread":
+            self.openai_client.beta.threads.delete(resource_id)
+        elif kind == "assistant":
+            self.openai_client.beta.assistants.delete(resource_id)
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def default_lifecycle():
+    """
+    프로세스 전체에서 공유하는 ResourceLifecycleManager를 반환합니다.
+    처음 생성할 때 백그라운드에서 heartbeat와 sweep()을 시작하여
+    누수된 리소스와 idle 세션의 리소스를 주기적으로 정리합니다.
+    """
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = ResourceLifecycleManager()
+            _default_manager.start()
+        return _default_manager
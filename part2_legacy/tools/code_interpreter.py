@@ -14,6 +14,14 @@ def set_code_interpreter_client(client):
     _code_interpreter_client = client
 
 
+def _print_run_event(event):
+    """실행 중인 코드의 로그를 도착하는 대로 출력 (run 종료를 기다리지 않음)"""
+    if event["type"] == "logs":
+        print(event["text"], end="" if event["text"].endswith("\n") else "\n")
+    elif event["type"] == "status":
+        print(f"[Run Status] {event['status']}")
+
+
 class ExecPythonInput(BaseModel):
     """타입을 지정하기 위한 클래스"""
 
@@ -43,7 +51,9 @@ def code_interpreter_tool(code):
     print(code)
     print("==========================================\n\n")
 
-    text_result, file_names = _code_interpreter_client.run(code)
+    text_result, file_names = _code_interpreter_client.run(
+        code, on_event=_print_run_event
+    )
 
     # 결과를 명확한 형식으로 포맷팅
     if file_names: